@@ -0,0 +1,267 @@
+# anomalias.py
+# Dias com avarias fora do normal, por produto e por setor. Cada série diária
+# (setor x produto, mais o total do setor) tem uma linha de base EWMA de média
+# e variância do log do valor nos dias com lançamento; um dia é marcado quando
+# fica LIMIAR desvios acima do esperado e ao menos PISO_VALOR acima em reais.
+#
+# O estado das séries fica guardado entre reruns: só as linhas do cubo depois
+# do último dia processado são agrupadas e incorporadas. Se o último dia mudar,
+# ele é refeito a partir do estado da véspera; se uma linha mais antiga mudar
+# na planilha (impressão diferente), tudo é refeito. O k-ésimo lançamento de
+# todas as séries é processado junto, em NumPy.
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cache import CacheLRU
+
+MEDIDA = 'VLR. TOT. CUSTO'
+# Janela efetiva da média móvel exponencial, em lançamentos
+SPAN = 28
+LIMIAR = 3.0
+# Lançamentos antes de uma série poder ser marcada
+MINIMO_HISTORICO = 10
+# Desvio mínimo na escala log (~25%): séries muito estáveis não viram alerta por pouco
+PISO_DESVIO = 0.25
+# Excesso mínimo sobre o esperado, na unidade da medida
+PISO_VALOR = 20.0
+TODOS = "(setor inteiro)"
+COLUNAS = ['DATA', 'CATEGORIA', 'DESCRIÇÃO', 'VALOR', 'ESPERADO', 'DESVIOS']
+
+_EPOCA = np.datetime64('1970-01-01', 'D')
+
+
+def _dias(datas):
+    return (datas.to_numpy().astype('datetime64[D]') - _EPOCA).astype(np.int64)
+
+
+def _hash_coluna(coluna):
+    # Categóricas: uma vez por categoria, espalhado pelos códigos
+    if isinstance(coluna.dtype, pd.CategoricalDtype):
+        codigos = coluna.cat.codes.to_numpy()
+        hashes = pd.util.hash_array(coluna.cat.categories.astype(str).to_numpy(dtype=object))
+        return np.where(codigos >= 0, hashes[codigos], np.uint64(0))
+    return pd.util.hash_array(coluna.astype(str).to_numpy(dtype=object))
+
+
+# Impressão de um conjunto de linhas do cubo: (linhas, soma módulo 2^64 de um
+# hash por linha). Muda se uma linha for alterada, removida ou trocar de
+# produto/setor, e é aditiva: a de A + B é a soma das de A e de B.
+def _impressao_vazia():
+    return (0, 0)
+
+
+def _somar(a, b):
+    return (a[0] + b[0], (a[1] + b[1]) % 2**64)
+
+
+def _impressao(cubo, medida):
+    if cubo.empty:
+        return _impressao_vazia()
+    valores = cubo[medida].fillna(0).to_numpy(dtype=float)
+    chave = (_hash_coluna(cubo['CATEGORIA']) ^ (_hash_coluna(cubo['DESCRIÇÃO']) * np.uint64(31))
+             ^ _dias(cubo['DATA']).astype(np.uint64))
+    centavos = np.round(valores * 100).astype(np.int64).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        return (len(cubo), int((chave * (centavos + np.uint64(1))).sum()))
+
+
+def _como_categoria(coluna):
+    return coluna if isinstance(coluna.dtype, pd.CategoricalDtype) else coluna.astype('category')
+
+
+# Totais diários por série, a partir do cubo (já processado por processar_datas).
+# As séries são (CATEGORIA, DESCRIÇÃO) e (CATEGORIA, TODOS) para o total do
+# setor; a soma é feita sobre códigos inteiros (factorize + bincount), e os
+# nomes só são montados uma vez por série.
+# Devolve (nomes das séries, série de cada total, dia, valor), em ordem de série e dia.
+def _totais_diarios(cubo, medida):
+    categoria = _como_categoria(cubo['CATEGORIA'])
+    descricao = _como_categoria(cubo['DESCRIÇÃO'])
+    cat = categoria.cat.codes.to_numpy().astype(np.int64)
+    desc = descricao.cat.codes.to_numpy().astype(np.int64)
+    dia = _dias(cubo['DATA'])
+    valor = cubo[medida].fillna(0).to_numpy(dtype=float)
+
+    # Código da série: cat * n + 0 para o setor inteiro, cat * n + desc + 1 para o produto
+    n = len(descricao.cat.categories) + 1
+    produto = (desc >= 0) & (cat >= 0)
+    setor = cat >= 0
+    serie = np.concatenate([cat[setor] * n, cat[produto] * n + desc[produto] + 1])
+    dias = np.concatenate([dia[setor], dia[produto]])
+    valores = np.concatenate([valor[setor], valor[produto]])
+    if not len(serie):
+        return [], np.zeros(0, dtype=np.int64), dias, valores
+
+    primeiro = dias.min()
+    largura = dias.max() - primeiro + 1
+    # Chaves ordenadas: os totais já saem agrupados por série e em ordem de dia
+    chaves, codigos = np.unique(serie * largura + (dias - primeiro), return_inverse=True)
+    totais = np.bincount(codigos, weights=valores, minlength=len(chaves))
+    series, inversa = np.unique(chaves // largura, return_inverse=True)
+
+    categorias = categoria.cat.categories.astype(str).tolist()
+    descricoes = descricao.cat.categories.astype(str).tolist()
+    nomes = [(categorias[s // n], TODOS if s % n == 0 else descricoes[s % n - 1]) for s in series]
+    return nomes, inversa, chaves % largura + primeiro, totais
+
+
+class Detector:
+    def __init__(self, medida=MEDIDA, span=SPAN, limiar=LIMIAR, minimo_historico=MINIMO_HISTORICO):
+        self.medida = medida
+        self.alfa = 2.0 / (span + 1)
+        self.limiar = limiar
+        self.minimo_historico = minimo_historico
+        self.lock = threading.Lock()
+        self.refeitos = 0
+        self._zerar()
+
+    def _zerar(self):
+        self.series = {}
+        self.nomes = []
+        self.media = np.zeros(0)
+        self.variancia = np.zeros(0)
+        self.eventos = np.zeros(0, dtype=np.int64)
+        self.alertas = pd.DataFrame(columns=COLUNAS)
+        # Último dia processado, impressões das linhas até a véspera e até ele,
+        # e o estado na véspera: o último dia costuma ser editado ao longo do dia
+        # e é refeito sozinho a partir daí
+        self.corte = None
+        self.impressao_vespera = _impressao_vazia()
+        self.impressao = _impressao_vazia()
+        self.vespera = None
+        self.versao = None
+
+    def _ids(self, nomes):
+        for chave in nomes:
+            if chave not in self.series:
+                self.series[chave] = len(self.nomes)
+                self.nomes.append(chave)
+        self._completar()
+        return np.fromiter((self.series[c] for c in nomes), dtype=np.int64, count=len(nomes))
+
+    # Estende o estado até o número de séries conhecidas (séries novas começam zeradas)
+    def _completar(self):
+        extra = len(self.nomes) - len(self.media)
+        if extra:
+            self.media = np.concatenate([self.media, np.zeros(extra)])
+            self.variancia = np.concatenate([self.variancia, np.zeros(extra)])
+            self.eventos = np.concatenate([self.eventos, np.zeros(extra, dtype=np.int64)])
+
+    def _guardar_vespera(self):
+        self.vespera = (self.media.copy(), self.variancia.copy(), self.eventos.copy(), len(self.alertas))
+
+    def _voltar_vespera(self):
+        self.media, self.variancia, self.eventos, n_alertas = (
+            v.copy() if isinstance(v, np.ndarray) else v for v in self.vespera
+        )
+        self.alertas = self.alertas.iloc[:n_alertas]
+        self._completar()
+
+    # Incorpora as linhas do cubo posteriores ao último dia processado.
+    # Com a mesma `versao` da chamada anterior não faz nada. Devolve o número
+    # de dias-série processados.
+    def atualizar(self, cubo, versao=None):
+        if versao is not None and versao == self.versao:
+            return 0
+        cubo = cubo[cubo['DATA'].notna()]
+        base = _impressao_vazia()
+        if self.corte is not None:
+            datas = cubo['DATA']
+            antes, no_corte = datas < self.corte, datas == self.corte
+            impressao_vespera = _impressao(cubo[antes.to_numpy()], self.medida)
+            if impressao_vespera != self.impressao_vespera:
+                self._zerar()
+                self.refeitos += 1
+            elif _somar(impressao_vespera, _impressao(cubo[no_corte.to_numpy()], self.medida)) == self.impressao:
+                base = self.impressao
+                cubo = cubo[(datas > self.corte).to_numpy()]
+            else:
+                # Só o último dia mudou: volta ao estado da véspera e refaz a partir dele
+                self._voltar_vespera()
+                base = self.impressao_vespera
+                cubo = cubo[(~antes).to_numpy()]
+        self.versao = versao
+        if cubo.empty:
+            # O último dia pode ter sido apagado: o estado já é o da véspera
+            self.impressao = _somar(base, _impressao_vazia())
+            return 0
+
+        ultimo_dia = cubo['DATA'].max()
+        ultimo = (cubo['DATA'] == ultimo_dia).to_numpy()
+        anteriores, do_ultimo = cubo[~ultimo], cubo[ultimo]
+        processados = self._incorporar(anteriores)
+        self.impressao_vespera = _somar(base, _impressao(anteriores, self.medida))
+        self._guardar_vespera()
+        processados += self._incorporar(do_ultimo)
+        self.impressao = _somar(self.impressao_vespera, _impressao(do_ultimo, self.medida))
+        self.corte = ultimo_dia
+        return processados
+
+    def _incorporar(self, cubo):
+        if cubo.empty:
+            return 0
+        nomes, serie, dia, valor = _totais_diarios(cubo, self.medida)
+        serie = self._ids(nomes)[serie]
+        marcados = self._processar(serie, dia, valor)
+        if not marcados.empty:
+            self.alertas = marcados if self.alertas.empty else pd.concat([self.alertas, marcados], ignore_index=True)
+        return len(serie)
+
+    def _processar(self, serie, dia, valor):
+        alfa, beta = self.alfa, 1.0 - self.alfa
+        # Posição de cada lançamento dentro da sua série (0, 1, 2...); a rodada k
+        # atualiza o k-ésimo lançamento de todas as séries de uma vez
+        inicio_serie = np.r_[True, serie[1:] != serie[:-1]]
+        posicao = np.arange(len(serie)) - np.flatnonzero(inicio_serie)[np.cumsum(inicio_serie) - 1]
+        ordem = np.argsort(posicao, kind='stable')
+        limites = np.searchsorted(posicao[ordem], np.arange(posicao.max() + 2))
+
+        x_log = np.log1p(np.maximum(valor, 0))
+        esperado = np.zeros(len(serie))
+        desvios = np.zeros(len(serie))
+        historico = np.zeros(len(serie), dtype=np.int64)
+        for k in range(len(limites) - 1):
+            idx = ordem[limites[k]:limites[k + 1]]
+            s, x = serie[idx], x_log[idx]
+            m, v, n = self.media[s], self.variancia[s], self.eventos[s]
+            # Primeiro lançamento da série: a média começa nele
+            m = np.where(n == 0, x, m)
+
+            esperado[idx] = m
+            desvios[idx] = (x - m) / np.maximum(np.sqrt(v), PISO_DESVIO)
+            historico[idx] = n
+
+            diferenca = x - m
+            self.media[s] = m + alfa * diferenca
+            self.variancia[s] = beta * (v + alfa * diferenca * diferenca)
+            self.eventos[s] = n + 1
+
+        esperado = np.expm1(esperado)
+        alerta = ((historico >= self.minimo_historico) & (desvios >= self.limiar)
+                  & (valor - esperado >= PISO_VALOR))
+        i = np.flatnonzero(alerta)
+        nomes = [self.nomes[s] for s in serie[i]]
+        return pd.DataFrame({
+            'DATA': pd.to_datetime(_EPOCA + dia[i].astype('timedelta64[D]')),
+            'CATEGORIA': [c for c, _ in nomes],
+            'DESCRIÇÃO': [d for _, d in nomes],
+            'VALOR': valor[i],
+            'ESPERADO': esperado[i],
+            'DESVIOS': desvios[i],
+        }, columns=COLUNAS)
+
+
+# Detectores por recorte (setores, lojas, medida), mantidos entre reruns e sessões
+_detectores = CacheLRU(max_itens=32)
+
+
+# Alertas do recorte, do mais recente para o mais antigo. O detector só
+# processa o que mudou desde a última `versao` vista.
+def alertas(chave, cubo, versao=None, medida=MEDIDA):
+    detector = _detectores.obter_ou_calcular((chave, medida), lambda: Detector(medida))
+    with detector.lock:
+        detector.atualizar(cubo, versao)
+        resultado = detector.alertas
+    return resultado.sort_values(['DATA', 'DESVIOS'], ascending=[False, False], ignore_index=True)
@@ -0,0 +1,431 @@
+# api.py
+# API HTTP (JSON ou CSV) com os agregados dos dashboards de avarias e de
+# prevenção, para o BI e o ERP não precisarem raspar a interface, e com a
+# gravação de lançamentos (lancamentos.py) pelos terminais.
+# Reaproveita a leitura das lojas (snapshots) e as funções de agregação dos
+# dashboards. Os dados de cada setor ficam num cache do processo, calculados
+# uma só vez mesmo com requisições simultâneas, e as respostas levam ETag
+# derivado das assinaturas das planilhas: If-None-Match devolve 304 sem tocar
+# nos dados.
+#
+# Uso:
+#     python api.py --porta 8502
+#     curl "http://127.0.0.1:8502/api/avarias/top?setor=Avarias%20Padaria&metrica=venda&ano=2024&mes=1"
+#     curl "http://127.0.0.1:8502/api/prevencao/resumo?setor=Quebra%20M%C3%AAs&formato=csv"
+#
+# Rotas (GET):
+#     /api/saude
+#     /api/setores                         setores e lojas de cada painel
+#     /api/avarias/top?metrica=qtd|venda|custo
+#     /api/avarias/resumo
+#     /api/prevencao/top?por=prevencao|valor|quantidade
+#     /api/prevencao/resumo
+#     /api/versao                          versão dos dados de cada setor
+# Rotas (POST, só com AVARIAS_API_TOKEN definido):
+#     /api/avarias/lancamentos             {"setor", "loja", "terminal", "linhas": [{...}]}
+#     /api/prevencao/lancamentos           cada linha com as colunas da planilha
+# Filtros: setor (obrigatório), loja (repetível), responsavel (avarias),
+# prev (prevenção), período por inicio/fim (AAAA-MM-DD, fim incluído) ou
+# ano com mes ou semana (ISO), e formato=json|csv.
+import argparse
+import hashlib
+import hmac
+import json
+import sqlite3
+import logging
+import os
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import avarias
+import catalogo
+import dashboard
+import lancamentos
+import lojas
+import periodo
+import vigia
+from cache import CacheLRU
+from cubo import montar_cubo, por_produto
+
+# Aumentar quando o formato das respostas mudar, para invalidar os ETags
+VERSAO_API = "1"
+# Se definido, as requisições precisam de "Authorization: Bearer <token>";
+# sem ele a API não aceita lançamentos
+TOKEN = os.environ.get("AVARIAS_API_TOKEN")
+# Tamanho máximo do corpo de um POST de lançamentos
+LIMITE_CORPO = 1024 * 1024
+
+log = logging.getLogger(__name__)
+
+# Frames/cubos por (painel, setor, versão das planilhas) e respostas prontas por ETag
+_dados = CacheLRU(max_itens=2 * (len(avarias.folhas) + len(dashboard.folhas)))
+_respostas = CacheLRU(max_itens=256)
+
+
+class ErroRequisicao(Exception):
+    def __init__(self, mensagem, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(mensagem)
+        self.status = status
+
+
+PAINEIS = {"avarias": avarias, "prevencao": dashboard}
+
+TOPS_AVARIAS = {
+    "qtd": avarias.top_10_por_qtd,
+    "venda": avarias.top_10_por_valor_venda,
+    "custo": avarias.top_10_por_valor_custo,
+}
+TOPS_PREVENCAO = {
+    "prevencao": dashboard.top_5_prevencao,
+    "valor": dashboard.top_5_por_valor,
+    "quantidade": dashboard.top_5_por_quantidade,
+}
+
+
+def _carregar(painel, setor, versao):
+    modulo = PAINEIS[painel]
+    caminhos = {loja: caminho for loja, caminho, _ in versao}
+    assinaturas = {loja: assinatura for loja, _, assinatura in versao}
+    df = periodo.ordenar_por_data(lojas.carregar_lojas(
+        caminhos, setor, modulo.ler_folha, modulo.VERSAO_LIMPEZA, assinaturas=assinaturas
+    ))
+    df = lancamentos.juntar(df, modulo.TABELA_BANCO, setor, caminhos)
+    if df.empty:
+        return df
+    if painel == "avarias":
+        # Mesmo cubo do dashboard: top-N e resumo saem do consolidado por produto
+        return montar_cubo(avarias.processar_datas(df), setor)
+    return dashboard.processar_dates(df)
+
+
+# Cubo (avarias) ou linhas (prevenção) do setor, de todas as lojas
+def dados(painel, setor):
+    modulo = PAINEIS[painel]
+    versao = modulo.versao_lojas()
+    chave = (painel, setor, versao, lancamentos.versao(modulo.TABELA_BANCO, setor), catalogo.versao())
+    return _dados.obter_ou_calcular(chave, lambda: _carregar(painel, setor, versao))
+
+
+def _um(parametros, nome, padrao=None):
+    valores = parametros.get(nome)
+    return valores[-1] if valores else padrao
+
+
+def _lista(parametros, nome):
+    return [v.strip() for valor in parametros.get(nome, []) for v in valor.split(",") if v.strip()]
+
+
+def _inteiro(parametros, nome):
+    valor = _um(parametros, nome)
+    if valor is None:
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise ErroRequisicao(f"'{nome}' deve ser um número inteiro")
+
+
+# Datas só em AAAA-MM-DD: "01/02/2024" seria lido como 2 de janeiro
+def _data(valor):
+    return pd.to_datetime(valor, format="%Y-%m-%d")
+
+
+# [início, fim) pedido na query; None = todos os dados
+def limites(parametros):
+    try:
+        inicio, fim = _um(parametros, "inicio"), _um(parametros, "fim")
+        if inicio or fim:
+            return periodo.limites_intervalo(_data(inicio or fim), _data(fim or inicio))
+        ano = _inteiro(parametros, "ano")
+        mes, semana = _inteiro(parametros, "mes"), _inteiro(parametros, "semana")
+        if ano is None:
+            if mes or semana:
+                raise ErroRequisicao("'mes' e 'semana' precisam de 'ano'")
+            return None
+        if semana is not None:
+            return periodo.limites_periodo('Semana', semana, ano)
+        if mes is not None:
+            return periodo.limites_periodo('Mês', mes, ano)
+        return periodo.limites_ano(ano)
+    except ErroRequisicao:
+        raise
+    except ValueError as e:
+        raise ErroRequisicao(f"período inválido: {e}")
+
+
+def _setor(painel, parametros):
+    setor = _um(parametros, "setor")
+    if setor not in PAINEIS[painel].folhas:
+        raise ErroRequisicao(f"'setor' deve ser um de: {', '.join(PAINEIS[painel].folhas)}")
+    return setor
+
+
+def _filtrar(df, parametros, coluna_pessoa, nome_pessoa):
+    intervalo = limites(parametros)
+    if intervalo is not None:
+        df = periodo.fatiar(df, *intervalo)
+    lojas_filtro = _lista(parametros, "loja")
+    if lojas_filtro:
+        df = df[df['LOJA'].isin(lojas_filtro)]
+    pessoas = _lista(parametros, nome_pessoa)
+    if pessoas and coluna_pessoa in df.columns:
+        df = df[df[coluna_pessoa].isin(pessoas)]
+    return df
+
+
+def _escolha(parametros, nome, opcoes, padrao):
+    valor = _um(parametros, nome, padrao)
+    if valor not in opcoes:
+        raise ErroRequisicao(f"'{nome}' deve ser um de: {', '.join(opcoes)}")
+    return valor
+
+
+def avarias_top(parametros):
+    setor = _setor("avarias", parametros)
+    metrica = _escolha(parametros, "metrica", TOPS_AVARIAS, "qtd")
+    cubo = _filtrar(dados("avarias", setor), parametros, 'RESPONSÁVEL', "responsavel")
+    if cubo.empty:
+        return pd.DataFrame(columns=['DESCRIÇÃO'])
+    return TOPS_AVARIAS[metrica](por_produto(cubo)).reset_index()
+
+
+def avarias_resumo(parametros):
+    setor = _setor("avarias", parametros)
+    cubo = _filtrar(dados("avarias", setor), parametros, 'RESPONSÁVEL', "responsavel")
+    if cubo.empty:
+        return pd.DataFrame(columns=['DESCRIÇÃO', 'QTD', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO', 'CÓD. INT.'])
+    return avarias.resumo_avarias(por_produto(cubo))
+
+
+def prevencao_top(parametros):
+    setor = _setor("prevencao", parametros)
+    por = _escolha(parametros, "por", TOPS_PREVENCAO, "valor")
+    df = _filtrar(dados("prevencao", setor), parametros, 'PREV.', "prev")
+    if por == "prevencao" and 'PREV.' not in df.columns:
+        raise ErroRequisicao(f"o setor '{setor}' não tem a coluna PREV.")
+    if df.empty:
+        return pd.DataFrame(columns=['DESCRIÇÃO'])
+    return TOPS_PREVENCAO[por](df)
+
+
+def prevencao_resumo(parametros):
+    setor = _setor("prevencao", parametros)
+    df = _filtrar(dados("prevencao", setor), parametros, 'PREV.', "prev")
+    if df.empty:
+        return pd.DataFrame(columns=['DESCRIÇÃO', 'QTD', 'TOTAL', 'CÓDIGO INTERNO'])
+    return dashboard.resumo_prevencoes(df)
+
+
+def setores(parametros):
+    return {
+        painel: {"setores": modulo.folhas, "lojas": list(modulo.lojas_disponiveis())}
+        for painel, modulo in PAINEIS.items()
+    }
+
+
+# Versão dos dados de cada setor: muda com as planilhas, os lançamentos ou o catálogo
+def versoes(parametros):
+    return {
+        painel: {
+            setor: hashlib.blake2b(repr((
+                modulo.versao_lojas(), lancamentos.versao(modulo.TABELA_BANCO, setor), catalogo.versao(),
+            )).encode("utf-8"), digest_size=8).hexdigest()
+            for setor in modulo.folhas
+        }
+        for painel, modulo in PAINEIS.items()
+    }
+
+
+# Grava os lançamentos do corpo de um POST; devolve quantos foram gravados
+def lancar(painel, corpo):
+    modulo = PAINEIS[painel]
+    if not isinstance(corpo, dict) or not isinstance(corpo.get("linhas"), list):
+        raise ErroRequisicao("o corpo deve ser um objeto JSON com 'setor', 'loja' e a lista 'linhas'")
+    setor = _setor(painel, {"setor": [corpo.get("setor")]})
+    loja = corpo.get("loja")
+    if loja not in modulo.lojas_disponiveis():
+        raise ErroRequisicao(f"'loja' deve ser uma de: {', '.join(modulo.lojas_disponiveis())}")
+    if not all(isinstance(linha, dict) for linha in corpo["linhas"]):
+        raise ErroRequisicao("cada item de 'linhas' deve ser um objeto")
+    try:
+        gravados = lancamentos.gravar(modulo.TABELA_BANCO, setor, loja, corpo["linhas"], corpo.get("terminal"))
+    except lancamentos.ErroLancamento as e:
+        raise ErroRequisicao("lançamentos inválidos: " + "; ".join(e.problemas), HTTPStatus.UNPROCESSABLE_ENTITY)
+    return {"gravados": gravados, "versao": versoes({})[painel][setor]}
+
+
+# rota -> (função, painel cujas planilhas definem a versão dos dados)
+ROTAS = {
+    "/api/avarias/top": (avarias_top, "avarias"),
+    "/api/avarias/resumo": (avarias_resumo, "avarias"),
+    "/api/prevencao/top": (prevencao_top, "prevencao"),
+    "/api/prevencao/resumo": (prevencao_resumo, "prevencao"),
+    "/api/setores": (setores, None),
+    "/api/versao": (versoes, None),
+}
+ROTAS_LANCAMENTO = {
+    "/api/avarias/lancamentos": "avarias",
+    "/api/prevencao/lancamentos": "prevencao",
+}
+
+
+# ETag da resposta: rota, filtros, assinaturas das planilhas e versões dos lançamentos e
+# do catálogo. Muda quando qualquer um deles muda no painel, sem precisar ler os dados.
+def calcular_etag(rota, parametros, painel):
+    versao = (
+        PAINEIS[painel].versao_lojas(), lancamentos.versao(PAINEIS[painel].TABELA_BANCO), catalogo.versao(),
+    ) if painel else tuple(
+        (nome, modulo.versao_lojas(), lancamentos.versao(modulo.TABELA_BANCO))
+        for nome, modulo in PAINEIS.items()
+    ) + (catalogo.versao(),)
+    chave = repr((VERSAO_API, rota, sorted((k, tuple(v)) for k, v in parametros.items()), versao))
+    return '"' + hashlib.blake2b(chave.encode("utf-8"), digest_size=16).hexdigest() + '"'
+
+
+def _registros(df):
+    # to_json converte datas, categorias e tipos do NumPy; NaN vira null
+    return json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+
+
+def serializar(resultado, formato):
+    if formato == "csv":
+        if not isinstance(resultado, pd.DataFrame):
+            raise ErroRequisicao("esta rota só responde em JSON")
+        return "text/csv; charset=utf-8", resultado.to_csv(index=False).encode("utf-8")
+    if isinstance(resultado, pd.DataFrame):
+        resultado = {"linhas": len(resultado), "dados": _registros(resultado)}
+    return "application/json; charset=utf-8", json.dumps(resultado, ensure_ascii=False).encode("utf-8")
+
+
+def _etag_confere(cabecalho, etag):
+    if not cabecalho:
+        return False
+    candidatos = [c.strip() for c in cabecalho.split(",")]
+    # Comparação fraca (RFC 9110): W/"x" confere com "x"
+    return "*" in candidatos or any(c.removeprefix("W/") == etag for c in candidatos)
+
+
+class Manipulador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "AvariasAPI/" + VERSAO_API
+
+    def log_message(self, formato, *args):
+        log.info("%s - %s", self.address_string(), formato % args)
+
+    def _responder(self, status, corpo=b"", tipo="application/json; charset=utf-8", etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            # Clientes sempre revalidam; com o ETag a revalidação custa um 304
+            self.send_header("Cache-Control", "no-cache")
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        if corpo and status != HTTPStatus.NOT_MODIFIED and self.command != "HEAD":
+            self.wfile.write(corpo)
+
+    def _erro(self, status, mensagem):
+        corpo = json.dumps({"erro": mensagem}, ensure_ascii=False).encode("utf-8")
+        self._responder(status, corpo)
+
+    def _autorizado(self):
+        if not TOKEN:
+            return True
+        recebido = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        return hmac.compare_digest(recebido.encode("utf-8"), TOKEN.encode("utf-8"))
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        rota = url.path.rstrip("/") or "/"
+        if rota == "/api/saude":
+            return self._responder(HTTPStatus.OK, b'{"ok": true}')
+        if rota not in ROTAS:
+            return self._erro(HTTPStatus.NOT_FOUND, f"rota desconhecida: {rota}")
+        if not self._autorizado():
+            return self._erro(HTTPStatus.UNAUTHORIZED, "token ausente ou inválido")
+
+        parametros = parse_qs(url.query)
+        funcao, painel = ROTAS[rota]
+        try:
+            formato = _escolha(parametros, "formato", ("json", "csv"), "json")
+            etag = calcular_etag(rota, parametros, painel)
+            if _etag_confere(self.headers.get("If-None-Match"), etag):
+                return self._responder(HTTPStatus.NOT_MODIFIED, etag=etag)
+            # Requisições iguais e simultâneas montam a resposta uma vez só
+            tipo, corpo = _respostas.obter_ou_calcular(etag, lambda: serializar(funcao(parametros), formato))
+        except ErroRequisicao as e:
+            return self._erro(e.status, str(e))
+        except Exception as e:
+            log.exception("erro em %s", self.path)
+            return self._erro(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}")
+        self._responder(HTTPStatus.OK, corpo, tipo, etag)
+
+    def do_POST(self):
+        rota = urlsplit(self.path).path.rstrip("/")
+        if rota not in ROTAS_LANCAMENTO:
+            return self._erro(HTTPStatus.NOT_FOUND, f"rota desconhecida: {rota}")
+        if not TOKEN:
+            return self._erro(HTTPStatus.FORBIDDEN, "lançamentos pela API exigem AVARIAS_API_TOKEN")
+        if not self._autorizado():
+            return self._erro(HTTPStatus.UNAUTHORIZED, "token ausente ou inválido")
+        try:
+            tamanho = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            return self._erro(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+        if tamanho > LIMITE_CORPO:
+            return self._erro(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"corpo maior que {LIMITE_CORPO} bytes")
+        try:
+            corpo = json.loads(self.rfile.read(tamanho) or b"null")
+        except ValueError:
+            return self._erro(HTTPStatus.BAD_REQUEST, "corpo não é JSON válido")
+        try:
+            resultado = lancar(ROTAS_LANCAMENTO[rota], corpo)
+        except ErroRequisicao as e:
+            return self._erro(e.status, str(e))
+        except sqlite3.Error as e:
+            log.exception("erro gravando %s", self.path)
+            return self._erro(HTTPStatus.SERVICE_UNAVAILABLE, f"banco indisponível: {e}")
+        except Exception as e:
+            log.exception("erro em %s", self.path)
+            return self._erro(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}")
+        self._responder(HTTPStatus.CREATED, json.dumps(resultado, ensure_ascii=False).encode("utf-8"))
+
+
+def criar_servidor(host="127.0.0.1", porta=8502):
+    servidor = ThreadingHTTPServer((host, porta), Manipulador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON/CSV dos dados de avarias e prevenção")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8502)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    # Planilhas alteradas são reimportadas em segundo plano, como nos dashboards
+    vigia.iniciar(avarias.diretorio_lojas, lojas.PADRAO_AVARIAS, avarias.folhas,
+                  avarias.ler_folha, avarias.VERSAO_LIMPEZA, avarias.TABELA_BANCO)
+    vigia.iniciar(dashboard.diretorio_lojas, lojas.PADRAO_PREVENCAO, dashboard.folhas,
+                  dashboard.ler_folha, dashboard.VERSAO_LIMPEZA, dashboard.TABELA_BANCO)
+
+    servidor = criar_servidor(args.host, args.porta)
+    log.info("API em http://%s:%d/api/setores", *servidor.server_address[:2])
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
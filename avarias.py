@@ -1,15 +1,7 @@
 # avarias.py
-import pandas as pd
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-import plotly.io as pio
-import base64
-from datetime import datetime
-import io
-import tempfile
-from fpdf import FPDF
-from PIL import Image
+
+import login
 
 # Constants and functions
 VALID_CREDENTIALS = {
@@ -17,144 +9,661 @@ VALID_CREDENTIALS = {
     "gerente": "avarias123"
 }
 def check_login(username, password):
-    return username in VALID_CREDENTIALS and password == VALID_CREDENTIALS[username]
+    return login.verificar(VALID_CREDENTIALS, username, password)
 
 def login_popup(page="avarias"):
-    if f"logged_in_{page}" not in st.session_state:
-        st.session_state[f"logged_in_{page}"] = False
-    if f"username_{page}" not in st.session_state:
-        st.session_state[f"username_{page}"] = None
-
-    if not st.session_state[f"logged_in_{page}"]:
-        with st.form(key=f"login_form_{page}"):
-            st.write(f"Login para {page.capitalize()}")
-            username = st.text_input("Usuário")
-            password = st.text_input("Senha", type="password")
-            submit = st.form_submit_button("Login")
-            
-            if submit:
-                if check_login(username, password):
-                    st.session_state[f"logged_in_{page}"] = True
-                    st.session_state[f"username_{page}"] = username  # <-- Store username
-                    st.success("Login bem-sucedido!")
-                    st.rerun()
-                else:
-                    st.error("Usuário ou senha inválidos")
-        return False
-    return True
+    return login.login_popup(page, VALID_CREDENTIALS)
+
+# Rodando como app, a tela de login aparece antes de carregar pandas, os dados e
+# as bibliotecas de gráficos: os imports abaixo só rodam depois do login.
+# plotly.express e relatorio_pdf (fpdf) são importados só nas funções que os usam.
+if __name__ == "__main__" and st.session_state.get("page", "avarias") == "avarias" and not login_popup("avarias"):
+    st.stop()
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from datetime import datetime
+import io
+import os
+from contextlib import closing
+
+import anomalias
+import banco
+import catalogo
+import comparativo
+import conciliacao
+import formulario
+import ingestao
+import instrumentacao
+import lancamentos
+import lojas
+import periodo
+import previsao
+import tabela
+import vigia
+from cache import CacheLRU
+from cubo import montar_cubo, por_produto
+from esquema import chaves_periodo, otimizar_tipos, relatorio_memoria
+from limpeza import VERSAO_AVARIAS, ler_folha_avarias
 
 # Carregar dados
 file_path = r"./avarias/SISTEMA DE GESTÃO DE AVARIAS PREVENÇÃO - FRAGA MAIA (1).xlsm"
-xls = pd.ExcelFile(file_path)
 folhas = ["Avarias Padaria", "Avarias Salgados", "Avarias Rotisseria", "Avarias Açougue"]
+# Limpeza das folhas em limpeza.py (importável pelos processos de leitura das lojas)
+ler_folha = ler_folha_avarias
+VERSAO_LIMPEZA = VERSAO_AVARIAS
+
+# Cada planilha de avarias em ./avarias é uma loja; sem nenhuma, vale file_path
+diretorio_lojas = "./avarias"
+
+def lojas_disponiveis():
+    return (lojas.descobrir_lojas(diretorio_lojas, lojas.PADRAO_AVARIAS)
+            or {lojas.nome_loja(file_path): file_path})
+
+# Versão dos dados das lojas escolhidas (todas se vazio): ((loja, caminho, assinatura), ...).
+# É a chave dos caches; muda quando o vigia publica uma nova versão de alguma planilha.
+def versao_lojas(lojas_filter=None):
+    return tuple(
+        (loja, caminho, vigia.assinatura(caminho))
+        for loja, caminho in lojas_disponiveis().items()
+        if not lojas_filter or loja in lojas_filter
+    )
+
+# Versão de tudo o que entra no cubo: planilhas das lojas, catálogo de produtos e
+# lançamentos feitos no dashboard.db
+def versao_dados(lojas_filter=None):
+    return versao_lojas(lojas_filter), catalogo.versao(), lancamentos.versao(TABELA_BANCO)
+
+# Versões de uma folha lidas uma vez por rerun: (planilhas, lançamentos, catálogo).
+# O cubo, as métricas e a tabela detalhada da página usam as mesmas.
+def versoes_folha(nome_folha, lojas_filter=None):
+    return versao_lojas(lojas_filter), lancamentos.versao(TABELA_BANCO, nome_folha), catalogo.versao()
+
+# Leituras do snapshot/planilha feitas pelo cache compartilhado (faltas entre sessões).
+# Fica em cache_resource porque o script é reexecutado a cada rerun.
+@st.cache_resource
+def leituras_compartilhadas():
+    return {"faltas": 0}
+
+# Cache entre sessões, limitado e invalidado quando a assinatura de alguma planilha
+# muda ou quando há lançamentos novos na folha.
+# As planilhas das lojas sem snapshot são lidas em paralelo.
+@st.cache_data(show_spinner=False, max_entries=2 * len(folhas))
+def _carregar_dados_compartilhado(nome_folha, versao, versao_lancamentos):
+    leituras_compartilhadas()["faltas"] += 1
+    caminhos = {loja: caminho for loja, caminho, _ in versao}
+    assinaturas = {loja: assinatura for loja, _, assinatura in versao}
+    # Ordenado por DATA uma vez aqui; os recortes de período são fatiamentos
+    df = periodo.ordenar_por_data(lojas.carregar_lojas(
+        caminhos, nome_folha, ler_folha, VERSAO_LIMPEZA, assinaturas=assinaturas
+    ))
+    return lancamentos.juntar(df, TABELA_BANCO, nome_folha, caminhos)
+
+# Cubo (loja x setor x dia x produto x responsável) montado uma vez por versão das
+# planilhas, dos lançamentos e do catálogo
+@st.cache_data(show_spinner=False, max_entries=2 * len(folhas))
+def _carregar_cubo_compartilhado(nome_folha, versao, versao_lancamentos, versao_catalogo):
+    df = _carregar_dados_compartilhado(nome_folha, versao, versao_lancamentos)
+    if df.empty:
+        return df
+    return montar_cubo(processar_datas(df), nome_folha)
+
+# Cache da sessão: evita até a desserialização do st.cache_data dentro de um rerun
+def _cache_sessao():
+    if "cache_avarias" not in st.session_state:
+        # Frames das folhas e cubos, mais os consolidados por produto dos últimos filtros
+        st.session_state.cache_avarias = CacheLRU(max_itens=2 * len(folhas) + 8)
+    return st.session_state.cache_avarias
+
+def limpar_cache_dados():
+    _carregar_dados_compartilhado.clear()
+    _carregar_cubo_compartilhado.clear()
+    _carregar_periodo_compartilhado.clear()
+    _cache_sessao().invalidar()
+    cache_figuras().invalidar()
+
+@instrumentacao.medir("carregar_cubo")
+def carregar_cubo(nome_folha, lojas_filter=None, versoes=None):
+    try:
+        versao, versao_lancamentos, versao_catalogo = versoes or versoes_folha(nome_folha, lojas_filter)
+        return _cache_sessao().obter_ou_calcular(
+            ('cubo', nome_folha, versao, versao_lancamentos, versao_catalogo),
+            lambda: _carregar_cubo_compartilhado(nome_folha, versao, versao_lancamentos, versao_catalogo),
+        )
+    except Exception as e:
+        st.error(f"Erro ao montar o cubo de avarias: {e}")
+        return pd.DataFrame()
+
+# Cubos das folhas escolhidas num só frame, com CATEGORIA = setor: base única da
+# visão geral e do comparativo entre setores
+@instrumentacao.medir("carregar_cubos")
+def carregar_cubos(nomes_folhas, lojas_filter=None):
+    versao = versao_dados(lojas_filter)
+    def juntar():
+        cubos = [cubo for cubo in (carregar_cubo(folha, lojas_filter) for folha in nomes_folhas) if not cubo.empty]
+        if not cubos:
+            return pd.DataFrame()
+        todos = pd.concat(cubos, ignore_index=True)
+        todos['CATEGORIA'] = pd.Categorical(todos['CATEGORIA'].astype(object), categories=list(nomes_folhas))
+        return todos
+    return _cache_sessao().obter_ou_calcular(('cubos', tuple(nomes_folhas), versao), juntar)
+
+# Linhas de um período lidas do espelho da folha no dashboard.db (tabela
+# planilha_avarias), que é atualizado só quando a planilha muda
+TABELA_BANCO = 'planilha_avarias'
+# Sincronizações seguidas antes de desistir quando o espelho troca de versão no meio
+TENTATIVAS_ESPELHO = 3
+
+# O vigia e as outras sessões também importam a folha: entre a sincronização e a
+# leitura o espelho pode ter ido para outra versão. Só valem linhas lidas com ele
+# na versão pedida, a mesma do cubo.
+@st.cache_data(show_spinner=False, max_entries=64)
+def _carregar_periodo_compartilhado(nome_folha, versao, intervalos, versao_lancamentos):
+    banco.migrar()
+    assinaturas = {loja: assinatura for loja, _, assinatura in versao}
+    with closing(banco.conectar()) as conn:
+        for _ in range(TENTATIVAS_ESPELHO):
+            for loja, caminho, assinatura in versao:
+                banco.sincronizar(
+                    conn, TABELA_BANCO, loja, nome_folha, assinatura,
+                    lambda caminho=caminho, assinatura=assinatura: ingestao.carregar_folha(
+                        caminho, nome_folha, ler_folha, VERSAO_LIMPEZA, assinatura
+                    ),
+                    VERSAO_LIMPEZA,
+                )
+            df = banco.consultar_versao(conn, TABELA_BANCO, nome_folha, assinaturas, list(intervalos), VERSAO_LIMPEZA)
+            if df is not None:
+                return otimizar_tipos(df)
+    raise RuntimeError(f"o espelho de {nome_folha} mudou de versão durante a leitura; tente de novo")
 
-def carregar_dados(nome_folha):
+@instrumentacao.medir("carregar_periodo")
+def carregar_periodo(nome_folha, intervalos, lojas_filter=None, versoes=None):
     try:
-        df = pd.read_excel(xls, sheet_name=nome_folha, skiprows=1)
-        
-        # Ensure numeric columns are properly formatted
-        df['QTD'] = pd.to_numeric(df['QTD'], errors='coerce')
-
-        def limpar_coluna_moeda(coluna):
-            if isinstance(coluna, pd.Series):
-                coluna = coluna.replace({r'R\$ ': '', r',': '.'}, regex=True)
-                return pd.to_numeric(coluna, errors='coerce')
-            return pd.to_numeric(str(coluna).replace('R$ ', '').replace(',', '.'), errors='coerce')
-
-        # Clean monetary columns
-        for col in ['VLR. UNIT. VENDA', 'VLR. UNIT. CUSTO', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']:
-            if col in df.columns:
-                df[col] = limpar_coluna_moeda(df[col])
-            else:
-                st.warning(f"Coluna {col} não encontrada nos dados")
-                df[col] = 0
-                
-        # Filter out invalid QTD values
-        df = df[(df['QTD'] > 0)].dropna(subset=['QTD'])
-        return df
+        versao, versao_lancamentos, _ = versoes or versoes_folha(nome_folha, lojas_filter)
+        return _carregar_periodo_compartilhado(nome_folha, versao, tuple(intervalos), versao_lancamentos)
     except Exception as e:
         st.error(f"Erro ao carregar dados: {e}")
         return pd.DataFrame()
 
+# Contadores exibidos no fim da barra lateral, depois de todas as leituras do rerun
+def mostrar_estatisticas_cache(usuario_atual="admin"):
+    estatisticas = _cache_sessao().estatisticas()
+    figuras = cache_figuras().estatisticas()
+    st.sidebar.caption(
+        f"Cache de dados: {estatisticas['acertos']} acertos · {estatisticas['faltas']} faltas "
+        f"· {leituras_compartilhadas()['faltas']} leituras do disco"
+        f" · Gráficos: {figuras['acertos']} acertos · {figuras['faltas']} faltas"
+    )
+    if usuario_atual == "admin":
+        with st.sidebar.expander("Memória dos dados"):
+            frames = {}
+            for chave, valor in _cache_sessao().itens():
+                if isinstance(valor, pd.DataFrame):
+                    rotulo = {'cubo': "Cubo", 'produtos': "Produtos"}.get(chave[0])
+                    frames[f"{rotulo} {chave[1]}" if rotulo else chave[0]] = valor
+            st.dataframe(relatorio_memoria(frames), hide_index=True)
+        mostrar_situacao_vigia(diretorio_lojas)
+    instrumentacao.finalizar_execucao(mostrar_painel=usuario_atual == "admin")
+
+# Última versão publicada de cada planilha pelo vigia (só para o admin)
+def mostrar_situacao_vigia(diretorio):
+    pasta = os.path.abspath(diretorio)
+    linhas = [
+        {
+            'Planilha': os.path.basename(caminho),
+            'Atualizada em': (datetime.fromtimestamp(info['publicado_em']).strftime('%d/%m/%Y %H:%M:%S')
+                              if info.get('publicado_em') else '-'),
+            'Versão': (info.get('assinatura') or '-')[:8],
+            'Situação': info.get('erro') or 'ok',
+        }
+        for caminho, info in vigia.situacao().items()
+        if os.path.dirname(caminho) == pasta
+    ]
+    if linhas:
+        with st.sidebar.expander("Atualização das planilhas"):
+            st.dataframe(pd.DataFrame(linhas), hide_index=True)
+
+# Dias com custo de avarias fora do normal (anomalias.py), por setor e por produto.
+# O detector guarda o estado entre reruns e só processa os dias novos do cubo.
+DIAS_ALERTA = 30
+
+@instrumentacao.medir("alertas_avarias")
+def alertas_avarias(setores, lojas_filter=None):
+    cubos = carregar_cubos(setores, lojas_filter)
+    if cubos.empty:
+        return pd.DataFrame(), None
+    chave = (tuple(setores), tuple(sorted(lojas_filter or [])))
+    return anomalias.alertas(chave, cubos, versao_dados(lojas_filter)), cubos['DATA'].max()
+
+def mostrar_alertas(setores, lojas_filter=None):
+    try:
+        alertas, ultimo_dia = alertas_avarias(setores, lojas_filter)
+    except Exception as e:
+        st.warning(f"Não foi possível verificar os dias anormais: {e}")
+        return
+    if ultimo_dia is None or pd.isna(ultimo_dia):
+        return
+    recentes = alertas[alertas['DATA'] > ultimo_dia - pd.Timedelta(days=DIAS_ALERTA)] if not alertas.empty else alertas
+    titulo = f"Dias com avarias fora do normal: {len(recentes)} nos últimos {DIAS_ALERTA} dias"
+    with st.expander(("⚠️ " if len(recentes) else "") + titulo, expanded=False):
+        st.caption(
+            f"Custo do dia comparado com a média móvel exponencial ({anomalias.SPAN} dias) do produto "
+            f"e do setor; marcado a partir de {anomalias.LIMIAR:g} desvios acima do esperado."
+        )
+        mostrar_todos = st.checkbox("Mostrar todo o histórico", key="alertas_todos")
+        exibir = alertas if mostrar_todos else recentes
+        if exibir.empty:
+            st.info("Nenhum dia fora do normal no período.")
+            return
+        exibir = exibir.assign(
+            DATA=exibir['DATA'].dt.strftime('%d/%m/%Y'),
+            DESVIOS=exibir['DESVIOS'].round(1),
+        ).rename(columns={'CATEGORIA': 'SETOR', 'DESCRIÇÃO': 'PRODUTO', 'VALOR': 'CUSTO DO DIA'})
+        st.dataframe(
+            tabela.formatar_colunas(exibir, ['CUSTO DO DIA', 'ESPERADO'], tabela.FORMATO_AVARIAS),
+            hide_index=True, width="stretch",
+        )
+
+@instrumentacao.medir("carregar_dados")
+def carregar_dados(nome_folha, lojas_filter=None):
+    try:
+        versao = versao_lojas(lojas_filter)
+        versao_lancamentos = lancamentos.versao(TABELA_BANCO, nome_folha)
+        return _cache_sessao().obter_ou_calcular(
+            (nome_folha, versao, versao_lancamentos),
+            lambda: _carregar_dados_compartilhado(nome_folha, versao, versao_lancamentos),
+        )
+    except Exception as e:
+        st.error(f"Erro ao carregar dados: {e}")
+        return pd.DataFrame()
+
+@instrumentacao.medir("processar_datas")
 def processar_datas(df):
+    # Cópia rasa: o frame vem do cache da sessão e não pode ganhar colunas
+    df = df.copy(deep=False)
     df['DATA'] = pd.to_datetime(df['DATA'], format='%d/%m/%Y', errors='coerce')
-    df['mês'] = df['DATA'].dt.month
-    df['dia'] = df['DATA'].dt.day
-    df['ano'] = df['DATA'].dt.year
-    df['semana'] = df['DATA'].dt.isocalendar().week
-    return df
-
-def filtrar_por_periodo(df, tipo_periodo, valor_periodo, meses):
+    for chave, valores in chaves_periodo(df['DATA']).items():
+        df[chave] = valores
+    # Produto pelo catálogo: descrição única por código, departamento e preço de venda faltante
+    return catalogo.normalizar(df, interno='CÓD. INT.', preco=('VLR. UNIT. VENDA', 'VLR. TOT. VENDA'))
+
+# Linhas de DATA em [início, fim) de um frame ordenado por DATA (dados e cubo já
+# vêm ordenados): busca binária em vez de máscaras sobre mês/dia
+def filtrar_por_periodo(df, inicio, fim):
+    return periodo.fatiar(df, inicio, fim)
+
+# Seletores do período na barra lateral; devolve os limites [início, fim).
+# Mês e semana ISO são sempre de um ano escolhido, para não misturar anos.
+def escolher_periodo(tipo_periodo, df, meses):
+    anos = periodo.anos_com_dados(df) or [datetime.now().year]
+    if tipo_periodo == 'Intervalo':
+        validas = df['DATA'].dropna()
+        ultima = validas.iloc[-1].date() if len(validas) else datetime.now().date()
+        primeira = validas.iloc[0].date() if len(validas) else ultima
+        escolhidas = st.sidebar.date_input(
+            'Escolha o intervalo', value=(max(primeira, ultima - pd.Timedelta(days=29)), ultima),
+            min_value=primeira, max_value=ultima, format="DD/MM/YYYY",
+        )
+        valor_periodo = tuple(escolhidas) if len(escolhidas) == 2 else (escolhidas[0], escolhidas[0])
+        return periodo.limites_periodo(tipo_periodo, valor_periodo, None)
+    ano = st.sidebar.selectbox('Escolha o ano', anos[::-1])
     if tipo_periodo == 'Mês':
-        df = df[df['mês'] == valor_periodo]
-    elif tipo_periodo == 'Semana':
-        inicio, fim = valor_periodo.split('-')
-        inicio = int(inicio.replace('Dia ', ''))
-        fim = int(fim)
-        df = df[(df['dia'] >= inicio) & (df['dia'] <= fim) & 
-                (df['mês'] == meses.index(st.session_state.mes_selecionado) + 1)]
-    return df
-
-def top_10_por_qtd(df):
-    return df.groupby('DESCRIÇÃO').agg({'QTD': 'sum'}).sort_values(by='QTD', ascending=False).head(10)
-
-def top_10_por_valor_venda(df):
-    df['VLR. TOT. VENDA'] = df['QTD'] * df['VLR. UNIT. VENDA']
-    return df.groupby('DESCRIÇÃO').agg({'VLR. TOT. VENDA': 'sum'}).sort_values(by='VLR. TOT. VENDA', ascending=False).head(10)
-
-def top_10_por_valor_custo(df):
-    df['VLR. TOT. CUSTO'] = df['QTD'] * df['VLR. UNIT. CUSTO']
-    return df.groupby('DESCRIÇÃO').agg({'VLR. TOT. CUSTO': 'sum'}).sort_values(by='VLR. TOT. CUSTO', ascending=False).head(10)
-
-def resumo_avarias(df):
-    return df.groupby('DESCRIÇÃO').agg({
-        'QTD': 'sum',
-        'VLR. TOT. VENDA': 'sum',
-        'VLR. TOT. CUSTO': 'sum',
-        'CÓD. INT.': 'first'
-    }).reset_index()
-
-def all_produtos_por_qtd(df):
-    # Group all products by quantity and value, descending by quantity
-    grouped = df.groupby('DESCRIÇÃO').agg({'QTD': 'sum', 'VLR. TOT. VENDA': 'sum'}).sort_values(by='QTD', ascending=False).reset_index()
-    return grouped
-
-def fig_to_base64_png(fig):
-    img_bytes = pio.to_image(fig, format="png", width=1000, height=600, scale=2)
-    return base64.b64encode(img_bytes).decode("utf-8")
+        mes_selecionado = st.sidebar.selectbox('Escolha o mês', meses)
+        valor_periodo = meses.index(mes_selecionado) + 1
+    else:
+        valor_periodo = st.sidebar.selectbox(
+            'Escolha a semana', periodo.semanas_do_ano(ano),
+            format_func=lambda semana: periodo.rotulo_semana(ano, semana),
+        )
+    return periodo.limites_periodo(tipo_periodo, valor_periodo, ano)
+
+COLUNAS_MOEDA = ['VLR. UNIT. VENDA', 'VLR. UNIT. CUSTO', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']
+
+# As visões abaixo recebem o consolidado por produto (cubo.por_produto), calculado
+# uma vez por filtro, em vez de agrupar as linhas brutas de novo em cada uma
+@instrumentacao.medir("top_10_por_qtd")
+def top_10_por_qtd(produtos):
+    return produtos[['QTD']].sort_values(by='QTD', ascending=False).head(10)
+
+@instrumentacao.medir("top_10_por_valor_venda")
+def top_10_por_valor_venda(produtos):
+    return produtos[['VLR. TOT. VENDA']].sort_values(by='VLR. TOT. VENDA', ascending=False).head(10)
+
+@instrumentacao.medir("top_10_por_valor_custo")
+def top_10_por_valor_custo(produtos):
+    return produtos[['VLR. TOT. CUSTO']].sort_values(by='VLR. TOT. CUSTO', ascending=False).head(10)
+
+@instrumentacao.medir("resumo_avarias")
+def resumo_avarias(produtos):
+    return produtos[['QTD', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO', 'CÓD. INT.']].reset_index()
+
+@instrumentacao.medir("all_produtos_por_qtd")
+def all_produtos_por_qtd(produtos):
+    # All products by quantity and value, descending by quantity
+    return produtos[['QTD', 'VLR. TOT. VENDA']].sort_values(by='QTD', ascending=False).reset_index()
+
+# Barras do gráfico de todos os produtos: os `limite` primeiros e uma barra "Outros"
+# com o resto, mais o % acumulado da quantidade (Pareto) calculado sobre todos.
+# O tamanho do gráfico não cresce com o catálogo.
+LIMITE_PRODUTOS_GRAFICO = 50
+
+@instrumentacao.medir("produtos_com_outros")
+def produtos_com_outros(todos, limite=LIMITE_PRODUTOS_GRAFICO):
+    total = todos['QTD'].sum()
+    cabeca = todos.head(limite).astype({'DESCRIÇÃO': object})
+    cabeca['% acumulado'] = todos['QTD'].head(limite).cumsum() / total * 100 if total else 0.0
+    cauda = todos.iloc[limite:]
+    if not cauda.empty:
+        outros = pd.DataFrame({
+            'DESCRIÇÃO': [f"Outros ({len(cauda)} produtos)"],
+            'QTD': [cauda['QTD'].sum()],
+            'VLR. TOT. VENDA': [cauda['VLR. TOT. VENDA'].sum()],
+            '% acumulado': [100.0],
+        })
+        cabeca = pd.concat([cabeca, outros], ignore_index=True)
+    return cabeca
+
+@instrumentacao.medir("figura_todos_produtos")
+def figura_todos_produtos(grafico):
+    # Rótulos montados por coluna, sem laço por linha
+    rotulos = ("Qtd: " + grafico['QTD'].round().astype('int64').astype(str)
+               + "<br>Valor: " + tabela.formatar_moeda(grafico['VLR. TOT. VENDA'], **tabela.FORMATO_AVARIAS))
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=grafico['DESCRIÇÃO'], y=grafico['QTD'], name='Quantidade Perdida',
+                         text=rotulos, textposition='outside'))
+    # Linha em WebGL: continua leve mesmo com o limite de barras aumentado
+    fig.add_trace(go.Scattergl(x=grafico['DESCRIÇÃO'], y=grafico['% acumulado'], name='% acumulado',
+                               mode='lines+markers', yaxis='y2'))
+    fig.update_layout(
+        title="Todos os Produtos por Quantidade Perdida",
+        xaxis_title='Produto', yaxis_title='Quantidade Perdida',
+        yaxis2=dict(overlaying='y', side='right', range=[0, 105], ticksuffix='%', showgrid=False),
+        xaxis_tickangle=-45,
+        margin=dict(b=150),
+        height=600,
+        legend=dict(orientation='h', y=1.08),
+    )
+    return fig
+
+@instrumentacao.medir("figura_top_10")
+def figura_top_10(top, coluna, titulo):
+    import plotly.express as px
+    if top.empty:
+        return None
+    return px.bar(top.reset_index(), x='DESCRIÇÃO', y=coluna, title=titulo)
+
+@instrumentacao.medir("figura_comparativo_lojas")
+def figura_comparativo_lojas(cubo_filtrado):
+    import plotly.express as px
+    if cubo_filtrado['LOJA'].nunique() <= 1:
+        return None
+    por_loja = cubo_filtrado.groupby('LOJA', observed=True)[['VLR. TOT. VENDA', 'VLR. TOT. CUSTO']].sum().reset_index()
+    return px.bar(por_loja, x='LOJA', y=['VLR. TOT. VENDA', 'VLR. TOT. CUSTO'], barmode='group',
+                  title="Comparativo entre Lojas")
+
+# Gráficos da visão geral: {título: figura}. Tudo sai dos cubos das folhas já
+# em cache (um frame só para todos os setores), sem reler as linhas das planilhas.
+@instrumentacao.medir("figuras_geral")
+def figuras_geral(setor, lojas_filter, responsavel_filter, usuario_atual, meses):
+    import plotly.express as px
+    # Restrição: gerente só vê padaria, admin vê tudo
+    setores = ["Avarias Padaria"] if usuario_atual == "gerente" else folhas
+    cubos = carregar_cubos(setores, lojas_filter)
+    if cubos.empty:
+        return {}
+    cubo = cubos[cubos['CATEGORIA'] == setor]
+    if responsavel_filter:
+        cubo = cubo[cubo['RESPONSÁVEL'].isin(responsavel_filter)]
+    nomes_meses = dict(enumerate(meses, 1))
+    figuras = {}
+
+    vendas_por_mes_por_setor = cubos.groupby(['CATEGORIA', 'mês'], observed=True)['VLR. TOT. VENDA'].sum().reset_index()
+    vendas_por_mes_por_setor['mês_nome'] = vendas_por_mes_por_setor['mês'].map(nomes_meses).fillna('Desconhecido')
+    fig_vendas_por_setor = px.line(vendas_por_mes_por_setor, x='mês_nome', y='VLR. TOT. VENDA', color='CATEGORIA')
+    fig_vendas_por_setor.update_layout(title="Valor Total de Venda por Mês por Setor")
+    figuras["Valor Total de Venda por Mês por Setor"] = fig_vendas_por_setor
+
+    vendas_por_mes = cubo.groupby('mês')['VLR. TOT. VENDA'].sum().reset_index()
+    vendas_por_mes['mês_nome'] = vendas_por_mes['mês'].map(nomes_meses).fillna('Desconhecido')
+    vendas_por_mes['Média Móvel (3 meses)'] = vendas_por_mes['VLR. TOT. VENDA'].rolling(window=3, min_periods=1).mean()
+
+    fig_vendas = go.Figure()
+    fig_vendas.add_trace(go.Scatter(x=vendas_por_mes['mês_nome'], y=vendas_por_mes['VLR. TOT. VENDA'],
+                                  mode='lines+markers', name='Valor Real'))
+    fig_vendas.add_trace(go.Scatter(x=vendas_por_mes['mês_nome'], y=vendas_por_mes['Média Móvel (3 meses)'],
+                                  mode='lines', name='Média Móvel (3 meses)', line=dict(dash='dash')))
+    fig_vendas.update_layout(title="Valor Total de Venda por Mês (com Média Móvel)")
+    figuras["Valor Total de Venda por Mês (com Média Móvel)"] = fig_vendas
+
+    # Previsão das próximas semanas: ajustada para todos os setores e produtos de uma vez
+    modelo = previsao.modelo((tuple(setores), tuple(sorted(lojas_filter or []))), cubos, versao_dados(lojas_filter))
+    figuras.update(figuras_previsao(modelo, setor))
+
+    # Padrões Sazonais
+    custo_por_semana_ano = cubos.groupby(['ano', 'semana'])['VLR. TOT. CUSTO'].sum().reset_index()
+    figuras["Padrões Sazonais - Custos por Semana e Ano"] = px.density_heatmap(
+        custo_por_semana_ano, x='semana', y='ano', z='VLR. TOT. CUSTO',
+        title="Padrões Sazonais - Custos por Semana e Ano",
+        color_continuous_scale="Viridis",
+    )
+
+    # Comparativo entre lojas
+    if cubos['LOJA'].nunique() > 1:
+        custo_por_loja = cubos.groupby(['LOJA', 'ano', 'mês'], observed=True)['VLR. TOT. CUSTO'].sum().reset_index()
+        custo_por_loja['período'] = (custo_por_loja['ano'].astype(str) + '-'
+                                     + custo_por_loja['mês'].astype(int).map('{:02d}'.format))
+        figuras["Valor Total de Custo por Mês por Loja"] = px.line(
+            custo_por_loja, x='período', y='VLR. TOT. CUSTO', color='LOJA', markers=True,
+            title="Valor Total de Custo por Mês por Loja",
+        )
 
+    # Comparativo entre setores: participação, variações e custo/venda
+    if len(setores) > 1:
+        indicadores = comparativo.indicadores(
+            comparativo.totais_mensais(cubos, comparativo.MEDIDAS_AVARIAS), 'VLR. TOT. CUSTO',
+            razao=('VLR. TOT. CUSTO', 'VLR. TOT. VENDA'),
+        )
+        figuras.update(figuras_comparativo_setores(indicadores))
+    return figuras
+
+# Histórico recente e previsão semanal do setor (custo e quantidade), com a faixa
+# de 80%, e os produtos com maior custo previsto no horizonte
+SEMANAS_HISTORICO = 26
+ROTULOS_PREVISAO = {'VLR. TOT. CUSTO': "Custo", 'QTD': "Quantidade"}
+
+@instrumentacao.medir("figuras_previsao")
+def figuras_previsao(modelo, setor):
+    previsto = modelo.prever()
+    previsto = previsto[previsto['CATEGORIA'] == setor]
+    if previsto.empty:
+        return {}
+    historico = modelo.historico()
+    historico = historico[historico['CATEGORIA'] == setor]
+    faixa = f"Faixa de {previsao.NIVEL:.0%}"
+    figuras = {}
+    for medida, rotulo in ROTULOS_PREVISAO.items():
+        serie = previsto[(previsto['DESCRIÇÃO'] == previsao.TODOS) & (previsto['MEDIDA'] == medida)]
+        real = historico[historico['MEDIDA'] == medida].tail(SEMANAS_HISTORICO)
+        titulo = f"Previsão de {rotulo} por Semana - Próximas {previsao.HORIZONTE} Semanas"
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=real['SEMANA'], y=real['VALOR'], mode='lines+markers', name='Valor Real'))
+        fig.add_trace(go.Scatter(x=serie['SEMANA'], y=serie['SUPERIOR'], mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=serie['SEMANA'], y=serie['INFERIOR'], mode='lines', line=dict(width=0),
+                                 fill='tonexty', fillcolor='rgba(99, 110, 250, 0.2)', name=faixa))
+        fig.add_trace(go.Scatter(x=serie['SEMANA'], y=serie['PREVISÃO'], mode='lines+markers',
+                                 name='Previsão', line=dict(dash='dash')))
+        fig.update_layout(title=titulo, xaxis_title='Semana', yaxis_title=medida)
+        figuras[titulo] = fig
+
+    # Soma das semanas do horizonte por produto; a faixa soma os limites de cada
+    # semana (conservadora)
+    produtos = previsto[previsto['DESCRIÇÃO'] != previsao.TODOS]
+    if not produtos.empty:
+        soma = produtos.pivot_table(index='DESCRIÇÃO', columns='MEDIDA', aggfunc='sum', observed=True,
+                                    values=['PREVISÃO', 'INFERIOR', 'SUPERIOR'])
+        top = soma.sort_values(('PREVISÃO', 'VLR. TOT. CUSTO'), ascending=False).head(10)
+        custo = {c: tabela.formatar_moeda(top[(c, 'VLR. TOT. CUSTO')], **tabela.FORMATO_AVARIAS)
+                 for c in ('PREVISÃO', 'INFERIOR', 'SUPERIOR')}
+        titulo = f"Produtos com Maior Custo Previsto - Próximas {previsao.HORIZONTE} Semanas"
+        fig_tabela = go.Figure(go.Table(
+            header=dict(values=['Produto', 'Custo previsto', faixa, 'Quantidade prevista'], align='left'),
+            cells=dict(values=[
+                top.index.astype(str),
+                custo['PREVISÃO'],
+                custo['INFERIOR'] + " a " + custo['SUPERIOR'],
+                top[('PREVISÃO', 'QTD')].round(0).astype(int).astype(str),
+            ], align='left'),
+        ))
+        fig_tabela.update_layout(title=titulo, height=120 + 30 * len(top))
+        figuras[titulo] = fig_tabela
+    return figuras
+
+# Participação de cada setor no custo do mês e tabela do último mês
+def figuras_comparativo_setores(indicadores):
+    import plotly.express as px
+    if indicadores.empty:
+        return {}
+    grafico = indicadores.assign(período=indicadores['MÊS'].astype(str))
+    titulo = "Participação dos Setores no Custo por Mês"
+    fig_participacao = px.bar(grafico, x='período', y='participação', color='CATEGORIA', title=titulo)
+    fig_participacao.update_layout(barmode='stack', yaxis_tickformat='.0%', yaxis_title='Participação')
+
+    ultimo = comparativo.ultimo_mes(indicadores)
+    razao = 'VLR. TOT. CUSTO / VLR. TOT. VENDA'
+    tabela_ultimo = comparativo.formatar_percentuais(ultimo, ['participação', 'var. mês', 'var. ano', razao])
+    tabela_ultimo['VLR. TOT. CUSTO'] = tabela.formatar_moeda(ultimo['VLR. TOT. CUSTO'], **tabela.FORMATO_AVARIAS)
+    colunas = ['CATEGORIA', 'VLR. TOT. CUSTO', 'participação', 'var. mês', 'var. ano', razao]
+    cabecalho = ['Setor', 'Custo', 'Participação', 'Var. mês anterior', 'Var. mesmo mês ano anterior', 'Custo / Venda']
+    titulo_tabela = f"Indicadores por Setor - {ultimo['MÊS'].iloc[0].strftime('%m/%Y')}"
+    fig_tabela = go.Figure(go.Table(
+        header=dict(values=cabecalho, align='left'),
+        cells=dict(values=[tabela_ultimo[c].astype(str) for c in colunas], align='left'),
+    ))
+    fig_tabela.update_layout(title=titulo_tabela, height=120 + 30 * len(tabela_ultimo))
+    return {titulo: fig_participacao, "Indicadores por Setor": fig_tabela}
+
+# Conciliação das perdas dos setores com a folha "Recuperação de Avarias" do
+# dashboard de prevenção, montada uma vez por versão dos dados dos dois lados
+@instrumentacao.medir("conciliacao")
+def conciliacao_setores(setores, lojas_filter=None):
+    import dashboard
+    folha = conciliacao.FOLHA_RECUPERACAO
+    versao = (versao_dados(lojas_filter), dashboard.versao_lojas(lojas_filter),
+              lancamentos.versao(dashboard.TABELA_BANCO, folha))
+
+    def carregar():
+        recuperacoes = dashboard.carregar_dados(folha, None, lojas_filter)
+        if not recuperacoes.empty:
+            recuperacoes = dashboard.processar_dates(recuperacoes)
+        return carregar_cubos(setores, lojas_filter), recuperacoes
+
+    try:
+        return conciliacao.obter((tuple(setores), tuple(sorted(lojas_filter or []))), versao, carregar)
+    except Exception as e:
+        st.error(f"Erro ao montar a conciliação: {e}")
+        return pd.DataFrame()
+
+# Visão "Conciliação com recuperações": perda, recuperado, perda líquida e taxa de
+# recuperação por produto, setor ou mês, e os produtos que não foram recuperados
+def mostrar_conciliacao(setores, lojas_filter):
+    import plotly.express as px
+    conciliado = conciliacao_setores(setores, lojas_filter)
+    if conciliado.empty:
+        st.warning("Nenhum dado encontrado.")
+        return
+
+    meses_conciliados = sorted(conciliado['MÊS'].unique())
+    inicio, fim = meses_conciliados[0], meses_conciliados[-1]
+    if len(meses_conciliados) > 1:
+        inicio, fim = st.select_slider("Meses", options=meses_conciliados, value=(inicio, fim),
+                                       format_func=lambda mes: mes.strftime('%m/%Y'))
+    opcoes = [s for s in setores + [conciliacao.SEM_AVARIA] if s in set(conciliado['CATEGORIA'])]
+    escolhidos = st.multiselect("Setores", opcoes, default=opcoes)
+    recorte = conciliacao.filtrar(conciliado, inicio, fim, escolhidos)
+
+    perda, recuperado = recorte['PERDA'].sum(), recorte['RECUPERADO'].sum()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Perda (venda)", f"R$ {perda:,.2f}")
+    c2.metric("Recuperado", f"R$ {recuperado:,.2f}")
+    c3.metric("Perda líquida", f"R$ {perda - recuperado:,.2f}")
+    c4.metric("Taxa de recuperação", f"{recuperado / perda:.1%}" if perda > 0 else "-")
+
+    por_mes = conciliacao.resumo(recorte, 'Mês')
+    if not por_mes.empty:
+        grafico = por_mes.assign(período=por_mes['MÊS'].astype(str)).melt(
+            id_vars='período', value_vars=['PERDA', 'RECUPERADO', 'PERDA LÍQUIDA'], var_name='medida', value_name='valor'
+        )
+        fig = px.line(grafico, x='período', y='valor', color='medida', markers=True,
+                      title="Perda, Recuperado e Perda Líquida por Mês", labels={'valor': 'R$', 'período': 'Mês'})
+        st.plotly_chart(fig)
+
+    st.markdown("### Conciliação por Período")
+    nivel = st.radio("Resumo por", list(conciliacao.NIVEIS), horizontal=True)
+    resumo = conciliacao.para_exibicao(conciliacao.resumo(recorte, nivel))
+    tabela.tabela_paginada(resumo, "conciliacao_resumo", conciliacao.COLUNAS_MOEDA, tabela.FORMATO_AVARIAS)
+    tabela.botoes_download(resumo, "conciliacao_resumo", f"conciliacao_{nivel.lower()}",
+                           conciliacao.COLUNAS_MOEDA, "Conciliação")
+
+    st.markdown("### Produtos Não Recuperados")
+    st.caption("Quantidade perdida no mês e na loja que não voltou na folha \"Recuperação de Avarias\".")
+    nao_recuperados = conciliacao.para_exibicao(conciliacao.nao_recuperados(recorte))
+    tabela.tabela_paginada(nao_recuperados, "conciliacao_nao_recuperados", conciliacao.COLUNAS_MOEDA,
+                           tabela.FORMATO_AVARIAS)
+    tabela.botoes_download(nao_recuperados, "conciliacao_nao_recuperados", "produtos_nao_recuperados",
+                           conciliacao.COLUNAS_MOEDA, "Não recuperados")
+
+# Figuras prontas, em JSON, por estado dos filtros e versão dos dados; compartilhadas
+# entre sessões. Cliques em botões e reruns com os mesmos filtros não refazem
+# groupbys nem figuras.
+@st.cache_resource
+def cache_figuras():
+    return CacheLRU(max_itens=128)
+
+# `versoes`: as da folha usadas nos dados da página (versoes_folha)
+def chave_filtros(setor, tipo_periodo, limites, responsavel_filter, lojas_filter, usuario_atual, versoes=None):
+    return (setor, tipo_periodo, limites, tuple(sorted(responsavel_filter)),
+            versoes or versao_dados(lojas_filter), usuario_atual)
+
+# `construir()` devolve {título: figura ou None}
+def figuras_em_cache(chave, construir):
+    def serializar():
+        figuras = construir()
+        with instrumentacao.medir("figuras_to_json"):
+            return {nome: None if fig is None else fig.to_json() for nome, fig in figuras.items()}
+    jsons = cache_figuras().obter_ou_calcular(chave, serializar)
+    with instrumentacao.medir("figuras_from_json"):
+        return {nome: None if js is None else pio.from_json(js) for nome, js in jsons.items()}
+
+def figura_em_cache(chave, construir):
+    return figuras_em_cache(chave, lambda: {None: construir()})[None]
+
+@instrumentacao.medir("exportar_pdf")
 def exportar_pdf(df, titulo="Tabela de Avarias Detalhada"):
-    st.warning("Exportação para PDF está desabilitada devido a dependências ausentes no ambiente.")
-    return None
+    import relatorio_pdf
+    return relatorio_pdf.gerar_relatorio({}, {titulo: df}, titulo=titulo)
 
+@instrumentacao.medir("exportar_tudo_pdf")
 def exportar_tudo_pdf(figs_dict, tabelas_dict, titulo="Relatório de Avarias"):
-    st.warning("Exportação para PDF está desabilitada devido a dependências ausentes no ambiente.")
-    return None
+    import relatorio_pdf
+    return relatorio_pdf.gerar_relatorio(figs_dict, tabelas_dict, titulo=titulo)
 
+@instrumentacao.medir("plotly_fig_to_pdf")
 def plotly_fig_to_pdf(fig, pdf_title="grafico_avarias.pdf"):
-    # Export Plotly figure to PNG in memory
-    img_bytes = pio.to_image(fig, format="png", width=1000, height=600, scale=2)
-    # Save PNG to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_img:
-        tmp_img.write(img_bytes)
-        tmp_img.flush()
-        img_path = tmp_img.name
-
-    # Create PDF and add image
-    pdf = FPDF(orientation='L', unit='mm', format='A4')
-    pdf.add_page()
-    cover = Image.open(img_path)
-    width, height = cover.size
-    w, h = float(width * 0.264583), float(height * 0.264583)  # px to mm
-    pdf.image(img_path, x=10, y=10, w=min(w, 277), h=min(h, 190))  # A4 landscape max: 297x210mm
-    pdf_bytes = pdf.output(dest='S').encode('latin1')
-    return pdf_bytes
+    import relatorio_pdf
+    # PNG rendered in memory by the kaleido pool, no temporary files
+    return relatorio_pdf.figura_para_pdf(fig, titulo=fig.layout.title.text or "Gráfico de Avarias")
 
 def app():
     if not login_popup("avarias"):
         return
+    instrumentacao.iniciar_execucao("avarias")
 
     st.title("Dashboard de Avarias")
+
+    # Planilhas novas ou alteradas são reimportadas em segundo plano
+    vigia.iniciar(diretorio_lojas, lojas.PADRAO_AVARIAS, folhas, ler_folha, VERSAO_LIMPEZA, TABELA_BANCO)
     
     meses = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
              'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
@@ -166,90 +675,94 @@ def app():
 
     with st.sidebar:
         st.title("Navegação")
+        visao = st.radio('Visão', ['Por setor', 'Conciliação com recuperações'], horizontal=True)
+        if visao == 'Conciliação com recuperações':
+            # Lojas: vazio = todas
+            todas_lojas = list(lojas_disponiveis())
+            lojas_filter = st.multiselect("Filtrar por Loja", todas_lojas) if len(todas_lojas) > 1 else []
+
+    if visao == 'Conciliação com recuperações':
+        mostrar_conciliacao(["Avarias Padaria"] if usuario_atual == "gerente" else folhas, lojas_filter)
+        mostrar_estatisticas_cache(usuario_atual)
+        return
+
+    with st.sidebar:
         if usuario_atual == "gerente":
             setor = "Avarias Padaria"
             st.info("Acesso restrito: Avarias Padaria")
         else:
             setor = st.selectbox('Escolha o setor', folhas)
-        tipo_periodo = st.selectbox('Escolha o período', ['Geral', 'Mês', 'Semana'])
+        tipo_periodo = st.selectbox('Escolha o período', ['Geral'] + periodo.TIPOS_PERIODO)
 
-        # Carregar dados para filtro de responsável
-        df_temp = carregar_dados(setor)
+        # Lojas: vazio = todas
+        todas_lojas = list(lojas_disponiveis())
+        if len(todas_lojas) > 1:
+            lojas_filter = st.multiselect("Filtrar por Loja", todas_lojas)
+        else:
+            lojas_filter = []
+
+        # Filtro de responsável a partir do cubo, sem tocar nas linhas. O cubo e as
+        # linhas do período saem da mesma versão publicada das planilhas.
+        try:
+            versoes = versoes_folha(setor, lojas_filter)
+            cubo = carregar_cubo(setor, lojas_filter, versoes)
+        except ingestao.ErroPlanilhaInstavel as e:
+            st.error(str(e))
+            versoes, cubo = None, pd.DataFrame()
         responsaveis = []
-        if not df_temp.empty and 'RESPONSÁVEL' in df_temp.columns:
-            responsaveis = sorted(df_temp['RESPONSÁVEL'].dropna().unique())
+        if not cubo.empty:
+            responsaveis = sorted(cubo['RESPONSÁVEL'].dropna().unique())
+        if responsaveis:
             responsavel_filter = st.multiselect("Filtrar por Responsável", responsaveis)
         else:
             responsavel_filter = []
 
+        if st.button("Recarregar dados"):
+            limpar_cache_dados()
+            st.rerun()
+
         if usuario_atual != "gerente":
             if st.button("Ir para Dashboard Prevenção"):
                 st.session_state.page = "dashboard"
                 st.session_state.logged_in_avarias = False
                 st.rerun()
 
-    df = carregar_dados(setor)
-    if df.empty:
+    # Lançamentos direto no banco, no lugar da planilha compartilhada
+    formulario.mostrar("avarias", TABELA_BANCO, [setor] if usuario_atual == "gerente" else folhas,
+                       todas_lojas, usuario_atual, "Lançar avarias")
+
+    if cubo.empty:
         st.error("Nenhum dado encontrado.")
+        mostrar_estatisticas_cache(usuario_atual)
         return
-        
-    df = processar_datas(df)
+
+    # Gerente só vê os alertas da padaria, admin vê todos os setores
+    mostrar_alertas(["Avarias Padaria"] if usuario_atual == "gerente" else folhas, lojas_filter)
 
     # Aplicar filtro de responsável, se houver
-    if responsavel_filter and 'RESPONSÁVEL' in df.columns:
-        df = df[df['RESPONSÁVEL'].isin(responsavel_filter)]
+    if responsavel_filter:
+        cubo = cubo[cubo['RESPONSÁVEL'].isin(responsavel_filter)]
 
-    if tipo_periodo == 'Mês':
-        mes_selecionado = st.sidebar.selectbox('Escolha o mês', meses)
-        st.session_state.mes_selecionado = mes_selecionado
-        valor_periodo = meses.index(mes_selecionado) + 1
-        df_filtrado = filtrar_por_periodo(df, tipo_periodo, valor_periodo, meses)
-    elif tipo_periodo == 'Semana':
-        mes_selecionado = st.sidebar.selectbox('Escolha o mês para as semanas', meses)
-        st.session_state.mes_selecionado = mes_selecionado
-        semanas = ['Dia 1-7', 'Dia 8-14', 'Dia 15-21', 'Dia 22-31']
-        valor_periodo = st.sidebar.selectbox('Escolha a semana', semanas)
-        df_filtrado = filtrar_por_periodo(df, tipo_periodo, valor_periodo, meses)
+    if tipo_periodo != 'Geral':
+        inicio, fim = escolher_periodo(tipo_periodo, cubo, meses)
+        chave = chave_filtros(setor, tipo_periodo, (inicio, fim), responsavel_filter, lojas_filter, usuario_atual,
+                              versoes)
+        cubo_filtrado = filtrar_por_periodo(cubo, inicio, fim)
+
+        # Só as linhas do período saem do banco
+        intervalos = [banco.intervalo_iso(inicio, fim)]
+        df_filtrado = processar_datas(carregar_periodo(setor, intervalos, lojas_filter, versoes))
+        if responsavel_filter:
+            df_filtrado = df_filtrado[df_filtrado['RESPONSÁVEL'].isin(responsavel_filter)]
     else:
-        df_filtrado = df.copy()
-        # Restrição: gerente só vê padaria, admin vê tudo
-        if usuario_atual == "gerente":
-            df_all = processar_datas(carregar_dados("Avarias Padaria")).assign(CATEGORIA="Avarias Padaria")
-        else:
-            df_all = pd.concat([processar_datas(carregar_dados(folha)).assign(CATEGORIA=folha) for folha in folhas])
-        
-        # Gráficos para visão geral
-        vendas_por_mes_por_setor = df_all.groupby(['CATEGORIA', 'mês']).agg({'VLR. TOT. VENDA': 'sum'}).reset_index()
-        vendas_por_mes_por_setor['mês_nome'] = vendas_por_mes_por_setor['mês'].apply(
-            lambda x: meses[int(x) - 1] if pd.notna(x) else 'Desconhecido'
+        # Os dados de todas as folhas só são lidos e agrupados se as figuras não estão em cache
+        chave = chave_filtros(setor, tipo_periodo, None, responsavel_filter, lojas_filter, usuario_atual)
+        figuras = figuras_em_cache(
+            chave, lambda: figuras_geral(setor, lojas_filter, responsavel_filter, usuario_atual, meses)
         )
-        # Se gerente, só mostra o gráfico da padaria
-        if usuario_atual == "gerente":
-            vendas_por_mes_por_setor = vendas_por_mes_por_setor[vendas_por_mes_por_setor['CATEGORIA'] == "Avarias Padaria"]
-
-        fig_vendas_por_setor = px.line(vendas_por_mes_por_setor, x='mês_nome', y='VLR. TOT. VENDA', color='CATEGORIA')
-        fig_vendas_por_setor.update_layout(title="Valor Total de Venda por Mês por Setor")
-        st.plotly_chart(fig_vendas_por_setor)
-        vendas_por_mes = df.groupby('mês').agg({'VLR. TOT. VENDA': 'sum'}).reset_index()
-        vendas_por_mes['mês_nome'] = vendas_por_mes['mês'].apply(
-            lambda x: meses[int(x) - 1] if pd.notna(x) else 'Desconhecido'
-        )
-        vendas_por_mes['Média Móvel (3 meses)'] = vendas_por_mes['VLR. TOT. VENDA'].rolling(window=3, min_periods=1).mean()
-        
-        fig_vendas = go.Figure()
-        fig_vendas.add_trace(go.Scatter(x=vendas_por_mes['mês_nome'], y=vendas_por_mes['VLR. TOT. VENDA'],
-                                      mode='lines+markers', name='Valor Real'))
-        fig_vendas.add_trace(go.Scatter(x=vendas_por_mes['mês_nome'], y=vendas_por_mes['Média Móvel (3 meses)'],
-                                      mode='lines', name='Média Móvel (3 meses)', line=dict(dash='dash')))
-        fig_vendas.update_layout(title="Valor Total de Venda por Mês (com Média Móvel)")
-        st.plotly_chart(fig_vendas)
-
-        # Padrões Sazonais
-        custo_por_semana_ano = df_all.groupby(['ano', 'semana'])['VLR. TOT. CUSTO'].sum().reset_index()
-        fig_heatmap = px.density_heatmap(custo_por_semana_ano, x='semana', y='ano', z='VLR. TOT. CUSTO',
-                                       title="Padrões Sazonais - Custos por Semana e Ano",
-                                       color_continuous_scale="Viridis")
-        st.plotly_chart(fig_heatmap)
+        for fig in figuras.values():
+            if fig is not None:
+                st.plotly_chart(fig)
 
     if tipo_periodo != 'Geral':
         total_vendas = df_filtrado['VLR. TOT. VENDA'].sum()
@@ -260,39 +773,28 @@ def app():
 
         figs_dict = {}
         tabelas_dict = {}
+        produtos = _cache_sessao().obter_ou_calcular(('produtos',) + chave, lambda: por_produto(cubo_filtrado))
+
+        fig_lojas = figura_em_cache(chave + ("lojas",), lambda: figura_comparativo_lojas(cubo_filtrado))
+        if fig_lojas is not None:
+            st.plotly_chart(fig_lojas)
+            figs_dict["Comparativo entre Lojas"] = fig_lojas
 
-        top_10_qtd = top_10_por_qtd(df_filtrado)
-        if not top_10_qtd.empty:
-            fig_qtd = px.bar(top_10_qtd.reset_index(), x='DESCRIÇÃO', y='QTD',
-                           title="Top 10 Produtos por Quantidade Perdida")
+        titulo = "Top 10 Produtos por Quantidade Perdida"
+        fig_qtd = figura_em_cache(chave + (titulo,), lambda: figura_top_10(top_10_por_qtd(produtos), 'QTD', titulo))
+        if fig_qtd is not None:
             st.plotly_chart(fig_qtd)
-            figs_dict["Top 10 Produtos por Quantidade Perdida"] = fig_qtd
-        else:
-            figs_dict["Top 10 Produtos por Quantidade Perdida"] = None
+        figs_dict[titulo] = fig_qtd
 
-        all_produtos = all_produtos_por_qtd(df_filtrado)
-        if not all_produtos.empty:
+        if not produtos.empty:
             st.markdown("### Todos os Produtos por Quantidade Perdida (Ordem Decrescente)")
-            fig_all = px.bar(
-                all_produtos,
-                x='DESCRIÇÃO',
-                y='QTD',
-                title="Todos os Produtos por Quantidade Perdida",
-                labels={'DESCRIÇÃO': 'Produto', 'QTD': 'Quantidade Perdida'}
-            )
-            fig_all.update_traces(
-                text=[
-                    f"Qtd: {row.QTD:.0f}<br>Valor: R$ {row['VLR. TOT. VENDA']:,.2f}"
-                    for _, row in all_produtos.iterrows()
-                ],
-                textposition='outside'
-            )
-            fig_all.update_layout(
-                xaxis_tickangle=-45,
-                margin=dict(b=150),
-                height=600
+            st.caption(f"{len(produtos)} produtos no período; os que não cabem no gráfico aparecem somados em \"Outros\".")
+            limite = st.slider("Produtos exibidos no gráfico", 10, 200, LIMITE_PRODUTOS_GRAFICO, step=10)
+            fig_all = figura_em_cache(
+                chave + ("todos", limite),
+                lambda: figura_todos_produtos(produtos_com_outros(all_produtos_por_qtd(produtos), limite)),
             )
-            st.plotly_chart(fig_all, use_container_width=True)
+            st.plotly_chart(fig_all, width="stretch")
             figs_dict["Todos os Produtos por Quantidade Perdida"] = fig_all
 
             # PDF download button
@@ -307,43 +809,59 @@ def app():
         else:
             figs_dict["Todos os Produtos por Quantidade Perdida"] = None
 
-        top_10_vendas = top_10_por_valor_venda(df_filtrado)
-        if not top_10_vendas.empty:
-            fig_vendas = px.bar(top_10_vendas.reset_index(), x='DESCRIÇÃO', y='VLR. TOT. VENDA',
-                              title="Top 10 Produtos por Valor Total de Venda Perdido")
+        titulo = "Top 10 Produtos por Valor Total de Venda Perdido"
+        fig_vendas = figura_em_cache(
+            chave + (titulo,), lambda: figura_top_10(top_10_por_valor_venda(produtos), 'VLR. TOT. VENDA', titulo)
+        )
+        if fig_vendas is not None:
             st.plotly_chart(fig_vendas)
-            figs_dict["Top 10 Produtos por Valor Total de Venda Perdido"] = fig_vendas
-        else:
-            figs_dict["Top 10 Produtos por Valor Total de Venda Perdido"] = None
+        figs_dict[titulo] = fig_vendas
 
-        top_10_custo = top_10_por_valor_custo(df_filtrado)
-        if not top_10_custo.empty:
-            fig_custo = px.bar(top_10_custo.reset_index(), x='DESCRIÇÃO', y='VLR. TOT. CUSTO',
-                             title="Top 10 Produtos por Valor Total de Custo Perdido")
+        titulo = "Top 10 Produtos por Valor Total de Custo Perdido"
+        fig_custo = figura_em_cache(
+            chave + (titulo,), lambda: figura_top_10(top_10_por_valor_custo(produtos), 'VLR. TOT. CUSTO', titulo)
+        )
+        if fig_custo is not None:
             st.plotly_chart(fig_custo)
-            figs_dict["Top 10 Produtos por Valor Total de Custo Perdido"] = fig_custo
-        else:
-            figs_dict["Top 10 Produtos por Valor Total de Custo Perdido"] = None
+        figs_dict[titulo] = fig_custo
 
+        # Só a página visível é formatada e enviada; o PDF formata tudo só no clique
         st.markdown("### Tabela de Avarias Detalhada")
-        df_exibicao = df_filtrado[['DATA', 'DESCRIÇÃO', 'QTD', 'VLR. UNIT. VENDA', 'VLR. UNIT. CUSTO', 
-                                 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']].copy()
-        for col in ['VLR. UNIT. VENDA', 'VLR. UNIT. CUSTO', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']:
-            df_exibicao[f'{col} (R$)'] = df_exibicao[col].apply(lambda x: f"R$ {x:,.2f}" if pd.notna(x) else "R$ 0,00")
-        st.dataframe(df_exibicao[['DATA', 'DESCRIÇÃO', 'QTD', 'VLR. UNIT. VENDA (R$)', 
-                                'VLR. UNIT. CUSTO (R$)', 'VLR. TOT. VENDA (R$)', 'VLR. TOT. CUSTO (R$)']])
-        tabelas_dict["Tabela de Avarias Detalhada"] = df_exibicao[['DATA', 'DESCRIÇÃO', 'QTD', 'VLR. UNIT. VENDA (R$)', 
-                                'VLR. UNIT. CUSTO (R$)', 'VLR. TOT. VENDA (R$)', 'VLR. TOT. CUSTO (R$)']]
+        df_exibicao = df_filtrado[['DATA', 'DESCRIÇÃO', 'QTD', 'VLR. UNIT. VENDA', 'VLR. UNIT. CUSTO',
+                                 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']]
+        tabela.tabela_paginada(df_exibicao, "avarias_detalhe", COLUNAS_MOEDA, tabela.FORMATO_AVARIAS)
+        tabela.botoes_download(df_exibicao, "avarias_detalhe", f"avarias_detalhada_{setor}", COLUNAS_MOEDA, "Detalhe")
+        tabelas_dict["Tabela de Avarias Detalhada"] = df_exibicao
+
+        st.markdown("### Tabela de Avarias - Resumo")
+        resumo = resumo_avarias(produtos)[['DESCRIÇÃO', 'QTD', 'CÓD. INT.', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']]
+        df_resumo = tabela.formatar_colunas(resumo, ['VLR. TOT. VENDA', 'VLR. TOT. CUSTO'], tabela.FORMATO_AVARIAS)
+        st.dataframe(df_resumo)
+        tabela.botoes_download(resumo, "avarias_resumo", f"avarias_resumo_{setor}",
+                               ['VLR. TOT. VENDA', 'VLR. TOT. CUSTO'], "Resumo")
+        tabelas_dict["Tabela de Avarias - Resumo"] = df_resumo
 
         # Botão para exportar tudo para PDF
         if st.button("Exportar gráficos e tabelas para PDF"):
-            st.warning("Exportação para PDF está desabilitada devido a dependências ausentes no ambiente.")
+            titulo = f"Relatório de Avarias - {setor}"
+            with st.spinner("Gerando relatório..."):
+                try:
+                    tabelas_dict["Tabela de Avarias Detalhada"] = tabela.formatar_colunas(
+                        df_exibicao, COLUNAS_MOEDA, tabela.FORMATO_AVARIAS
+                    )
+                    pdf_bytes = exportar_tudo_pdf(figs_dict, tabelas_dict, titulo=titulo)
+                except Exception as e:
+                    st.error(f"Erro ao gerar o PDF: {e}")
+                    pdf_bytes = None
+            if pdf_bytes:
+                st.download_button(
+                    label="Download PDF",
+                    data=pdf_bytes,
+                    file_name="relatorio_avarias.pdf",
+                    mime="application/pdf"
+                )
 
-        st.markdown("### Tabela de Avarias - Resumo")
-        df_resumo = resumo_avarias(df_filtrado)
-        for col in ['VLR. TOT. VENDA', 'VLR. TOT. CUSTO']:
-            df_resumo[f'{col} (R$)'] = df_resumo[col].apply(lambda x: f"R$ {x:,.2f}" if pd.notna(x) else "R$ 0,00")
-        st.dataframe(df_resumo[['DESCRIÇÃO', 'QTD', 'CÓD. INT.', 'VLR. TOT. VENDA (R$)', 'VLR. TOT. CUSTO (R$)']])
+    mostrar_estatisticas_cache(usuario_atual)
 
 if __name__ == "__main__":
     if "page" not in st.session_state:
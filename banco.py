@@ -0,0 +1,435 @@
+# banco.py
+# Espelho incremental das planilhas no dashboard.db.
+# Cada folha é importada só quando a planilha muda, e apenas as linhas que
+# mudaram (identificadas por uma impressão digital do conteúdo) são gravadas
+# ou apagadas. Os dashboards consultam por intervalo de datas, usando os índices.
+# As consultas juntam ao espelho os lançamentos feitos direto no banco
+# (lancamentos.py). O esquema (tabelas, migrações e modo WAL) é criado num passo
+# explícito, migrar(), por quem grava; conectar() não altera o banco.
+import argparse
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+CAMINHO_BANCO = "./dashboard.db"
+
+# Coluna da planilha -> coluna da tabela
+COLUNAS_AVARIAS = {
+    'DATA': 'data',
+    'CÓD. INT.': 'codigo_interno',
+    'DESCRIÇÃO': 'descricao',
+    'QTD': 'qtd',
+    'VLR. UNIT. VENDA': 'vlr_unit_venda',
+    'VLR. UNIT. CUSTO': 'vlr_unit_custo',
+    'VLR. TOT. VENDA': 'vlr_tot_venda',
+    'VLR. TOT. CUSTO': 'vlr_tot_custo',
+    'RESPONSÁVEL': 'responsavel',
+    'LOJA': 'loja',
+}
+COLUNAS_PREVENCAO = {
+    'DATA': 'data',
+    'CÓDIGO BARRAS': 'codigo_barras',
+    'CÓDIGO INTERNO': 'codigo_interno',
+    'DESCRIÇÃO': 'descricao',
+    'QTD': 'qtd',
+    'VLR. UNI.': 'vlr_uni',
+    'TOTAL': 'total',
+    'PREV.': 'responsavel',
+    'LOJA': 'loja',
+}
+TABELAS = {
+    'planilha_avarias': COLUNAS_AVARIAS,
+    'planilha_prevencao': COLUNAS_PREVENCAO,
+}
+_TIPOS = {'data': 'TEXT', 'qtd': 'REAL', 'codigo_barras': 'TEXT', 'codigo_interno': 'TEXT',
+          'descricao': 'TEXT', 'responsavel': 'TEXT', 'loja': 'TEXT'}
+# Tabela dos lançamentos de cada espelho e colunas que lá têm outro nome.
+# furtos_recuperados já existia com codigo_barras (NOT NULL, '' se não houver),
+# descricao e quantidade.
+LANCAMENTOS = {
+    'planilha_avarias': ('avarias_lancadas', {}),
+    'planilha_prevencao': ('furtos_recuperados', {'qtd': 'quantidade'}),
+}
+
+
+# Conexão sem DDL: o esquema já deve ter sido criado por migrar()
+def conectar(caminho=None):
+    conn = sqlite3.connect(caminho or CAMINHO_BANCO, timeout=30, check_same_thread=False)
+    # Só vale para esta conexão (em WAL, sem fsync a cada commit)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+# Caminhos já migrados neste processo
+_migrados = set()
+_lock_migracao = threading.Lock()
+
+
+# Cria e migra o esquema numa só transação BEGIN IMMEDIATE, uma vez por processo e
+# caminho. Chamado por quem grava (sincronização das folhas, vigia, gravador de
+# lançamentos) antes da primeira gravação, ou pela linha de comando.
+def migrar(caminho=None):
+    caminho = os.path.abspath(caminho or CAMINHO_BANCO)
+    with _lock_migracao:
+        if caminho in _migrados:
+            return
+        conn = sqlite3.connect(caminho, timeout=30, isolation_level=None)
+        try:
+            # WAL: os dashboards continuam lendo enquanto os terminais gravam
+            # lançamentos. Fica gravado no arquivo e não muda dentro de transação.
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError:
+                pass
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                criar_tabelas(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        _migrados.add(caminho)
+
+
+# (mtime, tamanho) do arquivo do banco e do -wal: muda a cada gravação, sem abrir o banco
+def estado_arquivo(caminho=None):
+    caminho = caminho or CAMINHO_BANCO
+    estado = []
+    for arquivo in (caminho, caminho + '-wal'):
+        try:
+            info = os.stat(arquivo)
+            estado.append((info.st_mtime_ns, info.st_size))
+        except OSError:
+            estado.append(None)
+    return tuple(estado)
+
+
+def _colunas_existentes(conn, tabela):
+    return {linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+
+
+# As tabelas planilha_* são só um espelho das planilhas: se o esquema mudou
+# (ex.: coluna loja nova), a tabela é recriada e reimportada na próxima sincronização
+def _migrar(conn):
+    existentes = _colunas_existentes(conn, 'importacoes')
+    if existentes and 'loja' not in existentes:
+        conn.execute("DROP TABLE importacoes")
+    for tabela, colunas in TABELAS.items():
+        existentes = _colunas_existentes(conn, tabela)
+        if existentes and not set(colunas.values()) <= existentes:
+            conn.execute(f"DROP TABLE {tabela}")
+            if _colunas_existentes(conn, 'importacoes'):
+                conn.execute("DELETE FROM importacoes WHERE tabela = ?", (tabela,))
+
+
+# DDL do esquema, dentro da transação aberta por migrar()
+def criar_tabelas(conn):
+    _migrar(conn)
+    for tabela, colunas in TABELAS.items():
+        definicoes = ",\n".join(f"{c} {_TIPOS.get(c, 'REAL')}" for c in colunas.values())
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                folha TEXT NOT NULL,
+                {definicoes},
+                impressao INTEGER NOT NULL,
+                UNIQUE (folha, impressao)
+            )""")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_folha_data ON {tabela} (folha, data)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_folha_loja_data ON {tabela} (folha, loja, data)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_data ON {tabela} (data)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_codigo_interno ON {tabela} (codigo_interno)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_responsavel ON {tabela} (folha, responsavel)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS importacoes (
+            tabela TEXT NOT NULL,
+            loja TEXT NOT NULL,
+            folha TEXT NOT NULL,
+            assinatura TEXT NOT NULL,
+            linhas_novas INTEGER NOT NULL,
+            importado_em TEXT NOT NULL,
+            PRIMARY KEY (tabela, loja, folha)
+        )""")
+    _criar_lancamentos(conn)
+
+
+# Colunas da tabela de lançamentos de um espelho (nome na tabela -> tipo)
+def colunas_lancadas(tabela):
+    _, renomeadas = LANCAMENTOS[tabela]
+    colunas = {'folha': 'TEXT'}
+    for coluna in TABELAS[tabela].values():
+        colunas[renomeadas.get(coluna, coluna)] = _TIPOS.get(coluna, 'REAL')
+    colunas.update({'terminal': 'TEXT', 'lancado_em': 'TEXT'})
+    return colunas
+
+
+def _criar_lancamentos(conn):
+    for tabela, (lancada, _) in LANCAMENTOS.items():
+        colunas = colunas_lancadas(tabela)
+        definicoes = ",\n".join(
+            f"{c} {tipo}" + (" NOT NULL" if c == 'codigo_barras' else "") for c, tipo in colunas.items()
+        )
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {lancada} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {definicoes}
+            )""")
+        # Tabela antiga (furtos_recuperados) ganha as colunas que faltam
+        existentes = _colunas_existentes(conn, lancada)
+        for coluna, tipo in colunas.items():
+            if coluna not in existentes:
+                conn.execute(f"ALTER TABLE {lancada} ADD COLUMN {coluna} {tipo}")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{lancada}_folha_data ON {lancada} (folha, data)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{lancada}_folha_loja_data ON {lancada} (folha, loja, data)")
+    # Versão dos lançamentos por folha: sobe na mesma transação de cada gravação
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS versoes_lancamentos (
+            tabela TEXT NOT NULL,
+            folha TEXT NOT NULL,
+            versao INTEGER NOT NULL,
+            PRIMARY KEY (tabela, folha)
+        )""")
+
+
+# Códigos vêm como int, float (123.0) ou texto; no banco ficam como texto sem ".0"
+def codigo_texto(coluna):
+    numeros = pd.to_numeric(coluna, errors='coerce')
+    inteiros = numeros.notna() & (numeros % 1 == 0)
+    texto = coluna.astype(object).where(coluna.isna(), coluna.astype(str).str.strip())
+    texto[inteiros] = numeros[inteiros].astype('int64').astype(str)
+    return texto
+
+
+# Frame com os nomes de coluna da planilha -> colunas da tabela (data ISO, códigos como texto)
+def para_tabela(df, colunas):
+    saida = pd.DataFrame(index=df.index)
+    for origem, destino in colunas.items():
+        coluna = df[origem] if origem in df.columns else None
+        if isinstance(getattr(coluna, 'dtype', None), pd.CategoricalDtype):
+            coluna = coluna.astype(object)
+        saida[destino] = coluna
+    saida['data'] = pd.to_datetime(saida['data'], errors='coerce').dt.strftime('%Y-%m-%d')
+    for col in ('codigo_barras', 'codigo_interno'):
+        if col in saida.columns:
+            saida[col] = codigo_texto(saida[col])
+    return saida.reset_index(drop=True)
+
+
+# Impressão digital por linha: hash do conteúdo + ordem da repetição, para que
+# lançamentos idênticos no mesmo dia continuem contando como linhas distintas
+def impressoes(linhas):
+    base = pd.util.hash_pandas_object(linhas, index=False)
+    ocorrencia = base.groupby(base.values).cumcount()
+    combinado = pd.util.hash_pandas_object(
+        pd.DataFrame({'base': base.values, 'ocorrencia': ocorrencia.values}), index=False
+    )
+    return combinado.values.view(np.int64)
+
+
+def _assinatura_importada(conn, tabela, loja, folha):
+    linha = conn.execute(
+        "SELECT assinatura FROM importacoes WHERE tabela = ? AND loja = ? AND folha = ?", (tabela, loja, folha)
+    ).fetchone()
+    return linha[0] if linha else None
+
+
+# Versão importada de uma folha: assinatura da planilha e versão da limpeza, para
+# que uma limpeza nova reimporte a folha mesmo sem a planilha mudar
+def _chave_importacao(assinatura, versao):
+    return assinatura if versao is None else f"{assinatura}-v{versao}"
+
+
+def ja_importada(conn, tabela, loja, folha, assinatura, versao=None):
+    return _assinatura_importada(conn, tabela, loja, folha) == _chave_importacao(assinatura, versao)
+
+
+# Aplica ao banco a diferença entre a folha já limpa de uma loja e o que já foi
+# importado: grava só as linhas novas e apaga as que sumiram ou foram editadas na
+# planilha. `assinatura` identifica a versão da planilha importada e `versao`, a
+# da limpeza que gerou `df`.
+def importar_folha(conn, tabela, loja, folha, df, assinatura, versao=None):
+    colunas = TABELAS[tabela]
+    linhas = para_tabela(df.assign(LOJA=loja), colunas)
+    linhas['impressao'] = impressoes(linhas)
+
+    existentes = np.fromiter(
+        (r[0] for r in conn.execute(
+            f"SELECT impressao FROM {tabela} WHERE folha = ? AND loja = ?", (folha, loja)
+        )),
+        dtype=np.int64,
+    )
+    novas = linhas[~np.isin(linhas['impressao'].values, existentes)]
+    removidas = existentes[~np.isin(existentes, linhas['impressao'].values)]
+    nomes = list(colunas.values()) + ['impressao']
+    registros = (
+        (folha, *[None if pd.isna(v) else v for v in registro])
+        for registro in novas[nomes].itertuples(index=False, name=None)
+    )
+    with conn:
+        conn.executemany(
+            f"DELETE FROM {tabela} WHERE folha = ? AND impressao = ?",
+            ((folha, int(i)) for i in removidas),
+        )
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {tabela} (folha, {', '.join(nomes)}) "
+            f"VALUES ({', '.join('?' * (len(nomes) + 1))})",
+            registros,
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO importacoes VALUES (?, ?, ?, ?, ?, ?)",
+            (tabela, loja, folha, _chave_importacao(assinatura, versao), len(novas),
+             datetime.now().isoformat(timespec='seconds')),
+        )
+    return len(novas)
+
+
+# Garante que o banco reflete a versão atual da folha da loja. `carregar()` só é
+# chamada quando a assinatura ou a versão da limpeza mudaram desde a última importação.
+def sincronizar(conn, tabela, loja, folha, assinatura, carregar, versao=None):
+    if ja_importada(conn, tabela, loja, folha, assinatura, versao):
+        return 0
+    return importar_folha(conn, tabela, loja, folha, carregar(), assinatura, versao)
+
+
+# Lançamentos de um espelho com os nomes de coluna do espelho (só os que têm folha:
+# as linhas antigas de furtos_recuperados não têm data nem folha)
+def _lancados(tabela):
+    lancada, renomeadas = LANCAMENTOS[tabela]
+    colunas = ['id', 'folha'] + list(TABELAS[tabela].values())
+    expressoes = {c: f"{nome} AS {c}" for c, nome in renomeadas.items()}
+    expressoes['codigo_barras'] = "NULLIF(codigo_barras, '') AS codigo_barras"
+    selecao = ", ".join(expressoes.get(c, c) for c in colunas)
+    return f"(SELECT {selecao} FROM {lancada} WHERE folha IS NOT NULL)"
+
+
+# Fonte das consultas: espelho das planilhas mais os lançamentos. O SQLite leva os
+# filtros de folha/loja/data para dentro das duas partes e usa os índices de cada uma.
+def _fonte(tabela, lancados=False):
+    if lancados:
+        return _lancados(tabela)
+    colunas = ", ".join(['id', 'folha'] + list(TABELAS[tabela].values()))
+    return f"(SELECT {colunas} FROM {tabela} UNION ALL SELECT {colunas} FROM {_lancados(tabela)})"
+
+
+# {(tabela, folha): versão} dos lançamentos
+def versoes_lancamentos(conn):
+    return {(tabela, folha): versao for tabela, folha, versao in conn.execute(
+        "SELECT tabela, folha, versao FROM versoes_lancamentos"
+    )}
+
+
+# Intervalo [início, fim) em ISO a partir dos limites de periodo.limites_periodo
+def intervalo_iso(inicio, fim):
+    return (f"{inicio:%Y-%m-%d}", f"{fim:%Y-%m-%d}")
+
+
+# Restrição "folha = ? [AND loja IN (...)]"; `lojas` None não filtra por loja
+def _onde(folha, lojas):
+    sql = "folha = ?"
+    parametros = [folha]
+    if lojas is not None:
+        sql += f" AND loja IN ({', '.join('?' * len(lojas))})"
+        parametros += list(lojas)
+    return sql, parametros
+
+
+def anos_disponiveis(conn, tabela, folha, lojas=None):
+    onde, parametros = _onde(folha, lojas)
+    return [
+        int(r[0]) for r in conn.execute(
+            f"SELECT DISTINCT substr(data, 1, 4) FROM {_fonte(tabela)} WHERE {onde} AND data IS NOT NULL ORDER BY 1",
+            parametros,
+        )
+    ]
+
+
+def valores_distintos(conn, tabela, folha, coluna, lojas=None):
+    onde, parametros = _onde(folha, lojas)
+    return [
+        r[0] for r in conn.execute(
+            f"SELECT DISTINCT {coluna} FROM {_fonte(tabela)} WHERE {onde} AND {coluna} IS NOT NULL ORDER BY 1",
+            parametros,
+        )
+    ]
+
+
+# Primeira e última data da folha (ISO), ou (None, None) se não há datas
+def limites_datas(conn, tabela, folha, lojas=None):
+    onde, parametros = _onde(folha, lojas)
+    return conn.execute(f"SELECT MIN(data), MAX(data) FROM {_fonte(tabela)} WHERE {onde}", parametros).fetchone()
+
+
+def contar_linhas(conn, tabela, folha, lojas=None):
+    onde, parametros = _onde(folha, lojas)
+    return conn.execute(f"SELECT COUNT(*) FROM {_fonte(tabela)} WHERE {onde}", parametros).fetchone()[0]
+
+
+# Somas de `medidas` (nomes da planilha) por folha e mês, de todas as folhas da
+# tabela numa só consulta: CATEGORIA, MÊS (período mensal) e uma coluna por medida
+def totais_mensais(conn, tabela, medidas, lojas=None):
+    colunas = TABELAS[tabela]
+    somas = ", ".join(f'SUM({colunas[m]}) AS "{m}"' for m in medidas)
+    onde, parametros = "data IS NOT NULL", []
+    if lojas is not None:
+        onde += f" AND loja IN ({', '.join('?' * len(lojas))})"
+        parametros += list(lojas)
+    df = pd.read_sql_query(
+        f"SELECT folha AS CATEGORIA, substr(data, 1, 7) AS mes, {somas} FROM {_fonte(tabela)} "
+        f"WHERE {onde} GROUP BY folha, mes ORDER BY folha, mes",
+        conn, params=parametros,
+    )
+    df.insert(1, 'MÊS', pd.PeriodIndex(df.pop('mes'), freq='M'))
+    return df
+
+
+# Lê as linhas de uma folha com os nomes de coluna da planilha. Com `intervalos`
+# (lista de [início, fim) em ISO) só o período pedido sai do banco; com `lojas`,
+# só as lojas pedidas; com `lancados`, só os lançamentos (sem o espelho).
+def consultar(conn, tabela, folha, intervalos=None, lojas=None, lancados=False):
+    colunas = TABELAS[tabela]
+    selecao = ", ".join(f'{destino} AS "{origem}"' for origem, destino in colunas.items())
+    onde, parametros = _onde(folha, lojas)
+    sql = f"SELECT {selecao} FROM {_fonte(tabela, lancados)} WHERE {onde}"
+    if intervalos is not None:
+        if not intervalos:
+            sql += " AND 0"
+        else:
+            sql += " AND (" + " OR ".join("(data >= ? AND data < ?)" for _ in intervalos) + ")"
+            parametros += [limite for intervalo in intervalos for limite in intervalo]
+    # Ordenado por data com as datas vazias no fim, como periodo.ordenar_por_data espera
+    df = pd.read_sql_query(sql + " ORDER BY data IS NULL, data, id", conn, params=parametros)
+    df['DATA'] = pd.to_datetime(df['DATA'], errors='coerce')
+    return df
+
+
+# consultar() numa só transação de leitura que confere antes que cada loja está
+# importada na versão pedida (`assinaturas` = {loja: assinatura}). None se outra
+# importação trocou a versão do espelho depois da sincronização.
+def consultar_versao(conn, tabela, folha, assinaturas, intervalos=None, versao=None):
+    conn.execute("BEGIN")
+    try:
+        if not all(ja_importada(conn, tabela, loja, folha, assinatura, versao)
+                   for loja, assinatura in assinaturas.items()):
+            return None
+        return consultar(conn, tabela, folha, intervalos, lojas=list(assinaturas))
+    finally:
+        conn.rollback()
+
+
+# Cria ou migra o esquema de um banco: python banco.py [--banco caminho]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cria ou migra o esquema do dashboard.db.")
+    parser.add_argument("--banco", default=CAMINHO_BANCO, help="caminho do banco")
+    args = parser.parse_args(argv)
+    migrar(args.banco)
+    print(f"Esquema de {args.banco} atualizado.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/bench_anomalias.py
+# Detector de dias anormais (anomalias.py) sobre um cubo sintético de vários anos:
+# ajuste completo, atualização só com o último mês e rerun sem dados novos.
+# Uso, a partir da raiz do repositório:
+#     python -m benchmarks.bench_anomalias --linhas 1000000 --anos 3
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import anomalias
+
+SETORES = ['Avarias Padaria', 'Avarias Salgados', 'Avarias Rotisseria', 'Avarias Açougue']
+
+
+# Cubo no formato de cubo.montar_cubo (só as colunas usadas pelo detector), com
+# `picos` linhas multiplicadas por 200 para conferir que são encontradas
+def gerar_cubo(linhas, anos, produtos, picos, semente=0):
+    rng = np.random.default_rng(semente)
+    dias = pd.date_range('2023-01-01', periods=365 * anos, freq='D')
+    df = pd.DataFrame({
+        'LOJA': pd.Categorical(rng.choice(['LOJA 1', 'LOJA 2'], linhas)),
+        'CATEGORIA': pd.Categorical(rng.choice(SETORES, linhas)),
+        'DESCRIÇÃO': pd.Categorical(np.char.add('PRODUTO ', rng.integers(0, produtos, linhas).astype(str))),
+        'DATA': dias[rng.integers(0, len(dias), linhas)],
+        'VLR. TOT. CUSTO': rng.gamma(2, 10, linhas),
+    })
+    marcadas = rng.choice(linhas, picos, replace=False)
+    df.loc[marcadas, 'VLR. TOT. CUSTO'] *= 200
+    cubo = (df.groupby(['LOJA', 'CATEGORIA', 'DESCRIÇÃO', 'DATA'], observed=True)['VLR. TOT. CUSTO']
+            .sum().reset_index())
+    return cubo, set(zip(df.loc[marcadas, 'DATA'], df.loc[marcadas, 'DESCRIÇÃO'].astype(str)))
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do detector de dias anormais")
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--anos", type=int, default=3)
+    parser.add_argument("--produtos", type=int, default=1500)
+    parser.add_argument("--picos", type=int, default=50)
+    args = parser.parse_args()
+
+    cubo, picos = gerar_cubo(args.linhas, args.anos, args.produtos, args.picos)
+    corte = cubo['DATA'].max() - pd.Timedelta(days=30)
+    anterior = cubo[cubo['DATA'] <= corte]
+
+    completo, alertas = cronometrar(lambda: anomalias.alertas('completo', cubo, versao=1))
+    cronometrar(lambda: anomalias.alertas('incremental', anterior, versao=1))
+    incremental, parcial = cronometrar(lambda: anomalias.alertas('incremental', cubo, versao=2))
+    rerun, _ = cronometrar(lambda: anomalias.alertas('incremental', cubo, versao=2))
+
+    # A atualização incremental deve chegar aos mesmos alertas do ajuste completo
+    colunas = ['DATA', 'CATEGORIA', 'DESCRIÇÃO']
+    pd.testing.assert_frame_equal(alertas[colunas], parcial[colunas])
+    achados = len(picos & set(zip(alertas['DATA'], alertas['DESCRIÇÃO'])))
+
+    print(f"linhas do cubo: {len(cubo):,}  ({args.anos} anos, {args.produtos} produtos)")
+    print(f"ajuste completo:          {completo * 1000:8.1f} ms")
+    print(f"incremental (último mês): {incremental * 1000:8.1f} ms")
+    print(f"rerun sem dados novos:    {rerun * 1000:8.1f} ms")
+    print(f"alertas: {len(alertas)}  picos encontrados: {achados}/{len(picos)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_catalogo.py
+# Enriquecimento das linhas de avarias pelo catálogo de produtos (catalogo.py):
+# catálogo sintético num banco temporário e um frame no formato de processar_datas,
+# com códigos como número e texto, grafias variadas e preços faltando.
+# Uso, a partir da raiz do repositório:
+#     python -m benchmarks.bench_catalogo --linhas 1000000 --produtos 20000
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+import catalogo
+
+DEPARTAMENTOS = ['PADARIA', 'ACOUGUE', 'FRIOS', 'MERCEARIA']
+
+
+def criar_banco(caminho, produtos):
+    with closing(sqlite3.connect(caminho)) as conn:
+        conn.execute(f"""CREATE TABLE {catalogo.TABELA} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, codigo_barras TEXT NOT NULL, descricao TEXT,
+            codigo_interno TEXT, departamento TEXT, pvenda REAL)""")
+        conn.executemany(
+            f"INSERT INTO {catalogo.TABELA} (codigo_barras, descricao, codigo_interno, departamento, pvenda) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(f"789{i:010d}", f"PRODUTO {i}", str(1000 + i), DEPARTAMENTOS[i % 4], 1.5 + i % 50)
+             for i in range(produtos)],
+        )
+        conn.commit()
+
+
+# Um quinto dos códigos fica fora do catálogo; preços faltam em 10% das linhas
+def gerar_linhas(linhas, produtos, semente=0):
+    rng = np.random.default_rng(semente)
+    codigos = rng.integers(1000, 1000 + produtos * 5 // 4, linhas)
+    grafias = np.array(['produto ', 'Produto  ', 'PRODUTO '])[rng.integers(0, 3, linhas)]
+    return pd.DataFrame({
+        'CÓD. INT.': np.where(rng.random(linhas) < 0.5, codigos.astype(float), codigos.astype(str).astype(object)),
+        'DESCRIÇÃO': pd.Categorical(np.char.add(grafias, (codigos - 1000).astype(str))),
+        'QTD': rng.integers(1, 5, linhas).astype(float),
+        'VLR. UNIT. VENDA': np.where(rng.random(linhas) < 0.1, np.nan, 2.0),
+        'VLR. TOT. VENDA': np.nan,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do catálogo de produtos")
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--produtos", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'catalogo.db')
+        criar_banco(caminho, args.produtos)
+        df = gerar_linhas(args.linhas, args.produtos)
+
+        inicio = time.perf_counter()
+        cat = catalogo.obter(caminho)
+        carga = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        catalogo.obter(caminho)
+        em_cache = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        saida = catalogo.normalizar(df, interno='CÓD. INT.', preco=('VLR. UNIT. VENDA', 'VLR. TOT. VENDA'),
+                                    catalogo=cat)
+        normalizar = time.perf_counter() - inicio
+
+    # Uma descrição por chave, e as grafias do mesmo código juntas
+    assert saida[catalogo.CHAVE].nunique() == saida['DESCRIÇÃO'].nunique()
+    print(f"catálogo: {len(cat):,} produtos  linhas: {len(df):,}")
+    print(f"carga do catálogo:  {carga * 1000:8.1f} ms")
+    print(f"catálogo em cache:  {em_cache * 1000:8.3f} ms")
+    print(f"normalizar:         {normalizar * 1000:8.1f} ms")
+    print(f"descrições: {df['DESCRIÇÃO'].nunique():,} -> {saida['DESCRIÇÃO'].nunique():,}  "
+          f"preços preenchidos: {int(df['VLR. UNIT. VENDA'].isna().sum() - saida['VLR. UNIT. VENDA'].isna().sum()):,}  "
+          f"sem departamento: {int(saida[catalogo.DEPARTAMENTO].isna().sum()):,}")
+
+
+if __name__ == "__main__":
+    main()
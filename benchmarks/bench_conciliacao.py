@@ -0,0 +1,77 @@
+# benchmarks/bench_conciliacao.py
+# Conciliação de avarias com a "Recuperação de Avarias" (conciliacao.py) sobre
+# cubos sintéticos de vários anos: montagem por versão dos dados, leitura do
+# cache e os recortes/resumos que a visão refaz a cada interação.
+# Uso, a partir da raiz do repositório:
+#     python -m benchmarks.bench_conciliacao --anos 3 --produtos 3000
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import conciliacao
+
+SETORES = ["Avarias Padaria", "Avarias Salgados", "Avarias Rotisseria", "Avarias Açougue"]
+LOJAS = ["FRAGA MAIA", "PITUBA"]
+
+
+def frames(anos, produtos, linhas_por_dia):
+    rng = np.random.default_rng(0)
+    dias = pd.date_range("2022-01-01", periods=365 * anos, freq="D")
+    n = len(dias) * linhas_por_dia
+    chaves = [f"COD:{i}" for i in range(produtos)]
+    produto = rng.integers(0, produtos, n)
+    qtd = rng.integers(1, 6, n).astype(float)
+    perdas = pd.DataFrame({
+        'LOJA': pd.Categorical.from_codes(rng.integers(0, len(LOJAS), n), LOJAS),
+        'CATEGORIA': pd.Categorical.from_codes(rng.integers(0, len(SETORES), n), SETORES),
+        'DATA': np.repeat(dias, linhas_por_dia),
+        conciliacao.CHAVE: pd.Categorical.from_codes(produto, chaves),
+        'DESCRIÇÃO': pd.Categorical.from_codes(produto, [f"PRODUTO {i}" for i in range(produtos)]),
+        'QTD': qtd,
+        'VLR. TOT. VENDA': qtd * 10,
+        'VLR. TOT. CUSTO': qtd * 7,
+    })
+    # Recupera-se uma parte das perdas, e alguns produtos sem avaria registrada
+    recuperadas = perdas.sample(frac=0.3, random_state=0)
+    recuperacoes = pd.DataFrame({
+        'LOJA': recuperadas['LOJA'], 'DATA': recuperadas['DATA'] + pd.Timedelta(days=3),
+        conciliacao.CHAVE: recuperadas[conciliacao.CHAVE], 'DESCRIÇÃO': recuperadas['DESCRIÇÃO'],
+        'QTD': recuperadas['QTD'], 'TOTAL': recuperadas['VLR. TOT. VENDA'],
+    })
+    return perdas, recuperacoes
+
+
+def medir(nome, funcao, repeticoes=1):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    print(f"{nome:<28} {(time.perf_counter() - inicio) / repeticoes * 1000:9.1f} ms")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da conciliação de avarias e recuperações")
+    parser.add_argument("--anos", type=int, default=3)
+    parser.add_argument("--produtos", type=int, default=3000)
+    parser.add_argument("--linhas-por-dia", type=int, default=400)
+    args = parser.parse_args()
+    perdas, recuperacoes = frames(args.anos, args.produtos, args.linhas_por_dia)
+    print(f"{len(perdas)} linhas de avarias, {len(recuperacoes)} de recuperação")
+
+    versao = ("bench", 1)
+    conciliado = medir("conciliar (versão nova)",
+                       lambda: conciliacao.obter("bench", versao, lambda: (perdas, recuperacoes)))
+    medir("obter (mesma versão)", lambda: conciliacao.obter("bench", versao, lambda: (perdas, recuperacoes)), 100)
+    print(f"{len(conciliado)} linhas conciliadas (loja x setor x mês x produto)")
+
+    meses = sorted(conciliado['MÊS'].unique())
+    recorte = medir("filtrar 12 meses", lambda: conciliacao.filtrar(conciliado, meses[-12], meses[-1], SETORES[:2]), 20)
+    for nivel in conciliacao.NIVEIS:
+        medir(f"resumo por {nivel.lower()}", lambda: conciliacao.resumo(recorte, nivel), 20)
+    medir("não recuperados", lambda: conciliacao.nao_recuperados(recorte), 20)
+
+
+if __name__ == "__main__":
+    main()
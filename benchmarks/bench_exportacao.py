@@ -0,0 +1,72 @@
+# benchmarks/bench_exportacao.py
+# Exportação da tabela detalhada de avarias (exportacao.py) contra o to_excel do
+# pandas, que monta a planilha inteira em objetos antes de gravar: tempo e pico
+# de memória alocada pelo Python (tracemalloc, numa segunda execução para não
+# pesar no tempo) para o mesmo frame sintético.
+# Uso, a partir da raiz do repositório:
+#     python -m benchmarks.bench_exportacao --linhas 50000
+import argparse
+import io
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import exportacao
+
+COLUNAS_MOEDA = ['VLR. UNIT. VENDA', 'VLR. UNIT. CUSTO', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']
+
+
+def frame(linhas):
+    rng = np.random.default_rng(0)
+    qtd = rng.integers(1, 10, linhas)
+    venda = rng.random(linhas).round(2) * 20
+    custo = (venda * 0.7).round(2)
+    return pd.DataFrame({
+        'DATA': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 366, linhas), unit='D'),
+        'DESCRIÇÃO': pd.Categorical.from_codes(rng.integers(0, 3000, linhas),
+                                               [f'PRODUTO {i}' for i in range(3000)]),
+        'QTD': qtd,
+        'VLR. UNIT. VENDA': venda,
+        'VLR. UNIT. CUSTO': custo,
+        'VLR. TOT. VENDA': venda * qtd,
+        'VLR. TOT. CUSTO': custo * qtd,
+    })
+
+
+def pandas_xlsx(df):
+    saida = io.BytesIO()
+    df.to_excel(saida, index=False, engine="openpyxl")
+    return saida.getvalue()
+
+
+def medir(funcao, df):
+    inicio = time.perf_counter()
+    dados = funcao(df)
+    tempo = time.perf_counter() - inicio
+    tracemalloc.start()
+    funcao(df)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return tempo, pico, len(dados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da exportação XLSX/CSV")
+    parser.add_argument("--linhas", type=int, default=50_000)
+    args = parser.parse_args()
+    df = frame(args.linhas)
+
+    for nome, funcao in [
+        ("pandas to_excel", pandas_xlsx),
+        ("xlsx write-only", lambda d: exportacao.xlsx({"Detalhe": d}, COLUNAS_MOEDA)),
+        ("csv em blocos", exportacao.csv),
+    ]:
+        tempo, pico, tamanho = medir(funcao, df)
+        print(f"{nome:<16} {args.linhas} linhas em {tempo:7.2f} s  "
+              f"pico de memória: {pico / 2**20:7.1f} MiB  arquivo: {tamanho / 2**20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_importacao.py
+# Perfil do tempo de import dos módulos dos dashboards (python -X importtime),
+# com orçamento para a tela de login. Cada módulo é importado num processo novo.
+#   login                  o que roda antes da tela de login aparecer
+#   avarias, dashboard     tudo o que os apps carregam depois do login
+# Uso, a partir da raiz do repositório:
+#     python -m benchmarks.bench_importacao --orcamento-login 800
+# Sai com código 1 se o login passar do orçamento ou se algum módulo pesado
+# (só usado em gráficos ou no PDF) for carregado já no import.
+import argparse
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULOS = ['login', 'avarias', 'dashboard']
+# Só devem ser importados quando um gráfico é montado ou um PDF é gerado
+PESADOS = ['plotly.express', 'fpdf', 'kaleido', 'relatorio_pdf']
+
+
+# Um import num processo novo: [(módulo, próprio_us, acumulado_us, nível)] na ordem do
+# -X importtime (cada módulo aparece depois dos que ele importou)
+def perfil_import(modulo):
+    saida = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+    ).stderr
+    perfil = []
+    for linha in saida.splitlines():
+        if not linha.startswith('import time:') or 'self [us]' in linha:
+            continue
+        proprio, acumulado, nome = linha[len('import time:'):].split('|')
+        nivel = (len(nome) - len(nome.lstrip())) // 2
+        perfil.append((nome.strip(), int(proprio), int(acumulado), nivel))
+    return perfil
+
+
+# Trecho do perfil importado por `modulo` (sem o que o interpretador carrega ao iniciar)
+def subarvore(perfil, modulo):
+    fim = max(i for i, (nome, _, _, nivel) in enumerate(perfil) if nome == modulo and nivel == 0)
+    inicio = fim
+    while inicio > 0 and perfil[inicio - 1][3] > 0:
+        inicio -= 1
+    return perfil[inicio:fim + 1]
+
+
+def melhor_perfil(modulo, repeticoes):
+    perfis = [subarvore(perfil_import(modulo), modulo) for _ in range(repeticoes)]
+    return min(perfis, key=lambda p: p[-1][2])
+
+
+# Pacotes importados diretamente pelo módulo que mais pesam
+def maiores_pacotes(perfil, quantos):
+    por_pacote = {}
+    for nome, _, acumulado, nivel in perfil:
+        if nivel == 1:
+            pacote = nome.split('.')[0]
+            por_pacote[pacote] = por_pacote.get(pacote, 0) + acumulado
+    return sorted(por_pacote.items(), key=lambda item: item[1], reverse=True)[:quantos]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil do tempo de import dos dashboards")
+    parser.add_argument("--orcamento-login", type=float, default=800.0, help="ms até a tela de login")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    falhas = []
+    for modulo in MODULOS:
+        perfil = melhor_perfil(modulo, args.repeticoes)
+        total_ms = perfil[-1][2] / 1000
+        print(f"{modulo}: {total_ms:8.1f} ms")
+        for pacote, acumulado in maiores_pacotes(perfil, args.top):
+            print(f"    {pacote:<24} {acumulado / 1000:8.1f} ms")
+        importados = {nome for nome, _, _, _ in perfil}
+        carregados = [p for p in PESADOS if p in importados]
+        if carregados:
+            falhas.append(f"{modulo} importa no carregamento: {', '.join(carregados)}")
+        if modulo == 'login' and total_ms > args.orcamento_login:
+            falhas.append(f"login: {total_ms:.0f} ms, acima do orçamento de {args.orcamento_login:.0f} ms")
+
+    for falha in falhas:
+        print(f"FALHA: {falha}")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/bench_lancamentos.py
+# Gravação simultânea de lançamentos (lancamentos.py) num banco temporário:
+# vários terminais (threads) gravando um lançamento por vez, com o gravador em
+# lote e com uma transação por pedido, e leituras do espelho durante a gravação.
+# Uso, a partir da raiz do repositório:
+#     python -m benchmarks.bench_lancamentos --terminais 8 --pedidos 50
+import argparse
+import os
+import tempfile
+import threading
+import time
+from contextlib import closing
+
+import banco
+import lancamentos
+
+TABELA = 'planilha_avarias'
+FOLHA = 'Avarias Padaria'
+
+
+def rodar(caminho, gravador, terminais, pedidos):
+    linhas = [lancamentos.preparar(TABELA, FOLHA, 'LOJA 1', [{'DATA': '01/03/2024', 'DESCRIÇÃO': f'PRODUTO {i}', 'QTD': 1}],
+                                   terminal=f'terminal {i}') for i in range(terminais)]
+    leituras = [0]
+    parar = threading.Event()
+
+    def terminal(i):
+        for _ in range(pedidos):
+            gravador.gravar(TABELA, linhas[i])
+
+    # O dashboard continua lendo enquanto os terminais gravam
+    def leitor():
+        with closing(banco.conectar(caminho)) as conn:
+            while not parar.is_set():
+                banco.contar_linhas(conn, TABELA, FOLHA)
+                leituras[0] += 1
+
+    threads = [threading.Thread(target=terminal, args=(i,)) for i in range(terminais)]
+    ler = threading.Thread(target=leitor)
+    inicio = time.perf_counter()
+    ler.start()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    tempo = time.perf_counter() - inicio
+    parar.set()
+    ler.join()
+    return tempo, leituras[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da gravação de lançamentos")
+    parser.add_argument("--terminais", type=int, default=8)
+    parser.add_argument("--pedidos", type=int, default=50)
+    args = parser.parse_args()
+    total = args.terminais * args.pedidos
+
+    for nome, lote in [("em lote", lancamentos.LOTE), ("um por transação", 1)]:
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'dashboard.db')
+            banco.migrar(caminho)
+            gravador = lancamentos.Gravador(caminho, lote=lote)
+            tempo, leituras = rodar(caminho, gravador, args.terminais, args.pedidos)
+            with closing(banco.conectar(caminho)) as conn:
+                gravadas = banco.contar_linhas(conn, TABELA, FOLHA)
+            print(f"{nome:<18} {total} pedidos em {tempo * 1000:8.1f} ms  "
+                  f"({total / tempo:7.0f}/s)  transações: {gravador.transacoes:4d}  "
+                  f"linhas: {gravadas}  leituras durante a gravação: {leituras}")
+            assert gravadas == total
+
+
+if __name__ == "__main__":
+    main()
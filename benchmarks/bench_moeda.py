@@ -0,0 +1,83 @@
+# benchmarks/bench_moeda.py
+# Micro-benchmark do conversor de moeda: antigo processar_valor (por célula) x converter_moeda.
+# Uso, a partir da raiz do repositório:
+#     python -m benchmarks.bench_moeda --linhas 100000
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from moeda import converter_moeda
+
+
+# Cópia da limpeza antiga de dashboard.carregar_dados, mantida só como referência.
+# O fillna reproduz o astype(str) do pandas 2, que transformava NaN em 'nan'.
+def limpar_coluna_moeda_antiga(coluna):
+    coluna = coluna.fillna('nan').astype(str).str.replace('R\\$', '', regex=True).str.strip()
+    def processar_valor(valor):
+        valor = valor.replace(' ', '')
+        if ',' in valor:
+            partes = valor.rsplit(',', 1)
+            inteiro = partes[0].replace('.', '')
+            decimal = partes[1] if len(partes) > 1 else '00'
+            valor = f"{inteiro}.{decimal}"
+        else:
+            partes = valor.rsplit('.', 1)
+            if len(partes) > 1:
+                inteiro = partes[0].replace('.', '')
+                decimal = partes[1]
+                valor = f"{inteiro}.{decimal}"
+        return pd.to_numeric(valor, errors='coerce')
+    return coluna.apply(processar_valor)
+
+
+# Mistura o que aparece nas planilhas: texto com R$ e milhar, texto com ponto e números
+def gerar_coluna(linhas, semente=0):
+    rng = np.random.default_rng(semente)
+    valores = rng.random(linhas) * 5000
+    formato = rng.integers(0, 4, linhas)
+    coluna = np.empty(linhas, dtype=object)
+    for i, (valor, tipo) in enumerate(zip(valores, formato)):
+        if tipo == 0:
+            inteiro, decimal = f"{valor:.2f}".split(".")
+            coluna[i] = f"R$ {int(inteiro):,}".replace(",", ".") + f",{decimal}"
+        elif tipo == 1:
+            coluna[i] = f"{valor:.2f}"
+        elif tipo == 2:
+            coluna[i] = round(valor, 2)
+        else:
+            coluna[i] = None
+    return pd.Series(coluna, dtype=object)
+
+
+def medir(funcao, coluna, repeticoes):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(coluna)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do conversor de moeda")
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    coluna = gerar_coluna(args.linhas)
+    tempo_antigo, antigo = medir(limpar_coluna_moeda_antiga, coluna, args.repeticoes)
+    tempo_novo, novo = medir(converter_moeda, coluna, args.repeticoes)
+
+    # Os dois conversores devem concordar em todas as linhas
+    pd.testing.assert_series_equal(antigo.astype("float64"), novo, check_names=False)
+
+    print(f"linhas: {args.linhas}")
+    print(f"antes  (processar_valor): {tempo_antigo:8.3f}s  {args.linhas / tempo_antigo:14,.0f} linhas/s")
+    print(f"depois (converter_moeda): {tempo_novo:8.3f}s  {args.linhas / tempo_novo:14,.0f} linhas/s")
+    print(f"ganho: {tempo_antigo / tempo_novo:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
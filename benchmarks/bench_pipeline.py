@@ -0,0 +1,263 @@
+# benchmarks/bench_pipeline.py
+# Benchmark das etapas dos dashboards sobre planilhas sintéticas
+# (benchmarks/planilhas_sinteticas.py): carga do Excel e do snapshot, limpeza
+# da moeda, datas, recorte de período, agregações, gráficos e PDF, cada uma
+# medida em separado. O resultado vai para um JSON; com --comparar, etapas que
+# ficaram mais lentas que a referência fazem o comando sair com erro.
+# Uso, a partir da raiz do repositório:
+#     python -m benchmarks.bench_pipeline --linhas 10000 100000
+#     python -m benchmarks.bench_pipeline --linhas 1000000 --repeticoes 1
+#     python -m benchmarks.bench_pipeline --comparar benchmarks/resultados/referencia.json
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+import plotly.express as px
+
+import avarias
+import banco
+import dashboard
+import ingestao
+import lojas
+import periodo
+import relatorio_pdf
+import tabela
+from benchmarks import planilhas_sinteticas
+from cubo import montar_cubo, por_produto
+from moeda import converter_moeda
+
+LOJA = "BENCH"
+DIRETORIO_RESULTADOS = os.path.join(os.path.dirname(__file__), "resultados")
+# Abaixo disso a diferença é ruído de medição, não regressão
+PISO_SEGUNDOS = 0.01
+
+
+# Melhor tempo de `repeticoes` execuções. `preparar` roda antes de cada uma, fora da medição.
+def medir(funcao, repeticoes, preparar=None):
+    melhor = float("inf")
+    resultado = None
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+class Medicoes:
+    def __init__(self, repeticoes):
+        self.repeticoes = repeticoes
+        self.etapas = {}
+
+    def etapa(self, nome, funcao, linhas, repeticoes=None, preparar=None):
+        try:
+            segundos, resultado = medir(funcao, repeticoes or self.repeticoes, preparar)
+        except Exception as e:
+            # Ex.: kaleido sem Chrome na máquina; a etapa fica registrada com o erro
+            erro = f"{type(e).__name__}: {(str(e).strip().splitlines() or [''])[0]}"
+            self.etapas[nome] = {"segundos": None, "linhas": linhas, "erro": erro}
+            print(f"  {nome:<32} {erro}")
+            return None
+        self.etapas[nome] = {"segundos": round(segundos, 6), "linhas": linhas}
+        print(f"  {nome:<32} {segundos:9.4f}s  {linhas:>10,} linhas")
+        return resultado
+
+
+def _limpar_snapshots():
+    shutil.rmtree(ingestao.DIRETORIO_CACHE, ignore_errors=True)
+
+
+# Mês com mais linhas: o recorte medido é o pior caso do dashboard
+def _mes_mais_cheio(df):
+    mes = df['DATA'].dropna().dt.to_period('M').mode()[0]
+    return periodo.limites_mes(mes.year, mes.month)
+
+
+def bench_avarias(diretorio, linhas, repeticoes, semente):
+    caminho, bruto = planilhas_sinteticas.planilha_avarias(diretorio, linhas, semente)
+    setor = planilhas_sinteticas.FOLHAS_AVARIAS[0]
+    m = Medicoes(repeticoes)
+
+    def carregar_dados():
+        # Mesmo caminho de avarias._carregar_dados_compartilhado, sem o cache do Streamlit
+        return periodo.ordenar_por_data(lojas.carregar_lojas(
+            {LOJA: caminho}, setor, avarias.ler_folha, avarias.VERSAO_LIMPEZA, processos=1
+        ))
+
+    # A leitura do Excel é a etapa mais cara: uma execução basta
+    m.etapa("carregar_dados_excel", carregar_dados, linhas, repeticoes=1, preparar=_limpar_snapshots)
+    df = m.etapa("carregar_dados_snapshot", carregar_dados, linhas)
+
+    for coluna in ['VLR. UNIT. VENDA', 'VLR. TOT. VENDA']:
+        m.etapa(f"limpeza_moeda[{coluna}]", lambda: converter_moeda(bruto[coluna]), linhas)
+
+    df = m.etapa("processar_datas", lambda: avarias.processar_datas(df), len(df))
+    cubo = m.etapa("montar_cubo", lambda: montar_cubo(df, setor), len(df))
+
+    inicio, fim = _mes_mais_cheio(df)
+    df_mes = m.etapa("filtrar_por_periodo", lambda: avarias.filtrar_por_periodo(df, inicio, fim), len(df))
+    cubo_mes = m.etapa("filtrar_cubo_por_periodo", lambda: avarias.filtrar_por_periodo(cubo, inicio, fim), len(cubo))
+
+    def agregacoes():
+        produtos = por_produto(cubo_mes)
+        return produtos, {
+            "qtd": avarias.top_10_por_qtd(produtos),
+            "venda": avarias.top_10_por_valor_venda(produtos),
+            "custo": avarias.top_10_por_valor_custo(produtos),
+            "resumo": avarias.resumo_avarias(produtos),
+        }
+    produtos, tops = m.etapa("agregacoes", agregacoes, len(cubo_mes))
+
+    def figuras():
+        figs = {
+            titulo: avarias.figura_top_10(tops[chave], coluna, titulo)
+            for chave, coluna, titulo in [
+                ("qtd", 'QTD', "Top 10 Produtos por Quantidade Perdida"),
+                ("venda", 'VLR. TOT. VENDA', "Top 10 Produtos por Valor Total de Venda Perdido"),
+                ("custo", 'VLR. TOT. CUSTO', "Top 10 Produtos por Valor Total de Custo Perdido"),
+            ]
+        }
+        figs["Todos os Produtos por Quantidade Perdida"] = avarias.figura_todos_produtos(
+            avarias.produtos_com_outros(avarias.all_produtos_por_qtd(produtos))
+        )
+        return figs
+    figs = m.etapa("figuras", figuras, len(produtos))
+
+    detalhe = df_mes[['DATA', 'DESCRIÇÃO', 'QTD', 'VLR. UNIT. VENDA', 'VLR. UNIT. CUSTO',
+                      'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']]
+    m.etapa("pdf_tabela", lambda: avarias.exportar_pdf(
+        tabela.formatar_colunas(detalhe, avarias.COLUNAS_MOEDA, tabela.FORMATO_AVARIAS)
+    ), len(detalhe))
+    m.etapa("pdf_graficos", lambda: relatorio_pdf.renderizar_figuras(figs or {}), len(produtos), repeticoes=1)
+    return m.etapas
+
+
+def bench_prevencao(diretorio, linhas, repeticoes, semente):
+    caminho, bruto = planilhas_sinteticas.planilha_prevencao(diretorio, linhas, semente)
+    folha = planilhas_sinteticas.FOLHAS_PREVENCAO[0]
+    m = Medicoes(repeticoes)
+
+    def carregar_folha():
+        return ingestao.carregar_folha(caminho, folha, dashboard.ler_folha, dashboard.VERSAO_LIMPEZA)
+
+    m.etapa("carregar_dados_excel", carregar_folha, linhas, repeticoes=1, preparar=_limpar_snapshots)
+    df = m.etapa("carregar_dados_snapshot", carregar_folha, linhas)
+
+    # O dashboard de prevenção lê do espelho no SQLite: importação e consulta de um mês
+    with tempfile.TemporaryDirectory() as temporario:
+        caminho_banco = os.path.join(temporario, "bench.db")
+        banco.migrar(caminho_banco)
+        with closing(banco.conectar(caminho_banco)) as conn:
+            m.etapa("banco_importar", lambda: banco.importar_folha(
+                conn, dashboard.TABELA_BANCO, LOJA, folha, df, "bench"
+            ), len(df), repeticoes=1)
+            inicio, fim = _mes_mais_cheio(df)
+            df_mes = m.etapa("banco_consultar_mes", lambda: banco.consultar(
+                conn, dashboard.TABELA_BANCO, folha, [banco.intervalo_iso(inicio, fim)], [LOJA]
+            ), len(df))
+
+    for coluna in ['VLR. UNI.', 'TOTAL']:
+        m.etapa(f"limpeza_moeda[{coluna}]", lambda: converter_moeda(bruto[coluna]), linhas)
+
+    df = m.etapa("processar_datas", lambda: dashboard.processar_dates(df.copy(deep=False)), len(df))
+    m.etapa("filtrar_por_periodo", lambda: dashboard.filtrar_por_periodo(df, inicio, fim), len(df))
+
+    def agregacoes():
+        return {
+            "prev": dashboard.top_5_prevencao(df_mes),
+            "valor": dashboard.top_5_por_valor(df_mes),
+            "qtd": dashboard.top_5_por_quantidade(df_mes),
+            "resumo": dashboard.resumo_prevencoes(df_mes),
+        }
+    tops = m.etapa("agregacoes", agregacoes, len(df_mes))
+
+    # Os mesmos gráficos que dashboard.app monta
+    def figuras():
+        return {
+            "prev": px.bar(tops["prev"], x='PREV.', y='TOTAL', title="Top 5 Prevenções que Mais Recuperaram"),
+            "valor": px.bar(tops["valor"], x='DESCRIÇÃO', y='TOTAL', title="Top 5 Produtos por Valor"),
+            "qtd": px.bar(tops["qtd"], x='DESCRIÇÃO', y='QTD', title="Top 5 Produtos por Quantidade"),
+        }
+    m.etapa("figuras", figuras, len(df_mes))
+
+    detalhe = df_mes[['DATA', 'DESCRIÇÃO', 'QTD', 'VLR. UNI.', 'TOTAL', 'PREV.']]
+    m.etapa("pdf_tabela", lambda: dashboard.exportar_pdf(
+        tabela.formatar_colunas(detalhe, ['VLR. UNI.', 'TOTAL'])
+    ), len(detalhe))
+    return m.etapas
+
+
+# Etapas mais lentas que a referência além da tolerância: [(dashboard, linhas, etapa, antes, depois)]
+def regressoes(referencia, atual, tolerancia):
+    encontradas = []
+    for nome, por_linhas in atual["resultados"].items():
+        for linhas, etapas in por_linhas.items():
+            anteriores = referencia.get("resultados", {}).get(nome, {}).get(linhas, {})
+            for etapa, medida in etapas.items():
+                antes = anteriores.get(etapa, {}).get("segundos")
+                depois = medida.get("segundos")
+                if antes is None or depois is None:
+                    continue
+                if depois > antes * (1 + tolerancia) and depois - antes > PISO_SEGUNDOS:
+                    encontradas.append((nome, linhas, etapa, antes, depois))
+    return encontradas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das etapas dos dashboards")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--dashboards", nargs="+", choices=["avarias", "prevencao"], default=["avarias", "prevencao"])
+    parser.add_argument("--planilhas", default="./.cache/benchmarks",
+                        help="onde guardar as planilhas sintéticas (reaproveitadas entre execuções)")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--saida", help="arquivo JSON do resultado (padrão: benchmarks/resultados/<data>.json)")
+    parser.add_argument("--comparar", help="JSON de referência; sai com erro se alguma etapa piorar")
+    parser.add_argument("--tolerancia", type=float, default=0.20)
+    args = parser.parse_args()
+
+    # Snapshots num diretório próprio, para não misturar com o cache dos dashboards
+    ingestao.DIRETORIO_CACHE = os.path.join(args.planilhas, "snapshots")
+
+    funcoes = {"avarias": bench_avarias, "prevencao": bench_prevencao}
+    resultado = {
+        "quando": datetime.now().isoformat(timespec="seconds"),
+        "maquina": {"python": platform.python_version(), "pandas": pd.__version__,
+                    "sistema": platform.platform(), "cpus": os.cpu_count()},
+        "repeticoes": args.repeticoes,
+        "resultados": {},
+    }
+    for nome in args.dashboards:
+        for linhas in args.linhas:
+            print(f"{nome} - {linhas:,} linhas")
+            etapas = funcoes[nome](args.planilhas, linhas, args.repeticoes, args.semente)
+            resultado["resultados"].setdefault(nome, {})[str(linhas)] = etapas
+
+    saida = args.saida or os.path.join(DIRETORIO_RESULTADOS, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"resultado: {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            referencia = json.load(f)
+        piores = regressoes(referencia, resultado, args.tolerancia)
+        for nome, linhas, etapa, antes, depois in piores:
+            print(f"REGRESSÃO {nome} {linhas} {etapa}: {antes:.4f}s -> {depois:.4f}s ({depois / antes:.1f}x)")
+        if piores:
+            sys.exit(1)
+        print(f"sem regressões acima de {args.tolerancia:.0%} em relação a {args.comparar}")
+
+
+if __name__ == "__main__":
+    main()
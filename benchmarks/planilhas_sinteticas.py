@@ -0,0 +1,145 @@
+# benchmarks/planilhas_sinteticas.py
+# Planilhas sintéticas de avarias e de prevenção com os nomes de folhas e o
+# leiaute de colunas das reais (linha de título, cabeçalho na segunda linha,
+# datas em texto dd/mm/aaaa e valores em R$ misturando formatos).
+# Uso, a partir da raiz do repositório:
+#     python -m benchmarks.planilhas_sinteticas --linhas 100000 --saida ./.cache/benchmarks
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from benchmarks.bench_moeda import gerar_coluna
+
+FOLHAS_AVARIAS = ["Avarias Padaria", "Avarias Salgados", "Avarias Rotisseria", "Avarias Açougue"]
+FOLHAS_PREVENCAO = ["Recuperação de Avarias", "Furtos Recuperados", "Quebra Mês", "Quebra degustação"]
+
+COLUNAS_AVARIAS = ['DATA', 'CÓD. INT.', 'CÓDIGO BARRAS', 'DESCRIÇÃO', 'QTD', 'VLR. UNIT. VENDA',
+                   'VLR. UNIT. CUSTO', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO', 'RESPONSÁVEL']
+COLUNAS_PREVENCAO = ['DATA', 'CÓDIGO BARRAS', 'CÓDIGO INTERNO', 'DESCRIÇÃO', 'QTD', 'VLR. UNI.', 'TOTAL', 'PREV.']
+
+RESPONSAVEIS = ['ANA', 'BIA', 'CARLOS', 'DIEGO', 'EDU', 'FABIO']
+# Datas espalhadas por dois anos, em ordem de lançamento
+INICIO, DIAS = pd.Timestamp(2024, 1, 1), 730
+# Linhas das folhas que não são medidas: só para a planilha ter todas as folhas
+LINHAS_OUTRAS = 1000
+
+
+def _base(linhas, produtos, rng):
+    produto = rng.integers(0, produtos, linhas)
+    dias = np.sort(rng.integers(0, DIAS, linhas))
+    datas = pd.Series(INICIO + pd.to_timedelta(dias, unit='D')).dt.strftime('%d/%m/%Y')
+    barras = pd.Series(1_000_000_000_000 + produto * 7919, dtype=object)
+    # Metade dos códigos de barras digitados como texto, como nas planilhas
+    texto = rng.random(linhas) < 0.5
+    barras[texto] = barras[texto].astype(str)
+    # Algumas quantidades zeradas, que a limpeza descarta
+    qtd = np.where(rng.random(linhas) < 0.02, 0, rng.integers(1, 20, linhas))
+    return {
+        'DATA': datas,
+        'CÓDIGO BARRAS': barras,
+        'CÓD': pd.Series(produto + 1),
+        'DESCRIÇÃO': pd.Series("PROD " + pd.Series(produto).astype(str)),
+        'QTD': pd.Series(qtd),
+    }
+
+
+def dados_avarias(linhas, produtos=2000, semente=0):
+    rng = np.random.default_rng(semente)
+    base = _base(linhas, produtos, rng)
+    custo = rng.random(linhas) * 50
+    total_custo = pd.Series(custo * base['QTD'])
+    total_custo[rng.random(linhas) < 0.05] = np.nan
+    return pd.DataFrame({
+        'DATA': base['DATA'],
+        'CÓD. INT.': base['CÓD'],
+        'CÓDIGO BARRAS': base['CÓDIGO BARRAS'],
+        'DESCRIÇÃO': base['DESCRIÇÃO'],
+        'QTD': base['QTD'],
+        'VLR. UNIT. VENDA': gerar_coluna(linhas, semente + 1),
+        'VLR. UNIT. CUSTO': custo,
+        'VLR. TOT. VENDA': gerar_coluna(linhas, semente + 2),
+        'VLR. TOT. CUSTO': total_custo,
+        'RESPONSÁVEL': pd.Series(rng.choice(RESPONSAVEIS, linhas)),
+    })
+
+
+def dados_prevencao(linhas, produtos=2000, semente=0, com_prev=True):
+    rng = np.random.default_rng(semente)
+    base = _base(linhas, produtos, rng)
+    df = pd.DataFrame({
+        'DATA': base['DATA'],
+        'CÓDIGO BARRAS': base['CÓDIGO BARRAS'],
+        'CÓDIGO INTERNO': base['CÓD'],
+        'DESCRIÇÃO': base['DESCRIÇÃO'],
+        'QTD': base['QTD'],
+        'VLR. UNI.': gerar_coluna(linhas, semente + 1),
+        'TOTAL': gerar_coluna(linhas, semente + 2),
+    })
+    # "Quebra degustação" não tem a coluna PREV.
+    if com_prev:
+        df['PREV.'] = rng.choice(RESPONSAVEIS, linhas)
+    return df
+
+
+# Grava {folha: frame} no leiaute das planilhas: título na primeira linha e
+# cabeçalho na segunda (as leituras usam skiprows=1)
+def gravar_planilha(caminho, folhas):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    livro = Workbook(write_only=True)
+    for nome, df in folhas.items():
+        folha = livro.create_sheet(nome)
+        folha.append(['TITULO'])
+        folha.append(list(df.columns))
+        valores = df.astype(object).where(df.notna(), None)
+        for linha in valores.itertuples(index=False, name=None):
+            folha.append(linha)
+    temporario = f"{caminho}.tmp"
+    livro.save(temporario)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+# Planilha de avarias com `linhas` na primeira folha (a medida) e LINHAS_OUTRAS
+# nas demais. Devolve (caminho, frame bruto da primeira folha); o arquivo só é
+# gerado se ainda não existe, porque gravar 1M de linhas leva minutos.
+def planilha_avarias(diretorio, linhas, semente=0):
+    bruto = dados_avarias(linhas, semente=semente)
+    caminho = os.path.join(diretorio, f"SISTEMA DE GESTÃO DE AVARIAS - BENCH {linhas}-{semente}.xlsm")
+    if not os.path.exists(caminho):
+        folhas = {FOLHAS_AVARIAS[0]: bruto}
+        for i, nome in enumerate(FOLHAS_AVARIAS[1:], 1):
+            folhas[nome] = dados_avarias(LINHAS_OUTRAS, semente=semente + 10 * i)
+        gravar_planilha(caminho, folhas)
+    return caminho, bruto
+
+
+def planilha_prevencao(diretorio, linhas, semente=0):
+    bruto = dados_prevencao(linhas, semente=semente)
+    caminho = os.path.join(diretorio, f"SISTEMA GERAL PREVENÇÃO - BENCH {linhas}-{semente}.xlsm")
+    if not os.path.exists(caminho):
+        folhas = {FOLHAS_PREVENCAO[0]: bruto}
+        for i, nome in enumerate(FOLHAS_PREVENCAO[1:], 1):
+            folhas[nome] = dados_prevencao(LINHAS_OUTRAS, semente=semente + 10 * i,
+                                           com_prev=nome != "Quebra degustação")
+        gravar_planilha(caminho, folhas)
+    return caminho, bruto
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera planilhas sintéticas de avarias e de prevenção")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--saida", default="./.cache/benchmarks")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    for linhas in args.linhas:
+        for gerar in (planilha_avarias, planilha_prevencao):
+            caminho, _ = gerar(args.saida, linhas, args.semente)
+            print(caminho)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# cache.py
+# Cache LRU limitado, seguro entre threads, com contadores de acertos e faltas.
+# Threads que pedem a mesma chave ausente ao mesmo tempo esperam um só cálculo.
+import threading
+from collections import OrderedDict
+
+_AUSENTE = object()
+
+
+class CacheLRU:
+    def __init__(self, max_itens=32):
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.faltas = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        # chave -> trava do cálculo em andamento
+        self._calculando = {}
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __contains__(self, chave):
+        return chave in self._itens
+
+    def obter(self, chave, padrao=None):
+        with self._lock:
+            valor = self._itens.get(chave, _AUSENTE)
+            if valor is _AUSENTE:
+                self.faltas += 1
+                return padrao
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def obter_ou_calcular(self, chave, calcular):
+        valor = self.obter(chave, _AUSENTE)
+        if valor is not _AUSENTE:
+            return valor
+        with self._lock:
+            trava = self._calculando.setdefault(chave, threading.Lock())
+        with trava:
+            # Quem esperou a trava encontra o valor calculado por quem chegou antes
+            with self._lock:
+                valor = self._itens.get(chave, _AUSENTE)
+            if valor is _AUSENTE:
+                try:
+                    valor = calcular()
+                    self.guardar(chave, valor)
+                finally:
+                    with self._lock:
+                        if self._calculando.get(chave) is trava:
+                            del self._calculando[chave]
+        return valor
+
+    # Remove as entradas cuja chave satisfaz `predicado`, ou todas se omitido
+    def invalidar(self, predicado=None):
+        with self._lock:
+            if predicado is None:
+                removidas = len(self._itens)
+                self._itens.clear()
+                return removidas
+            chaves = [c for c in self._itens if predicado(c)]
+            for chave in chaves:
+                del self._itens[chave]
+            return len(chaves)
+
+    def itens(self):
+        with self._lock:
+            return list(self._itens.items())
+
+    def estatisticas(self):
+        return {
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "itens": len(self._itens),
+            "max_itens": self.max_itens,
+        }
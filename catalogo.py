@@ -0,0 +1,225 @@
+# catalogo.py
+# Catálogo de produtos do dashboard.db (tabela recuperacao_de_avarias: código de
+# barras, descrição, código interno, departamento e preço de venda), carregado
+# uma vez em memória com índices hash por código interno e por código de barras.
+#
+# normalizar() trata um frame inteiro com joins vetorizados: o trabalho com
+# texto é feito uma vez por combinação distinta de (código interno, código de
+# barras, descrição) e volta às linhas pelos códigos inteiros.
+#   CHAVE PRODUTO   chave estável: código interno do catálogo ou da planilha,
+#                   senão código de barras, senão a descrição sem acentos/espaços
+#   DESCRIÇÃO       uma só por chave: a do catálogo ou a grafia mais frequente
+#   DEPARTAMENTO    do catálogo
+#   preço           valor unitário vazio ou zero vem do pvenda do catálogo
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+import banco
+
+TABELA = 'recuperacao_de_avarias'
+CHAVE = 'CHAVE PRODUTO'
+DEPARTAMENTO = 'DEPARTAMENTO'
+
+_CONSULTA = f"""
+    SELECT codigo_barras, descricao, codigo_interno, departamento, pvenda
+    FROM {TABELA} ORDER BY id"""
+# Resumo barato da tabela: se não mudou, o catálogo em memória continua valendo
+_RESUMO = f"""
+    SELECT count(*), max(id), total(pvenda),
+           total(length(codigo_barras) + length(coalesce(descricao, ''))
+                 + length(coalesce(codigo_interno, '')) + length(coalesce(departamento, '')))
+    FROM {TABELA}"""
+
+
+def _limpar(textos):
+    return textos.str.strip().str.replace(r'\s+', ' ', regex=True)
+
+
+# Forma usada para comparar descrições: maiúsculas, sem acentos e espaços repetidos
+def chave_texto(textos):
+    limpos = _limpar(textos.astype(str)).str.upper().str.normalize('NFKD')
+    return limpos.str.encode('ascii', 'ignore').str.decode('ascii')
+
+
+# Códigos de uma coluna como texto (banco.codigo_texto), convertidos uma vez por valor distinto.
+# Devolve (código de cada linha, -1 se vazio; valores distintos).
+def _fatorar_codigos(coluna):
+    codigos, distintos = pd.factorize(coluna)
+    textos = banco.codigo_texto(pd.Series(distintos, dtype=object))
+    textos = textos.where(textos.notna() & (textos != ''))
+    # Valores diferentes na planilha (123, 123.0, "123") viram o mesmo texto
+    codigos_texto, unicos = pd.factorize(textos)
+    return np.where(codigos >= 0, codigos_texto[np.maximum(codigos, 0)], -1), np.asarray(unicos, dtype=object)
+
+
+class Catalogo:
+    def __init__(self, produtos):
+        produtos = produtos.reset_index(drop=True)
+        for coluna in ('codigo_barras', 'codigo_interno'):
+            produtos[coluna] = banco.codigo_texto(produtos[coluna])
+        self.produtos = produtos
+        # Um produto por código: vale o último cadastrado
+        self._interno = self._indice('codigo_interno')
+        self._barras = self._indice('codigo_barras')
+        self.versao = int(pd.util.hash_pandas_object(produtos, index=False).sum()) if len(produtos) else 0
+
+    def _indice(self, coluna):
+        unicos = self.produtos[coluna].dropna()
+        unicos = unicos[unicos != ''].drop_duplicates(keep='last')
+        return pd.Index(unicos.to_numpy(dtype=object)), unicos.index.to_numpy()
+
+    def __len__(self):
+        return len(self.produtos)
+
+    # Posição no catálogo de cada código (-1 se não achar), pelo índice hash
+    def _buscar(self, indice, codigos):
+        chaves, posicoes = indice
+        achados = chaves.get_indexer(codigos)
+        return np.where(achados >= 0, posicoes[np.maximum(achados, 0)], -1)
+
+    # Posição no catálogo pelo código interno; sem ele, pelo código de barras.
+    # Códigos de barras digitados na coluna do código interno também são achados.
+    def localizar(self, codigos_internos, codigos_barras):
+        posicao = self._buscar(self._interno, codigos_internos)
+        for indice, codigos in ((self._barras, codigos_barras), (self._barras, codigos_internos)):
+            faltam = posicao < 0
+            if faltam.any():
+                posicao[faltam] = self._buscar(indice, codigos[faltam])
+        return posicao
+
+
+def _resumo(conn):
+    return conn.execute(_RESUMO).fetchone()
+
+
+def _ler(conn):
+    return pd.read_sql_query(_CONSULTA, conn)
+
+
+def _vazio():
+    return Catalogo(pd.DataFrame(columns=['codigo_barras', 'descricao', 'codigo_interno', 'departamento', 'pvenda']))
+
+
+_lock = threading.Lock()
+_atual = {'caminho': None, 'estado': None, 'resumo': None, 'catalogo': None}
+
+
+# Catálogo em memória. O banco é relido só se o arquivo mudou e o resumo da
+# tabela também (o dashboard.db muda a cada importação de planilha).
+def obter(caminho=None):
+    caminho = caminho or banco.CAMINHO_BANCO
+    estado = banco.estado_arquivo(caminho)
+    with _lock:
+        if _atual['catalogo'] is not None and _atual['caminho'] == caminho and _atual['estado'] == estado:
+            return _atual['catalogo']
+        try:
+            with closing(sqlite3.connect(f"file:{caminho}?mode=ro", uri=True, timeout=30)) as conn:
+                resumo = _resumo(conn)
+                if _atual['catalogo'] is None or _atual['caminho'] != caminho or _atual['resumo'] != resumo:
+                    _atual['catalogo'] = Catalogo(_ler(conn))
+        except sqlite3.Error:
+            # Sem banco ou sem a tabela: catálogo vazio, só a normalização das descrições
+            resumo = None
+            _atual['catalogo'] = _vazio()
+        _atual.update(caminho=caminho, estado=estado, resumo=resumo)
+        return _atual['catalogo']
+
+
+# Muda quando o conteúdo do catálogo muda; entra nas chaves dos caches de dados processados
+def versao(caminho=None):
+    return obter(caminho).versao
+
+
+def _textos(codigos, valores):
+    saida = np.full(len(codigos), None, dtype=object)
+    validos = codigos >= 0
+    saida[validos] = valores[codigos[validos]]
+    return pd.Series(saida, dtype=object)
+
+
+# Enriquece `df` (cópia rasa) com o catálogo. `interno` e `barras` são as colunas
+# de código da planilha; `preco` = (valor unitário de venda, total de venda).
+def normalizar(df, interno=None, barras=None, preco=None, catalogo=None):
+    if df.empty or 'DESCRIÇÃO' not in df.columns:
+        return df
+    catalogo = catalogo or obter()
+    df = df.copy(deep=False)
+
+    vazio = (np.full(len(df), -1), np.array([], dtype=object))
+    cod_interno, internos = _fatorar_codigos(df[interno]) if interno in df.columns else vazio
+    cod_barras, barras_ = _fatorar_codigos(df[barras]) if barras in df.columns else vazio
+    cod_desc, descricoes = pd.factorize(df['DESCRIÇÃO'])
+    descricoes = np.asarray(descricoes, dtype=object)
+
+    # Combinações distintas de (interno, barras, descrição); linha -> combinação
+    n_b, n_d = len(barras_) + 1, len(descricoes) + 1
+    combinado = ((cod_interno + 1) * n_b + (cod_barras + 1)) * n_d + (cod_desc + 1)
+    combos, linha = np.unique(combinado, return_inverse=True)
+    c_i, c_b, c_d = combos // (n_b * n_d) - 1, (combos // n_d) % n_b - 1, combos % n_d - 1
+
+    interno_c, barras_c, desc_c = _textos(c_i, internos), _textos(c_b, barras_), _textos(c_d, descricoes)
+
+    posicao = catalogo.localizar(interno_c.to_numpy(), barras_c.to_numpy())
+    achado = posicao >= 0
+    produto = catalogo.produtos.iloc[np.maximum(posicao, 0)].reset_index(drop=True) if len(catalogo) else None
+
+    # Chave estável da combinação
+    chave = pd.Series('DESC:' + chave_texto(desc_c.fillna('')), dtype=object)
+    chave = chave.where(barras_c.isna(), 'BAR:' + barras_c)
+    chave = chave.where(interno_c.isna(), 'COD:' + interno_c)
+    if produto is not None:
+        do_catalogo = produto['codigo_interno'].fillna(produto['codigo_barras'])
+        chave = chave.where(~achado, 'COD:' + do_catalogo)
+
+    # Descrição de cada chave: a do catálogo, senão a grafia mais frequente nas linhas
+    contagem = np.bincount(linha, minlength=len(combos))
+    grafias = pd.DataFrame({'chave': chave, 'descricao': _limpar(desc_c.astype(str)).where(desc_c.notna()),
+                            'linhas': contagem})
+    if produto is not None:
+        grafias['descricao'] = grafias['descricao'].where(~achado | produto['descricao'].isna(),
+                                                          produto['descricao'])
+        # Descrição do catálogo ganha de qualquer grafia da planilha
+        grafias['linhas'] = np.where(achado & produto['descricao'].notna(), np.iinfo(np.int64).max, contagem)
+    grafias = grafias.sort_values('linhas', ascending=False, kind='stable')
+    rotulos = grafias.dropna(subset=['descricao']).drop_duplicates('chave').set_index('chave')['descricao']
+    codigos_chave, chaves = pd.factorize(chave)
+    chaves = pd.Series(chaves, dtype=object)
+    codigo = chaves.str.split(':', n=1).str[1]
+    # Sem descrição em lugar nenhum, o rótulo é o próprio código
+    rotulo = chaves.map(rotulos).fillna(codigo)
+    # Chaves diferentes com a mesma descrição continuam separadas
+    rotulo = rotulo.where(~rotulo.duplicated(keep=False), rotulo + ' [' + codigo + ']')
+    rotulo = rotulo.where(~rotulo.duplicated(keep=False), chaves)
+
+    codigos_linha = codigos_chave[linha]
+    df[CHAVE] = pd.Categorical.from_codes(codigos_linha, categories=pd.Index(chaves.to_numpy(), dtype=object))
+    # Linhas sem código e sem descrição continuam sem descrição
+    sem_nada = (chaves == 'DESC:').to_numpy()[codigos_linha]
+    df['DESCRIÇÃO'] = pd.Categorical.from_codes(np.where(sem_nada, -1, codigos_linha),
+                                                categories=pd.Index(rotulo.to_numpy(), dtype=object))
+
+    if produto is not None:
+        cod_departamento, departamentos = pd.factorize(produto['departamento'].where(achado))
+        df[DEPARTAMENTO] = pd.Categorical.from_codes(cod_departamento[linha], categories=departamentos)
+        if preco and preco[0] in df.columns:
+            _preencher_preco(df, preco, produto['pvenda'].where(achado).to_numpy(dtype=float)[linha])
+    return df
+
+
+# Valor unitário vazio ou zero vem do catálogo; o total vazio ou zero vira QTD x unitário
+def _preencher_preco(df, preco, pvenda):
+    unitario, total = preco
+    valores = pd.to_numeric(df[unitario], errors='coerce').to_numpy(dtype=float)
+    falta = (np.isnan(valores) | (valores == 0)) & ~np.isnan(pvenda)
+    if not falta.any():
+        return
+    df[unitario] = np.where(falta, pvenda, valores)
+    if total in df.columns and 'QTD' in df.columns:
+        totais = pd.to_numeric(df[total], errors='coerce').to_numpy(dtype=float)
+        qtd = pd.to_numeric(df['QTD'], errors='coerce').to_numpy(dtype=float)
+        refazer = falta & (np.isnan(totais) | (totais == 0)) & (qtd > 0)
+        df[total] = np.where(refazer, qtd * df[unitario].to_numpy(dtype=float), totais)
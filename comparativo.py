@@ -0,0 +1,85 @@
+# comparativo.py
+# Comparativo entre setores (folhas) de avarias e de prevenção. Todas as
+# folhas entram num único frame de totais por setor e mês (um groupby sobre os
+# cubos concatenados, ou um GROUP BY no banco) e os indicadores saem de contas
+# vetorizadas sobre a grade meses x setores: participação no mês, variação
+# sobre o mês anterior, sobre o mesmo mês do ano anterior e razão custo/venda.
+import numpy as np
+import pandas as pd
+
+MEDIDAS_AVARIAS = ['QTD', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']
+MEDIDAS_PREVENCAO = ['QTD', 'TOTAL']
+
+
+# Totais por (CATEGORIA, MÊS) de um frame com CATEGORIA e DATA de todas as folhas
+def totais_mensais(df, medidas):
+    datas = df['DATA']
+    validas = datas.notna().to_numpy()
+    mes = datas[validas].dt.to_period('M').rename('MÊS')
+    return (
+        df.loc[validas, medidas]
+        .groupby([df.loc[validas, 'CATEGORIA'], mes], observed=True, sort=True)
+        .sum()
+        .reset_index()
+    )
+
+
+# Grade completa meses x setores da medida; meses sem lançamento contam como zero
+def _grade(totais, medida):
+    grade = totais.pivot_table(index='MÊS', columns='CATEGORIA', values=medida,
+                               aggfunc='sum', fill_value=0.0, observed=True)
+    if grade.empty:
+        return grade
+    meses = pd.period_range(grade.index.min(), grade.index.max(), freq='M')
+    return grade.reindex(meses, fill_value=0.0).astype(float)
+
+
+def _variacao(grade, passos):
+    anterior = grade.shift(passos)
+    # Sem base (mês anterior zerado ou inexistente) a variação fica vazia, não infinita
+    return (grade - anterior) / anterior.where(anterior != 0)
+
+
+# Indicadores por setor e mês a partir de totais_mensais. `medida` é a base da
+# participação e das variações; `razao` = (numerador, denominador), ex.:
+# ('VLR. TOT. CUSTO', 'VLR. TOT. VENDA').
+def indicadores(totais, medida, razao=None):
+    colunas = ['MÊS', 'CATEGORIA', medida, 'participação', 'var. mês', 'var. ano']
+    if razao:
+        colunas.append(f"{razao[0]} / {razao[1]}")
+    grade = _grade(totais, medida)
+    if grade.empty:
+        return pd.DataFrame(columns=colunas)
+
+    total_mes = grade.sum(axis=1)
+    tabelas = {
+        medida: grade,
+        'participação': grade.div(total_mes.where(total_mes != 0), axis=0),
+        'var. mês': _variacao(grade, 1),
+        'var. ano': _variacao(grade, 12),
+    }
+    if razao:
+        numerador, denominador = (_grade(totais, c).reindex_like(grade).fillna(0.0) for c in razao)
+        tabelas[colunas[-1]] = numerador / denominador.where(denominador != 0)
+
+    # Volta da grade para o formato longo, uma linha por mês e setor
+    longo = pd.concat({nome: t.stack(future_stack=True) for nome, t in tabelas.items()}, axis=1)
+    longo.index.names = ['MÊS', 'CATEGORIA']
+    return longo.reset_index()[colunas].replace([np.inf, -np.inf], np.nan)
+
+
+# Última linha de cada setor (o mês mais recente com dados na grade)
+def ultimo_mes(tabela):
+    if tabela.empty:
+        return tabela
+    return tabela[tabela['MÊS'] == tabela['MÊS'].max()].reset_index(drop=True)
+
+
+# Percentuais como texto ("12,3%"), para exibição
+def formatar_percentuais(df, colunas):
+    saida = df.copy(deep=False)
+    for col in colunas:
+        valores = saida[col] * 100
+        texto = valores.map('{:+.1f}%'.format if col.startswith('var.') else '{:.1f}%'.format)
+        saida[col] = texto.str.replace('.', ',', regex=False).where(valores.notna(), '-')
+    return saida
@@ -0,0 +1,159 @@
+# conciliacao.py
+# Conciliação das perdas das folhas de avarias (por CÓD. INT.) com a folha
+# "Recuperação de Avarias" da prevenção (por CÓDIGO INTERNO). Os dois lados já
+# vêm com a CHAVE PRODUTO do catálogo (o código interno normalizado, senão o
+# código de barras ou a descrição), são somados por (LOJA, MÊS, CHAVE PRODUTO)
+# e juntados por um código inteiro do grão, ordenado e buscado por busca binária.
+#
+# A recuperação de um produto num mês vai para os setores que o perderam no mesmo
+# mês e loja, na proporção da quantidade perdida; recuperação sem avaria
+# registrada fica no setor SEM_AVARIA. O resultado, uma linha por loja, setor,
+# mês e produto, fica guardado por versão dos dados: os filtros de período,
+# setor e nível de resumo são recortes e somas sobre ele.
+import numpy as np
+import pandas as pd
+
+from cache import CacheLRU
+
+FOLHA_RECUPERACAO = "Recuperação de Avarias"
+CHAVE = 'CHAVE PRODUTO'
+GRAO = ['LOJA', 'MÊS', CHAVE]
+SEM_AVARIA = "(sem avaria registrada)"
+# Perda e recuperação em valor de venda: o TOTAL da recuperação é QTD x VLR. UNI. (preço de venda)
+PERDAS = {'QTD': 'QTD PERDIDA', 'VLR. TOT. VENDA': 'PERDA', 'VLR. TOT. CUSTO': 'CUSTO PERDIDO'}
+RECUPERACOES = {'QTD': 'QTD RECUPERADA', 'TOTAL': 'RECUPERADO'}
+MEDIDAS = ['QTD PERDIDA', 'QTD RECUPERADA', 'QTD NÃO RECUPERADA', 'PERDA', 'CUSTO PERDIDO',
+           'RECUPERADO', 'PERDA LÍQUIDA']
+COLUNAS_MOEDA = ['PERDA', 'CUSTO PERDIDO', 'RECUPERADO', 'PERDA LÍQUIDA']
+TAXA = 'TAXA RECUPERAÇÃO'
+NIVEIS = {'Produto': [CHAVE, 'DESCRIÇÃO'], 'Setor': ['CATEGORIA'], 'Mês': ['MÊS']}
+
+_conciliacoes = CacheLRU(max_itens=8)
+
+
+# Somas por (LOJA, [CATEGORIA,] MÊS, CHAVE PRODUTO). O groupby roda sobre as
+# categóricas; só o resultado (um produto por mês) vira texto.
+def _mensal(df, medidas, setor=False):
+    colunas = GRAO + (['CATEGORIA'] if setor else []) + ['DESCRIÇÃO'] + list(medidas.values())
+    if df.empty or CHAVE not in df.columns:
+        return pd.DataFrame(columns=colunas)
+    validas = df['DATA'].notna().to_numpy()
+    df = df.loc[validas]
+    grupos = [df['LOJA'], df['DATA'].dt.to_period('M').rename('MÊS'), df[CHAVE]]
+    if setor:
+        grupos.append(df['CATEGORIA'])
+    agregacoes = {coluna: 'sum' for coluna in medidas}
+    agregacoes['DESCRIÇÃO'] = 'first'
+    somas = (df[list(agregacoes)].groupby(grupos, observed=True, sort=False, dropna=False)
+             .agg(agregacoes).rename(columns=medidas).reset_index())
+    for coluna in ['LOJA', CHAVE, 'DESCRIÇÃO'] + (['CATEGORIA'] if setor else []):
+        somas[coluna] = somas[coluna].astype(object)
+    somas['LOJA'] = somas['LOJA'].fillna('')
+    return somas[colunas].astype({coluna: float for coluna in medidas.values()})
+
+
+# Código inteiro de (LOJA, MÊS, CHAVE PRODUTO) nos dois lados, com a mesma numeração
+def _codigos_grao(perdido, recuperado):
+    codigo_perdido = np.zeros(len(perdido), dtype=np.int64)
+    codigo_recuperado = np.zeros(len(recuperado), dtype=np.int64)
+    for nivel in GRAO:
+        codigos, valores = pd.factorize(pd.concat([perdido[nivel], recuperado[nivel]], ignore_index=True))
+        codigo_perdido = codigo_perdido * len(valores) + codigos[:len(perdido)]
+        codigo_recuperado = codigo_recuperado * len(valores) + codigos[len(perdido):]
+    return codigo_perdido, codigo_recuperado
+
+
+def _indicadores(df):
+    df['QTD NÃO RECUPERADA'] = (df['QTD PERDIDA'] - df['QTD RECUPERADA']).clip(lower=0)
+    df['PERDA LÍQUIDA'] = df['PERDA'] - df['RECUPERADO']
+    # Sem perda em valor não há taxa (fica vazia, não infinita)
+    df[TAXA] = df['RECUPERADO'] / df['PERDA'].where(df['PERDA'] > 0)
+    return df
+
+
+# Uma linha por loja, setor, mês e produto com perdas, recuperações e indicadores.
+# `perdas`: cubos das folhas de avarias (CATEGORIA = setor); `recuperacoes`: linhas
+# da folha "Recuperação de Avarias" já normalizadas pelo catálogo.
+def conciliar(perdas, recuperacoes):
+    perdido = _mensal(perdas, PERDAS, setor=True)
+    recuperado = _mensal(recuperacoes, RECUPERACOES)
+    codigo_perdido, codigo_recuperado = _codigos_grao(perdido, recuperado)
+
+    # Junção ordenada: as recuperações (uma por grão) ordenadas pelo código e cada
+    # linha das perdas (uma por setor) acha a sua por busca binária
+    ordem = np.argsort(codigo_recuperado, kind='stable')
+    ordenados = codigo_recuperado[ordem]
+    posicao = np.minimum(np.searchsorted(ordenados, codigo_perdido), max(len(ordem) - 1, 0))
+    achou = ordenados[posicao] == codigo_perdido if len(ordem) else np.zeros(len(perdido), dtype=bool)
+    linha = ordem[posicao] if len(ordem) else posicao
+
+    # A recuperação do grão é dividida entre os setores pela quantidade perdida;
+    # sem quantidade perdida, em partes iguais
+    _, grao = np.unique(codigo_perdido, return_inverse=True)
+    qtd = perdido['QTD PERDIDA'].to_numpy(dtype=float).clip(min=0)
+    total = np.bincount(grao, weights=qtd)[grao]
+    setores = np.bincount(grao)[grao]
+    parte = np.where(total > 0, qtd / np.where(total > 0, total, 1), 1 / np.maximum(setores, 1))
+    for coluna in RECUPERACOES.values():
+        valores = recuperado[coluna].to_numpy(dtype=float)
+        perdido[coluna] = np.where(achou, valores[linha] * parte, 0.0) if len(valores) else 0.0
+
+    sem_perda = recuperado[~np.isin(codigo_recuperado, codigo_perdido)]
+    sem_perda = sem_perda.assign(CATEGORIA=SEM_AVARIA, **{coluna: 0.0 for coluna in PERDAS.values()})
+
+    colunas = GRAO + ['CATEGORIA', 'DESCRIÇÃO'] + list(PERDAS.values()) + list(RECUPERACOES.values())
+    frames = [frame[colunas] for frame in (perdido, sem_perda) if not frame.empty]
+    if not frames:
+        return _indicadores(pd.DataFrame(columns=colunas))
+    conciliado = pd.concat(frames, ignore_index=True)
+    # Uma descrição por produto (a das avarias, que vêm primeiro), para o resumo não separá-lo em dois
+    conciliado['DESCRIÇÃO'] = conciliado.groupby(CHAVE, sort=False)['DESCRIÇÃO'].transform('first')
+    return _indicadores(conciliado.sort_values(['MÊS', 'CATEGORIA', 'LOJA', CHAVE], kind='stable', ignore_index=True))
+
+
+# Conciliação guardada por (`chave` do recorte, `versao` dos dados). `carregar`
+# devolve (perdas, recuperacoes) e só é chamado quando a versão muda.
+def obter(chave, versao, carregar):
+    return _conciliacoes.obter_ou_calcular((chave, versao), lambda: conciliar(*carregar()))
+
+
+# Meses [inicio, fim] (períodos mensais; None não limita) e setores escolhidos
+def filtrar(conciliado, inicio=None, fim=None, setores=None):
+    mascara = np.ones(len(conciliado), dtype=bool)
+    if inicio is not None:
+        mascara &= (conciliado['MÊS'] >= inicio).to_numpy()
+    if fim is not None:
+        mascara &= (conciliado['MÊS'] <= fim).to_numpy()
+    if setores is not None:
+        mascara &= conciliado['CATEGORIA'].isin(setores).to_numpy()
+    return conciliado[mascara]
+
+
+# Somas por produto, setor ou mês (NIVEIS). A quantidade não recuperada é somada
+# linha a linha: recuperar a mais num mês não cobre a falta de outro.
+def resumo(conciliado, nivel):
+    colunas = NIVEIS[nivel]
+    if conciliado.empty:
+        return pd.DataFrame(columns=colunas + MEDIDAS + [TAXA])
+    somas = conciliado.groupby(colunas, sort=True, dropna=False)[MEDIDAS].sum().reset_index()
+    somas[TAXA] = somas['RECUPERADO'] / somas['PERDA'].where(somas['PERDA'] > 0)
+    if nivel == 'Produto':
+        somas = somas.sort_values('PERDA LÍQUIDA', ascending=False, kind='stable', ignore_index=True)
+    return somas
+
+
+# Produtos com quantidade perdida que não voltou na recuperação, do maior valor
+# líquido perdido para o menor
+def nao_recuperados(conciliado):
+    itens = resumo(conciliado[conciliado['QTD NÃO RECUPERADA'] > 0], 'Produto')
+    return itens[[CHAVE, 'DESCRIÇÃO', 'QTD PERDIDA', 'QTD RECUPERADA', 'QTD NÃO RECUPERADA',
+                  'PERDA', 'RECUPERADO', 'PERDA LÍQUIDA', TAXA]]
+
+
+# Tabela para exibir e exportar: taxa em % (número, ordenável) e mês como texto
+def para_exibicao(df):
+    saida = df.rename(columns={TAXA: f"{TAXA} (%)"})
+    saida[f"{TAXA} (%)"] = (df[TAXA].astype(float) * 100).round(1)
+    if 'MÊS' in saida.columns:
+        saida['MÊS'] = saida['MÊS'].dt.strftime('%m/%Y')
+    return saida
@@ -0,0 +1,43 @@
+# cubo.py
+# Cubo de agregação das avarias: somas de QTD e valores no menor grão
+# (loja, setor, dia, produto, responsável), calculado uma vez por versão da planilha.
+import pandas as pd
+
+import instrumentacao
+from esquema import chaves_periodo
+from periodo import ordenar_por_data
+
+MEDIDAS = ['QTD', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']
+DIMENSOES = ['LOJA', 'CATEGORIA', 'DATA', 'DESCRIÇÃO', 'RESPONSÁVEL']
+# Atributos do produto carregados no cubo sem virar dimensão (os dois últimos vêm
+# do catálogo, catalogo.normalizar; a DESCRIÇÃO já é uma só por CHAVE PRODUTO)
+ATRIBUTOS = ['CÓD. INT.', 'CHAVE PRODUTO', 'DEPARTAMENTO']
+
+
+# Monta o cubo a partir do frame já processado por processar_datas (os totais
+# ausentes já foram completados na limpeza, limpeza.ler_folha_avarias)
+@instrumentacao.medir("montar_cubo")
+def montar_cubo(df, categoria):
+    df = df.assign(CATEGORIA=categoria)
+    for dimensao in ('LOJA', 'RESPONSÁVEL'):
+        if dimensao not in df.columns:
+            df[dimensao] = pd.NA
+
+    agregacoes = {medida: 'sum' for medida in MEDIDAS}
+    agregacoes.update({atributo: 'first' for atributo in ATRIBUTOS if atributo in df.columns})
+    cubo = df.groupby(DIMENSOES, dropna=False, sort=True, observed=True).agg(agregacoes).reset_index()
+
+    # Chaves de período derivadas uma vez por dia do cubo, nos mesmos nomes usados por filtrar_por_periodo
+    for chave, valores in chaves_periodo(cubo['DATA']).items():
+        cubo[chave] = valores
+    # Ordenado por DATA para os recortes de período por busca binária (periodo.fatiar)
+    return ordenar_por_data(cubo)
+
+
+# Consolida um recorte do cubo por produto. Todas as visões de top-N e o resumo
+# saem deste único groupby.
+@instrumentacao.medir("por_produto")
+def por_produto(cubo):
+    agregacoes = {medida: 'sum' for medida in MEDIDAS}
+    agregacoes.update({atributo: 'first' for atributo in ATRIBUTOS if atributo in cubo.columns})
+    return cubo.groupby('DESCRIÇÃO', sort=False, observed=True).agg(agregacoes)
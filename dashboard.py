@@ -1,166 +1,269 @@
-import pandas as pd
 import streamlit as st
-import plotly.express as px
-from datetime import datetime
-import io
+
+import login
 
 VALID_CREDENTIALS = {"admin": "prevencao123"}
 def check_login(username, password):
-    return username in VALID_CREDENTIALS and password == VALID_CREDENTIALS[username]
+    return login.verificar(VALID_CREDENTIALS, username, password)
 
 def login_popup(page="avarias"):
-    if f"logged_in_{page}" not in st.session_state:
-        st.session_state[f"logged_in_{page}"] = False
-    
-    if not st.session_state[f"logged_in_{page}"]:
-        with st.form(key=f"login_form_{page}"):
-            st.write(f"Login para {page.capitalize()}")
-            username = st.text_input("Usuário")
-            password = st.text_input("Senha", type="password")
-            submit = st.form_submit_button("Login")
-            
-            if submit:
-                if check_login(username, password):
-                    st.session_state[f"logged_in_{page}"] = True
-                    st.success("Login bem-sucedido!")
-                    st.rerun()
-                else:
-                    st.error("Usuário ou senha inválidos")
-        return False
-    return True
-
-
-# Cache the Excel file loading to speed up reruns
-@st.cache_resource
-def get_xls(file_path):
-    return pd.ExcelFile(file_path)
+    return login.login_popup(page, VALID_CREDENTIALS)
+
+# Rodando como app, a tela de login aparece antes de carregar pandas e os dados:
+# os imports abaixo só rodam depois do login. plotly.express e relatorio_pdf
+# (fpdf) são importados só nas funções que os usam.
+if __name__ == "__main__" and st.session_state.get("page", "dashboard") == "dashboard" and not login_popup("dashboard"):
+    st.stop()
+
+import pandas as pd
+from datetime import datetime
+import io
+from contextlib import closing
+
+import banco
+import catalogo
+import comparativo
+import formulario
+import ingestao
+import instrumentacao
+import lancamentos
+import lojas
+import periodo
+import tabela
+import vigia
+from esquema import chaves_periodo, otimizar_tipos, relatorio_memoria
+from limpeza import VERSAO_PREVENCAO, ler_folha_prevencao
+
 
 # Carregar dados
 file_path = "./sistemageral/SISTEMA GERAL PREVENÇÃO - FRAGA MAIA3 (1).xlsm"
-xls = get_xls(file_path)
 
 # Folhas disponíveis
 folhas = ["Recuperação de Avarias", "Furtos Recuperados", "Quebra Mês", "Quebra degustação"]
+# Ler e limpar uma folha da planilha (limpeza.py; só roda quando não há snapshot válido)
+ler_folha = ler_folha_prevencao
+VERSAO_LIMPEZA = VERSAO_PREVENCAO
+
+# Cada planilha em ./sistemageral é uma loja; sem nenhuma, vale file_path
+diretorio_lojas = "./sistemageral"
+
+def lojas_disponiveis():
+    return (lojas.descobrir_lojas(diretorio_lojas, lojas.PADRAO_PREVENCAO)
+            or {lojas.nome_loja(file_path): file_path})
+
+# ((loja, caminho, assinatura), ...) das lojas escolhidas (todas se vazio): chave dos caches
+def versao_lojas(lojas_filter=None):
+    return tuple(
+        (loja, caminho, vigia.assinatura(caminho))
+        for loja, caminho in lojas_disponiveis().items()
+        if not lojas_filter or loja in lojas_filter
+    )
 
-# Ler dados da folha selecionada
-@st.cache_data(show_spinner=False)
-def carregar_dados(nome_folha):
+# As folhas são espelhadas na tabela planilha_prevencao do dashboard.db
+TABELA_BANCO = 'planilha_prevencao'
+
+# Importa as linhas novas da folha de cada loja quando a planilha muda e devolve
+# o que a barra lateral precisa (anos e prevenções) sem carregar as linhas
+# `versao_lancamentos` só entra na chave: os lançamentos já vêm nas consultas ao banco
+@st.cache_data(show_spinner=False, max_entries=2 * len(folhas))
+def _sincronizar_folha(nome_folha, versao, versao_lancamentos):
+    caminhos = {loja: caminho for loja, caminho, _ in versao}
+    banco.migrar()
+    with closing(banco.conectar()) as conn:
+        # Planilhas ainda não importadas (e sem snapshot) são lidas em paralelo antes;
+        # as que o vigia já publicou estão no banco
+        pendentes = {
+            loja: caminho for loja, caminho, assinatura in versao
+            if not banco.ja_importada(conn, TABELA_BANCO, loja, nome_folha, assinatura, VERSAO_LIMPEZA)
+        }
+        lojas.aquecer_lojas(pendentes, [nome_folha], ler_folha, VERSAO_LIMPEZA)
+        for loja, caminho, assinatura in versao:
+            banco.sincronizar(
+                conn, TABELA_BANCO, loja, nome_folha, assinatura,
+                lambda caminho=caminho, assinatura=assinatura: ingestao.carregar_folha(
+                    caminho, nome_folha, ler_folha, VERSAO_LIMPEZA, assinatura
+                ),
+                VERSAO_LIMPEZA,
+            )
+        return {
+            'anos': banco.anos_disponiveis(conn, TABELA_BANCO, nome_folha, list(caminhos)),
+            'prevencoes': banco.valores_distintos(conn, TABELA_BANCO, nome_folha, 'responsavel', list(caminhos)),
+            'linhas': banco.contar_linhas(conn, TABELA_BANCO, nome_folha, list(caminhos)),
+            'datas': banco.limites_datas(conn, TABELA_BANCO, nome_folha, list(caminhos)),
+        }
+
+# Ler do banco só as linhas do período e das lojas pedidas
+@st.cache_data(show_spinner=False, max_entries=64)
+def _carregar_dados(nome_folha, versao, intervalos, versao_lancamentos):
+    with closing(banco.conectar()) as conn:
+        return otimizar_tipos(banco.consultar(
+            conn, TABELA_BANCO, nome_folha, intervalos, lojas=[loja for loja, _, _ in versao]
+        ))
+
+@instrumentacao.medir("info_folha")
+def info_folha(nome_folha, lojas_filter=None):
     # Try to read the sheet, handle missing sheets
     try:
-        # For "Quebra Deg", columns may differ
-        if nome_folha == "Quebra degustação":
-            df = pd.read_excel(xls, sheet_name=nome_folha, skiprows=1)
-            # Try to standardize columns if possible
-            expected_cols = ['DATA', 'CÓDIGO BARRAS', 'CÓDIGO INTERNO', 'DESCRIÇÃO', 'QTD', 'VLR. UNI.', 'TOTAL']
-            df = df.iloc[:, :len(expected_cols)]
-            df.columns = expected_cols
-        else:
-            df = pd.read_excel(xls, sheet_name=nome_folha, skiprows=1, usecols="A:H")
-            column_names = ['DATA', 'CÓDIGO BARRAS', 'CÓDIGO INTERNO', 'DESCRIÇÃO', 'QTD', 'VLR. UNI.', 'TOTAL', 'PREV.']
-            df.columns = column_names
-
-        # Limpar e pré-processar os dados
-        df['QTD'] = pd.to_numeric(df['QTD'], errors='coerce')
-
-        def limpar_coluna_moeda(coluna):
-            coluna = coluna.astype(str).str.replace('R\$', '', regex=True).str.strip()
-            def processar_valor(valor):
-                valor = valor.replace(' ', '')
-                if ',' in valor:
-                    partes = valor.rsplit(',', 1)
-                    inteiro = partes[0].replace('.', '')
-                    decimal = partes[1] if len(partes) > 1 else '00'
-                    valor = f"{inteiro}.{decimal}"
-                else:
-                    partes = valor.rsplit('.', 1)
-                    if len(partes) > 1:
-                        inteiro = partes[0].replace('.', '')
-                        decimal = partes[1]
-                        valor = f"{inteiro}.{decimal}"
-                return pd.to_numeric(valor, errors='coerce')
-            return coluna.apply(processar_valor)
-
-        df['VLR. UNI.'] = limpar_coluna_moeda(df['VLR. UNI.'])
-        df['TOTAL'] = limpar_coluna_moeda(df['TOTAL'])
-
-        # Remover linhas com quantidades inválidas ou zero
-        df = df[(df['QTD'] > 0)].dropna(subset=['QTD', 'TOTAL'])
-
-        return df
+        return _sincronizar_folha(nome_folha, versao_lojas(lojas_filter), lancamentos.versao(TABELA_BANCO, nome_folha))
+    except Exception as e:
+        st.error(f"Erro ao carregar dados da folha '{nome_folha}': {e}")
+        return None
+
+# `intervalos`: lista de [início, fim) em ISO; None lê a folha inteira
+@instrumentacao.medir("carregar_dados")
+def carregar_dados(nome_folha, intervalos=None, lojas_filter=None):
+    info = info_folha(nome_folha, lojas_filter)
+    if info is None:
+        return pd.DataFrame()
+    try:
+        versao = versao_lojas(lojas_filter)
+        df = _carregar_dados(nome_folha, versao, None if intervalos is None else tuple(intervalos),
+                             lancamentos.versao(TABELA_BANCO, nome_folha))
     except Exception as e:
         st.error(f"Erro ao carregar dados da folha '{nome_folha}': {e}")
         return pd.DataFrame()
+    # Folhas sem a coluna PREV. (ex.: "Quebra degustação") voltam do banco com ela vazia
+    if not info['prevencoes']:
+        df = df.drop(columns='PREV.')
+    return df
+
+# Totais por setor e mês de todas as folhas numa só consulta ao banco, depois de
+# sincronizar cada folha; os indicadores do comparativo saem deste frame
+@st.cache_data(show_spinner=False, max_entries=8)
+def _indicadores_setores(versao, versao_lancamentos):
+    for nome_folha in folhas:
+        _sincronizar_folha(nome_folha, versao, lancamentos.versao(TABELA_BANCO, nome_folha))
+    with closing(banco.conectar()) as conn:
+        totais = banco.totais_mensais(conn, TABELA_BANCO, comparativo.MEDIDAS_PREVENCAO,
+                                      lojas=[loja for loja, _, _ in versao])
+    return comparativo.indicadores(totais, 'TOTAL')
+
+@instrumentacao.medir("indicadores_setores")
+def indicadores_setores(lojas_filter=None):
+    try:
+        return _indicadores_setores(versao_lojas(lojas_filter), lancamentos.versao(TABELA_BANCO))
+    except Exception as e:
+        st.error(f"Erro ao montar o comparativo entre setores: {e}")
+        return pd.DataFrame()
+
+# Visão "Comparativo entre setores": participação de cada folha no total
+# recuperado por mês, evolução e variações do último mês
+def mostrar_comparativo_setores(lojas_filter):
+    import plotly.express as px
+    indicadores = indicadores_setores(lojas_filter)
+    if indicadores.empty:
+        st.warning("Nenhum dado encontrado.")
+        return
+    grafico = indicadores.assign(período=indicadores['MÊS'].astype(str))
+
+    fig_total = px.line(grafico, x='período', y='TOTAL', color='CATEGORIA', markers=True,
+                        title="Total por Mês por Setor", labels={'TOTAL': 'Total (R$)', 'período': 'Mês'})
+    st.plotly_chart(fig_total)
+
+    fig_participacao = px.bar(grafico, x='período', y='participação', color='CATEGORIA',
+                              title="Participação dos Setores no Total por Mês", labels={'período': 'Mês'})
+    fig_participacao.update_layout(barmode='stack', yaxis_tickformat='.0%', yaxis_title='Participação')
+    st.plotly_chart(fig_participacao)
+
+    ultimo = comparativo.ultimo_mes(indicadores)
+    st.markdown(f"### Indicadores por Setor - {ultimo['MÊS'].iloc[0].strftime('%m/%Y')}")
+    exibicao = comparativo.formatar_percentuais(ultimo, ['participação', 'var. mês', 'var. ano'])
+    exibicao['TOTAL'] = tabela.formatar_moeda(ultimo['TOTAL'])
+    st.dataframe(
+        exibicao[['CATEGORIA', 'TOTAL', 'participação', 'var. mês', 'var. ano']].rename(columns={
+            'CATEGORIA': 'Setor', 'TOTAL': 'Total', 'participação': 'Participação',
+            'var. mês': 'Var. mês anterior', 'var. ano': 'Var. mesmo mês ano anterior',
+        }),
+        hide_index=True,
+    )
 
 # Processar datas e períodos
+@instrumentacao.medir("processar_dates")
 def processar_dates(df):
     df['DATA'] = pd.to_datetime(df['DATA'], format='%d/%m/%Y', errors='coerce')
-    df['mês'] = df['DATA'].dt.month
-    df['dia'] = df['DATA'].dt.day
-    return df
+    for chave, valores in chaves_periodo(df['DATA'], ('mês', 'dia')).items():
+        df[chave] = valores
+    # Produto pelo catálogo: descrição única por código, departamento e valor unitário faltante
+    return catalogo.normalizar(df, interno='CÓDIGO INTERNO', barras='CÓDIGO BARRAS', preco=('VLR. UNI.', 'TOTAL'))
+
+# Filtrar por período: linhas de DATA em [início, fim) de um frame ordenado por
+# DATA (o banco já devolve ordenado), por busca binária
+def filtrar_por_periodo(df, inicio, fim):
+    return periodo.fatiar(periodo.ordenar_por_data(df), inicio, fim)
 
-# Filtrar por período (Mês, Semana)
-def filtrar_por_periodo(df, tipo_periodo, valor_periodo, meses):
+# Seletores do período na barra lateral a partir dos anos/datas da folha no banco;
+# devolve os limites [início, fim). Mês e semana ISO são sempre de um ano escolhido.
+def escolher_periodo(tipo_periodo, info, meses):
+    anos = info['anos'] or [datetime.now().year]
+    if tipo_periodo == 'Intervalo':
+        primeira, ultima = (pd.Timestamp(d).date() if d else datetime.now().date() for d in info['datas'])
+        escolhidas = st.date_input(
+            'Escolha o intervalo', value=(max(primeira, ultima - pd.Timedelta(days=29)), ultima),
+            min_value=primeira, max_value=ultima, format="DD/MM/YYYY",
+        )
+        valor_periodo = tuple(escolhidas) if len(escolhidas) == 2 else (escolhidas[0], escolhidas[0])
+        return periodo.limites_periodo(tipo_periodo, valor_periodo, None)
+    ano = st.selectbox('Escolha o ano', anos[::-1])
     if tipo_periodo == 'Mês':
-        df = df[df['mês'] == valor_periodo]
-    elif tipo_periodo == 'Semana':
-        inicio, fim = valor_periodo.split('-')
-        inicio = int(inicio.replace('Dia ', ''))
-        fim = int(fim)
-        df = df[(df['dia'] >= inicio) & (df['dia'] <= fim) & (df['mês'] == meses.index(st.session_state.mes_selecionado) + 1)]
-    return df
+        mes_selecionado = st.selectbox('Escolha o mês', meses)
+        valor_periodo = meses.index(mes_selecionado) + 1
+    else:
+        valor_periodo = st.selectbox(
+            'Escolha a semana', periodo.semanas_do_ano(ano),
+            format_func=lambda semana: periodo.rotulo_semana(ano, semana),
+        )
+    return periodo.limites_periodo(tipo_periodo, valor_periodo, ano)
 
 # Top 5 prevenções por total recuperado
+@instrumentacao.medir("top_5_prevencao")
 def top_5_prevencao(df):
-    top_5 = df.groupby('PREV.')['TOTAL'].sum().nlargest(5).reset_index()
+    top_5 = df.groupby('PREV.', observed=True)['TOTAL'].sum().nlargest(5).reset_index()
     return top_5
 
 # Top 5 produtos por valor total
+@instrumentacao.medir("top_5_por_valor")
 def top_5_por_valor(df):
-    top_5 = df.groupby('DESCRIÇÃO')['TOTAL'].sum().nlargest(5).reset_index()
+    top_5 = df.groupby('DESCRIÇÃO', observed=True)['TOTAL'].sum().nlargest(5).reset_index()
     return top_5
 
 # Top 5 produtos por quantidade
+@instrumentacao.medir("top_5_por_quantidade")
 def top_5_por_quantidade(df):
-    top_5 = df.groupby('DESCRIÇÃO')['QTD'].sum().nlargest(5).reset_index()
+    top_5 = df.groupby('DESCRIÇÃO', observed=True)['QTD'].sum().nlargest(5).reset_index()
     return top_5
 
 # Resumo de prevenções
+@instrumentacao.medir("resumo_prevencoes")
 def resumo_prevencoes(df):
-    resumo = df.groupby('DESCRIÇÃO').agg({
+    resumo = df.groupby('DESCRIÇÃO', observed=True).agg({
         'QTD': 'sum',
         'TOTAL': 'sum',
         'CÓDIGO INTERNO': 'first'
     }).reset_index()
     return resumo
 
-# Função para formatar valores monetários no formato brasileiro
+# Função para formatar valores monetários no formato brasileiro (um valor; para
+# colunas inteiras use tabela.formatar_moeda)
 def formatar_moeda(valor):
-    if pd.isna(valor):
-        return "R$ 0,00"
-    # Converter o valor para string com 2 casas decimais
-    valor_str = f"{valor:.2f}"
-    # Substituir o ponto decimal por vírgula e adicionar ponto como separador de milhares
-    partes = valor_str.split('.')
-    inteiro = partes[0]
-    decimal = partes[1]
-    # Adicionar pontos como separador de milhares
-    inteiro_com_pontos = ''
-    for i, digito in enumerate(reversed(inteiro)):
-        if i > 0 and i % 3 == 0:
-            inteiro_com_pontos = '.' + inteiro_com_pontos
-        inteiro_com_pontos = digito + inteiro_com_pontos
-    return f"R$ {inteiro_com_pontos},{decimal}"
+    return tabela.formatar_moeda([valor]).iloc[0]
 
 # Função para exportar DataFrame para PDF
+@instrumentacao.medir("exportar_pdf")
 def exportar_pdf(df, titulo="Tabela de Prevenções Detalhada"):
-    st.warning("Exportação para PDF está desabilitada devido a dependências ausentes no ambiente.")
-    return None
+    import relatorio_pdf
+    return relatorio_pdf.gerar_relatorio({}, {titulo: df}, titulo=titulo)
 
 # Interface do Streamlit
 def app():
+    import plotly.express as px
     if not login_popup("dashboard"):
         return
+    instrumentacao.iniciar_execucao("dashboard")
+    admin = st.session_state.get("username_dashboard") == "admin"
     st.title("Dashboard Prevenção 👮🏻‍♂️")
+
+    # Planilhas novas ou alteradas são reimportadas em segundo plano
+    vigia.iniciar(diretorio_lojas, lojas.PADRAO_PREVENCAO, folhas, ler_folha, VERSAO_LIMPEZA, TABELA_BANCO)
     
     meses = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
              'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
@@ -168,33 +271,45 @@ def app():
     # Filtros na barra lateral
     with st.sidebar:
         st.title('👮🏻‍♂️ Dashboard Prevenção')
-        setor = st.selectbox('Escolha o setor', folhas)
-        tipo_periodo = st.selectbox('Escolha o período', ['Mês', 'Semana'])
-        
-        if tipo_periodo == 'Mês':
-            mes_selecionado = st.selectbox('Escolha o mês', meses)
-            st.session_state.mes_selecionado = mes_selecionado
-            valor_periodo = meses.index(mes_selecionado) + 1
+        visao = st.radio('Visão', ['Por setor', 'Comparativo entre setores'], horizontal=True)
+
+        # Lojas: vazio = todas
+        todas_lojas = list(lojas_disponiveis())
+        if len(todas_lojas) > 1:
+            lojas_filter = st.multiselect("Filtrar por Loja", todas_lojas)
         else:
-            mes_selecionado = st.selectbox('Escolha o mês para as semanas', meses)
-            st.session_state.mes_selecionado = mes_selecionado
-            semanas = ['Dia 1-7', 'Dia 8-14', 'Dia 15-21', 'Dia 22-31']
-            valor_periodo = st.selectbox('Escolha a semana', semanas)
-        
-        df_temp = carregar_dados(setor)
+            lojas_filter = []
+
+    if visao == 'Comparativo entre setores':
+        mostrar_comparativo_setores(lojas_filter)
+        instrumentacao.finalizar_execucao(mostrar_painel=admin)
+        return
+
+    with st.sidebar:
+        setor = st.selectbox('Escolha o setor', folhas)
+        tipo_periodo = st.selectbox('Escolha o período', periodo.TIPOS_PERIODO)
+
+        info = info_folha(setor, lojas_filter)
+        if info and info['linhas']:
+            inicio, fim = escolher_periodo(tipo_periodo, info, meses)
         # Only show prevention filter if column exists
-        if not df_temp.empty and 'PREV.' in df_temp.columns:
-            prevention_filter = st.multiselect("Escolha o Prevenção", sorted(df_temp['PREV.'].dropna().unique()))
+        if info and info['prevencoes']:
+            prevention_filter = st.multiselect("Escolha o Prevenção", info['prevencoes'])
         else:
             prevention_filter = []
 
-    df = carregar_dados(setor)
-    if df.empty:
+    # Lançamentos direto no banco, no lugar da planilha compartilhada
+    formulario.mostrar("prevencao", TABELA_BANCO, folhas, todas_lojas,
+                       st.session_state.get("username_dashboard"), "Lançar furtos e quebras")
+
+    if not info or not info['linhas']:
         st.warning("Nenhum dado encontrado para este setor.")
+        instrumentacao.finalizar_execucao(mostrar_painel=admin)
         return
 
-    df = processar_dates(df)
-    df_filtrado = filtrar_por_periodo(df, tipo_periodo, valor_periodo, meses)
+    # Só o período escolhido sai do banco, então não é preciso filtrar depois
+    intervalos = [banco.intervalo_iso(inicio, fim)]
+    df_filtrado = processar_dates(carregar_dados(setor, intervalos, lojas_filter))
 
     # Aplicar filtro de PREV. se existir
     if prevention_filter and 'PREV.' in df_filtrado.columns:
@@ -205,6 +320,16 @@ def app():
     st.markdown("### Total Recuperado")
     st.metric("Total Recuperado", formatar_moeda(total_recuperado))
 
+    # Comparativo entre lojas
+    if df_filtrado['LOJA'].nunique() > 1:
+        por_loja = df_filtrado.groupby('LOJA', observed=True)['TOTAL'].sum().reset_index()
+        fig_lojas = px.bar(
+            por_loja, x='LOJA', y='TOTAL',
+            title="Total Recuperado por Loja",
+            labels={'LOJA': 'Loja', 'TOTAL': 'Recuperado (R$)'}
+        )
+        st.plotly_chart(fig_lojas)
+
     # Top 5 Prevenções que mais recuperaram (only if column exists)
     if 'PREV.' in df_filtrado.columns:
         top_5_prev = top_5_prevencao(df_filtrado)
@@ -253,33 +378,36 @@ def app():
     cols_to_show = ['DATA', 'DESCRIÇÃO', 'QTD', 'VLR. UNI.', 'TOTAL']
     if 'PREV.' in df_filtrado.columns:
         cols_to_show.append('PREV.')
-    df_exibicao = df_filtrado[cols_to_show].copy()
-    if 'VLR. UNI.' in df_exibicao.columns:
-        df_exibicao['VLR. UNI. (R$)'] = df_exibicao['VLR. UNI.'].apply(formatar_moeda)
-    if 'TOTAL' in df_exibicao.columns:
-        df_exibicao['TOTAL (R$)'] = df_exibicao['TOTAL'].apply(formatar_moeda)
-    show_cols = ['DATA', 'DESCRIÇÃO', 'QTD']
-    if 'VLR. UNI. (R$)' in df_exibicao.columns:
-        show_cols.append('VLR. UNI. (R$)')
-    if 'TOTAL (R$)' in df_exibicao.columns:
-        show_cols.append('TOTAL (R$)')
-    if 'PREV.' in df_exibicao.columns:
-        show_cols.append('PREV.')
-    st.dataframe(df_exibicao[show_cols])
-
-    # Botão para exportar para PDF
+    df_exibicao = df_filtrado[cols_to_show]
+    # Paginada no servidor: só a página visível é formatada em R$
+    tabela.tabela_paginada(df_exibicao, "prevencao_detalhe", ['VLR. UNI.', 'TOTAL'])
+    tabela.botoes_download(df_exibicao, "prevencao_detalhe", f"prevencoes_detalhada_{setor}", ['VLR. UNI.', 'TOTAL'],
+                           "Detalhe")
+
+    # Botão para exportar para PDF (formata a tabela inteira só no clique)
     if st.button("Exportar tabela detalhada para PDF"):
-        st.warning("Exportação para PDF está desabilitada devido a dependências ausentes no ambiente.")
+        st.download_button(
+            label="Download PDF",
+            data=exportar_pdf(tabela.formatar_colunas(df_exibicao, ['VLR. UNI.', 'TOTAL']),
+                              titulo=f"Tabela de Prevenções Detalhada - {setor}"),
+            file_name="prevencoes_detalhada.pdf",
+            mime="application/pdf"
+        )
     
     # Tabela de resumo
     st.markdown("### Tabela de Prevenções - Resumo")
-    df_resumo = resumo_prevencoes(df_filtrado)
-    if 'TOTAL' in df_resumo.columns:
-        df_resumo['TOTAL (R$)'] = df_resumo['TOTAL'].apply(formatar_moeda)
+    resumo = resumo_prevencoes(df_filtrado)
+    df_resumo = tabela.formatar_colunas(resumo, ['TOTAL'])
     resumo_cols = ['DESCRIÇÃO', 'QTD', 'CÓDIGO INTERNO']
     if 'TOTAL (R$)' in df_resumo.columns:
         resumo_cols.append('TOTAL (R$)')
     st.dataframe(df_resumo[resumo_cols])
+    resumo = resumo[['DESCRIÇÃO', 'QTD', 'CÓDIGO INTERNO', 'TOTAL']]
+    tabela.botoes_download(resumo, "prevencao_resumo", f"prevencoes_resumo_{setor}", ['TOTAL'], "Resumo")
+
+    with st.sidebar.expander("Memória dos dados"):
+        st.dataframe(relatorio_memoria({setor: df_filtrado}), hide_index=True)
+    instrumentacao.finalizar_execucao(mostrar_painel=admin)
 
 if __name__ == "__main__":
     if "page" not in st.session_state:
@@ -287,6 +415,6 @@ if __name__ == "__main__":
     
     if st.session_state.page == "dashboard":
         app()
-    elif st.session_state.page == "dashboard":
+    elif st.session_state.page == "avarias":
         from avarias import app as avarias_app
         avarias_app()
@@ -0,0 +1,82 @@
+# esquema.py
+# Tipos compactos para os frames das planilhas: textos repetidos viram
+# categorias, inteiros usam o menor tipo seguro e as chaves de período
+# (mês, dia, ano, semana) são derivadas de DATA só quando pedidas.
+import numpy as np
+import pandas as pd
+
+# Colunas de texto com no máximo esta fração de valores distintos viram categoria
+LIMITE_CATEGORIA = 0.5
+
+# Valores monetários continuam float64: float32 perde centavos nas somas do ano
+
+
+def _menor_inteiro(coluna):
+    # int8 estoura fácil em contas com QTD; int16 é o menor tipo usado
+    for tipo in (np.int16, np.int32):
+        info = np.iinfo(tipo)
+        if coluna.min() >= info.min and coluna.max() <= info.max:
+            return coluna.astype(tipo)
+    return coluna.astype(np.int64)
+
+
+def otimizar_tipos(df):
+    df = df.copy(deep=False)
+    for col in df.columns:
+        coluna = df[col]
+        if isinstance(coluna.dtype, pd.CategoricalDtype) or pd.api.types.is_datetime64_any_dtype(coluna):
+            continue
+        if pd.api.types.is_object_dtype(coluna) or pd.api.types.is_string_dtype(coluna):
+            if pd.api.types.infer_dtype(coluna, skipna=True) not in ("string", "empty"):
+                # Códigos com números e textos misturados: categoria só de textos
+                coluna = coluna.astype(object).where(coluna.isna(), coluna.astype(str))
+            if coluna.nunique(dropna=True) <= LIMITE_CATEGORIA * len(coluna):
+                df[col] = coluna.astype("category")
+            else:
+                df[col] = coluna
+        elif pd.api.types.is_bool_dtype(coluna):
+            continue
+        elif pd.api.types.is_integer_dtype(coluna) and len(coluna):
+            df[col] = _menor_inteiro(coluna)
+        elif pd.api.types.is_float_dtype(coluna) and len(coluna) and coluna.notna().all():
+            # Quantidades inteiras lidas como float (ex.: 3.0) viram inteiro;
+            # frações (quilos no açougue) e valores em R$ ficam em float64
+            if (coluna % 1 == 0).all() and col == 'QTD':
+                df[col] = _menor_inteiro(coluna.astype(np.int64))
+    return df
+
+
+# Chaves de período em tipos pequenos, calculadas só para as chaves pedidas
+CHAVES_PERIODO = {
+    'mês': lambda datas: datas.dt.month.astype('Int8'),
+    'dia': lambda datas: datas.dt.day.astype('Int8'),
+    'ano': lambda datas: datas.dt.year.astype('Int16'),
+    'semana': lambda datas: datas.dt.isocalendar().week.astype('Int8'),
+}
+
+
+def chaves_periodo(datas, chaves=tuple(CHAVES_PERIODO)):
+    return pd.DataFrame({chave: CHAVES_PERIODO[chave](datas) for chave in chaves}, index=datas.index)
+
+
+# Bytes ocupados pelo frame, contando o conteúdo dos textos e das categorias
+def uso_memoria(df):
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+# Uma linha por folha: linhas, memória atual e memória que o frame ocuparia
+# sem otimização (tudo object/float64), para acompanhar o ganho
+def relatorio_memoria(frames):
+    linhas = []
+    for nome, df in frames.items():
+        bruto = df.astype({
+            col: object for col in df.columns
+            if isinstance(df[col].dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(df[col])
+        })
+        linhas.append({
+            'Folha': nome,
+            'Linhas': len(df),
+            'Memória (MB)': uso_memoria(df) / 2**20,
+            'Sem otimização (MB)': uso_memoria(bruto) / 2**20,
+        })
+    return pd.DataFrame(linhas, columns=['Folha', 'Linhas', 'Memória (MB)', 'Sem otimização (MB)'])
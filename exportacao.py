@@ -0,0 +1,79 @@
+# exportacao.py
+# Exportação das tabelas (detalhe e resumo) em XLSX e CSV sem montar o arquivo
+# inteiro em objetos: o XLSX usa o modo write-only do openpyxl, que grava cada
+# linha direto no XML da folha, e o CSV é escrito em blocos de linhas. Os valores
+# vão como números e datas de verdade; o R$ vem do formato da célula, não de
+# texto pré-formatado.
+import io
+
+import pandas as pd
+
+# Linhas convertidas de uma vez para valores do Python
+BLOCO = 50_000
+FORMATO_MOEDA = '"R$" #,##0.00'
+FORMATO_DATA = 'DD/MM/YYYY'
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MIME_CSV = "text/csv"
+
+
+# Colunas de um bloco como listas de valores do Python (vazios viram None)
+def _colunas(bloco):
+    return [bloco[c].astype(object).where(bloco[c].notna(), None).tolist() for c in bloco.columns]
+
+
+def _folha(livro, nome, df, colunas_moeda):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    planilha = livro.create_sheet(nome[:31])
+    planilha.freeze_panes = "A2"
+    formatos = {}
+    for i, coluna in enumerate(df.columns):
+        if coluna in colunas_moeda:
+            formatos[i] = FORMATO_MOEDA
+        elif pd.api.types.is_datetime64_any_dtype(df[coluna]):
+            formatos[i] = FORMATO_DATA
+        planilha.column_dimensions[get_column_letter(i + 1)].width = max(12, len(str(coluna)) + 2)
+    planilha.append([str(c) for c in df.columns])
+
+    # Uma célula com formato por coluna, reaproveitada em todas as linhas: no modo
+    # write-only a linha é gravada no append, então o valor pode ser trocado depois
+    modelos = {}
+    for i, formato in formatos.items():
+        modelos[i] = WriteOnlyCell(planilha)
+        modelos[i].number_format = formato
+    for inicio in range(0, len(df), BLOCO):
+        colunas = _colunas(df.iloc[inicio:inicio + BLOCO])
+        for valores in zip(*colunas):
+            linha = list(valores)
+            for i, modelo in modelos.items():
+                if linha[i] is not None:
+                    modelo.value = linha[i]
+                    linha[i] = modelo
+            planilha.append(linha)
+
+
+# XLSX com uma folha por tabela ({nome da folha: frame}); `colunas_moeda` recebe o formato R$
+def xlsx(tabelas, colunas_moeda=()):
+    from openpyxl import Workbook
+
+    livro = Workbook(write_only=True)
+    for nome, df in tabelas.items():
+        _folha(livro, nome, df, set(colunas_moeda))
+    saida = io.BytesIO()
+    livro.save(saida)
+    return saida.getvalue()
+
+
+# CSV em UTF-8 com BOM (o Excel reconhece os acentos), datas em dd/mm/aaaa e
+# números sem separador de milhar
+def csv(df):
+    saida = io.BytesIO()
+    texto = io.TextIOWrapper(saida, encoding="utf-8-sig", newline="")
+    for inicio in range(0, max(len(df), 1), BLOCO):
+        df.iloc[inicio:inicio + BLOCO].to_csv(
+            texto, index=False, header=inicio == 0, date_format="%d/%m/%Y", lineterminator="\n"
+        )
+    texto.flush()
+    texto.detach()
+    return saida.getvalue()
@@ -0,0 +1,72 @@
+# formulario.py
+# Formulário de lançamento dos dashboards: várias linhas digitadas numa tabela
+# editável e gravadas de uma vez no dashboard.db (lancamentos.py), no lugar de
+# editar a planilha compartilhada. Também baixa a planilha no leiaute antigo.
+import pandas as pd
+import streamlit as st
+
+import lancamentos
+
+_CONFIGURACAO = {
+    'DATA': st.column_config.DateColumn('DATA', format="DD/MM/YYYY", required=True),
+    'QTD': st.column_config.NumberColumn('QTD', min_value=0.0, step=0.001, required=True),
+    'CÓD. INT.': st.column_config.TextColumn('CÓD. INT.'),
+    'CÓDIGO BARRAS': st.column_config.TextColumn('CÓDIGO BARRAS'),
+    'CÓDIGO INTERNO': st.column_config.TextColumn('CÓDIGO INTERNO'),
+    'DESCRIÇÃO': st.column_config.TextColumn('DESCRIÇÃO'),
+    'RESPONSÁVEL': st.column_config.TextColumn('RESPONSÁVEL'),
+    'PREV.': st.column_config.TextColumn('PREV.'),
+}
+
+
+def _vazio(tabela):
+    colunas = lancamentos.CAMPOS[tabela]
+    df = pd.DataFrame({coluna: pd.Series(dtype=object) for coluna in colunas})
+    df['DATA'] = pd.Series(dtype='datetime64[ns]')
+    for coluna in ['QTD', *[c for par in lancamentos.TOTAIS[tabela].items() for c in par]]:
+        df[coluna] = pd.Series(dtype=float)
+    return df
+
+
+# `painel` nomeia as chaves dos widgets; `folhas` são os setores que o usuário pode lançar
+def mostrar(painel, tabela, folhas, lojas, usuario, titulo):
+    with st.expander(f"📝 {titulo}", expanded=False):
+        coluna_setor, coluna_loja = st.columns(2)
+        folha = coluna_setor.selectbox("Setor", folhas, key=f"lancar_setor_{painel}")
+        loja = coluna_loja.selectbox("Loja", lojas, key=f"lancar_loja_{painel}")
+        if not loja:
+            st.info("Nenhuma loja encontrada para lançar.")
+            return
+        # A chave muda depois de gravar, para a tabela voltar vazia
+        versao_editor = st.session_state.get(f"lancar_editor_{painel}", 0)
+        editadas = st.data_editor(
+            _vazio(tabela), num_rows="dynamic", hide_index=True, width="stretch",
+            column_config=_CONFIGURACAO, key=f"lancar_{painel}_{versao_editor}",
+        )
+        if st.button("Gravar lançamentos", key=f"lancar_gravar_{painel}"):
+            registros = [
+                {c: v for c, v in registro.items() if not pd.isna(v)}
+                for registro in editadas.dropna(how='all').to_dict('records')
+            ]
+            try:
+                gravados = lancamentos.gravar(tabela, folha, loja, registros, terminal=usuario)
+            except lancamentos.ErroLancamento as e:
+                st.error("Lançamentos não gravados:\n\n" + "\n".join(f"- {p}" for p in e.problemas))
+            except Exception as e:
+                st.error(f"Erro ao gravar os lançamentos: {e}")
+            else:
+                st.session_state[f"lancar_editor_{painel}"] = versao_editor + 1
+                st.session_state[f"lancar_resultado_{painel}"] = f"{gravados} lançamento(s) gravado(s) em {folha}."
+                st.rerun()
+        resultado = st.session_state.pop(f"lancar_resultado_{painel}", None)
+        if resultado:
+            st.success(resultado)
+
+        # Gerada só no clique: planilhas das lojas e lançamentos no leiaute das planilhas antigas
+        st.download_button(
+            "Baixar planilha da loja (leiaute antigo)",
+            data=lambda: lancamentos.exportar_planilha(tabela, loja, folhas),
+            file_name=f"{painel}_{loja}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            key=f"lancar_exportar_{painel}",
+        )
@@ -0,0 +1,204 @@
+# ingestao.py
+# Snapshots colunares (Arrow IPC) das folhas das planilhas .xlsm.
+# Cada folha é lida do Excel uma única vez por versão do arquivo; as leituras
+# seguintes vêm do snapshot mapeado em memória.
+import hashlib
+import json
+import os
+import re
+import tempfile
+import unicodedata
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import instrumentacao
+
+DIRETORIO_CACHE = os.environ.get("AVARIAS_CACHE_DIR", "./.cache/snapshots")
+
+# Assinaturas já calculadas neste processo: caminho -> (mtime_ns, tamanho, hash)
+_assinaturas = {}
+
+
+# A planilha está sendo gravada ou mudou durante a leitura: o que foi lido não é
+# uma versão inteira dela
+class ErroPlanilhaInstavel(RuntimeError):
+    pass
+
+
+def slug(texto):
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^0-9A-Za-z]+", "_", texto).strip("_").lower()
+
+
+def _hash_conteudo(caminho):
+    h = hashlib.blake2b(digest_size=16)
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+# Identifica o arquivo pelo caminho: planilhas de lojas diferentes têm folhas
+# com o mesmo nome e não podem dividir os snapshots
+def _chave_caminho(caminho):
+    return hashlib.blake2b(os.path.abspath(caminho).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _caminho_manifesto(caminho):
+    return os.path.join(DIRETORIO_CACHE, f"manifesto-{_chave_caminho(caminho)}.json")
+
+
+# Temporário com nome único (o vigia e as sessões gravam do mesmo processo)
+def _gravar_atomico(destino, escrever):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp")
+    os.close(descritor)
+    try:
+        escrever(temporario)
+        os.replace(temporario, destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+# Hash do conteúdo da planilha. Só é recalculado quando mtime ou tamanho mudam;
+# se o conteúdo for idêntico (ex.: arquivo apenas salvo de novo) o snapshot é reaproveitado.
+def assinatura_arquivo(caminho):
+    info = os.stat(caminho)
+    atual = (info.st_mtime_ns, info.st_size)
+
+    memo = _assinaturas.get(caminho)
+    if memo and memo[:2] == atual:
+        return memo[2]
+
+    manifesto = _caminho_manifesto(caminho)
+    try:
+        with open(manifesto, encoding="utf-8") as f:
+            dados = json.load(f)
+        if (dados["mtime_ns"], dados["tamanho"]) == atual:
+            _assinaturas[caminho] = (*atual, dados["hash"])
+            return dados["hash"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    assinatura = _hash_conteudo(caminho)
+    dados = {"mtime_ns": atual[0], "tamanho": atual[1], "hash": assinatura}
+    try:
+        def escrever(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(dados, f)
+        _gravar_atomico(manifesto, escrever)
+    except OSError:
+        pass
+    _assinaturas[caminho] = (*atual, assinatura)
+    return assinatura
+
+
+def _prefixo_snapshot(caminho, nome_folha, versao):
+    return f"{slug(nome_folha)}-{_chave_caminho(caminho)}-v{versao}-"
+
+
+# `assinatura` permite pedir o snapshot de uma versão já conhecida da planilha
+# (ex.: a publicada pelo vigia) sem recalcular o hash do arquivo atual
+def caminho_snapshot(caminho, nome_folha, versao="1", assinatura=None):
+    return os.path.join(
+        DIRETORIO_CACHE,
+        f"{_prefixo_snapshot(caminho, nome_folha, versao)}{assinatura or assinatura_arquivo(caminho)}.arrow",
+    )
+
+
+# Colunas object com tipos misturados (ex.: códigos de barras numéricos e texto)
+# não são aceitas pelo Arrow; esses valores viram texto.
+def _normalizar_para_arrow(df):
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True) in ("mixed", "mixed-integer"):
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v)).astype(object)
+    return df
+
+
+def _remover_antigos(caminho, nome_folha, versao, manter):
+    prefixo = _prefixo_snapshot(caminho, nome_folha, versao)
+    try:
+        arquivos = os.listdir(DIRETORIO_CACHE)
+    except OSError:
+        return
+    for nome in arquivos:
+        if nome.startswith(prefixo) and nome.endswith(".arrow") and nome != manter:
+            try:
+                os.remove(os.path.join(DIRETORIO_CACHE, nome))
+            except OSError:
+                pass
+
+
+def ler_snapshot(destino):
+    return feather.read_table(destino, memory_map=True).to_pandas()
+
+
+# Snapshot da versão atual da planilha, ou None se ainda não existe (ou está corrompido)
+@instrumentacao.medir("ler_snapshot")
+def ler_snapshot_existente(caminho, nome_folha, versao="1", assinatura=None):
+    destino = caminho_snapshot(caminho, nome_folha, versao, assinatura)
+    if not os.path.exists(destino):
+        return None
+    try:
+        return ler_snapshot(destino)
+    except (OSError, pa.ArrowException):
+        return None
+
+
+# `assinatura` é a da planilha antes de abri-la. Se o arquivo mudou durante a
+# leitura, o conteúdo lido pode misturar duas versões e é recusado.
+def _materializar(xls, caminho, nome_folha, ler_folha, versao, assinatura):
+    destino = caminho_snapshot(caminho, nome_folha, versao, assinatura)
+    with instrumentacao.medir(f"ler_excel [{nome_folha}]") as medida:
+        df = _normalizar_para_arrow(ler_folha(xls, nome_folha))
+        medida.linhas = len(df)
+    if assinatura_arquivo(caminho) != assinatura:
+        raise ErroPlanilhaInstavel(f"{os.path.basename(caminho)} mudou durante a leitura de {nome_folha}")
+    try:
+        _gravar_atomico(destino, lambda tmp: feather.write_feather(df, tmp, compression="uncompressed"))
+        _remover_antigos(caminho, nome_folha, versao, os.path.basename(destino))
+    except (OSError, pa.ArrowException):
+        # Sem snapshot o dado continua válido, só não fica em cache
+        pass
+    return df
+
+
+# Devolve a folha já limpa. `ler_folha(xls, nome_folha)` só é chamada quando não
+# existe snapshot para a versão atual da planilha; `versao` deve mudar sempre que
+# a limpeza feita por `ler_folha` mudar. Com `assinatura`, o snapshot dessa versão
+# é usado se ainda existir.
+def carregar_folha(caminho, nome_folha, ler_folha, versao="1", assinatura=None):
+    if assinatura is not None:
+        df = ler_snapshot_existente(caminho, nome_folha, versao, assinatura)
+        if df is not None:
+            return df
+    assinatura = assinatura_arquivo(caminho)
+    df = ler_snapshot_existente(caminho, nome_folha, versao, assinatura)
+    if df is not None:
+        return df
+    with pd.ExcelFile(caminho) as xls:
+        return _materializar(xls, caminho, nome_folha, ler_folha, versao, assinatura)
+
+
+# Gera os snapshots que faltam para todas as folhas abrindo a planilha uma só vez.
+# Folhas que falham na leitura são ignoradas aqui e reportadas em carregar_folha.
+def aquecer(caminho, nomes_folhas, ler_folha, versao="1"):
+    assinatura = assinatura_arquivo(caminho)
+    faltando = [n for n in nomes_folhas if not os.path.exists(caminho_snapshot(caminho, n, versao, assinatura))]
+    if not faltando:
+        return []
+    gerados = []
+    with pd.ExcelFile(caminho) as xls:
+        for nome in faltando:
+            try:
+                _materializar(xls, caminho, nome, ler_folha, versao, assinatura)
+            except Exception:
+                continue
+            # Sem snapshot quando a gravação falhou
+            if os.path.exists(caminho_snapshot(caminho, nome, versao, assinatura)):
+                gerados.append(nome)
+    return gerados
@@ -0,0 +1,163 @@
+# instrumentacao.py
+# Tempo, linhas e memória de cada etapa dos dashboards (leitura, limpeza,
+# agrupamentos, gráficos, PDF) por execução do script. `medir` funciona como
+# decorador e como gerenciador de contexto; fora de uma execução iniciada com
+# iniciar_execucao (ex.: relatorios_lote, benchmarks) não registra nada.
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# Se definido, cada execução é acrescentada a este arquivo JSONL
+CAMINHO_LOG = os.environ.get("AVARIAS_INSTRUMENTACAO_LOG")
+LOG_PADRAO = "./.cache/instrumentacao.jsonl"
+
+# O Streamlit roda cada execução do script numa thread: os registros são por thread
+_local = threading.local()
+
+
+def _memoria_mb():
+    # RSS atual do processo; só em Linux (/proc), em outros sistemas fica vazio
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _linhas(valor):
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return len(valor)
+    return None
+
+
+def iniciar_execucao(pagina):
+    _local.execucao = {"pagina": pagina, "inicio": time.time(), "etapas": [], "nivel": 0}
+
+
+def ativo():
+    return getattr(_local, "execucao", None) is not None
+
+
+def registros():
+    execucao = getattr(_local, "execucao", None)
+    return [dict(e) for e in execucao["etapas"]] if execucao else []
+
+
+class _Medida:
+    linhas = None
+
+
+# Mede o bloco. `medida.linhas` pode ser preenchido dentro do bloco.
+#     with medir("figuras") as medida:
+#         ...
+#         medida.linhas = len(produtos)
+@contextmanager
+def _medir_bloco(etapa):
+    execucao = getattr(_local, "execucao", None)
+    medida = _Medida()
+    if execucao is None:
+        yield medida
+        return
+    nivel = execucao["nivel"]
+    # Registrada na entrada, para que as etapas internas apareçam depois da que as chamou
+    registro = {"etapa": etapa, "nivel": nivel, "segundos": None, "linhas": None, "memoria_mb": None}
+    execucao["etapas"].append(registro)
+    execucao["nivel"] += 1
+    memoria = _memoria_mb()
+    inicio = time.perf_counter()
+    try:
+        yield medida
+    finally:
+        registro["segundos"] = round(time.perf_counter() - inicio, 6)
+        depois = _memoria_mb()
+        execucao["nivel"] = nivel
+        registro["linhas"] = medida.linhas
+        if memoria is not None and depois is not None:
+            registro["memoria_mb"] = round(depois - memoria, 2)
+
+
+class medir:
+    def __init__(self, etapa):
+        self.etapa = etapa
+        self._bloco = None
+
+    def __enter__(self):
+        self._bloco = _medir_bloco(self.etapa)
+        return self._bloco.__enter__()
+
+    def __exit__(self, *erro):
+        return self._bloco.__exit__(*erro)
+
+    # Como decorador: as linhas são as do frame devolvido ou, se não for um
+    # frame, as do primeiro frame recebido
+    def __call__(self, funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            if not ativo():
+                return funcao(*args, **kwargs)
+            with _medir_bloco(self.etapa) as m:
+                resultado = funcao(*args, **kwargs)
+                m.linhas = _linhas(resultado)
+                if m.linhas is None:
+                    m.linhas = next((_linhas(a) for a in args if _linhas(a) is not None), None)
+            return resultado
+        return medida
+
+
+def tabela_registros(etapas=None):
+    etapas = registros() if etapas is None else etapas
+    if not etapas:
+        return pd.DataFrame(columns=["Etapa", "ms", "Linhas", "Memória (MB)"])
+    df = pd.DataFrame(etapas)
+    return pd.DataFrame({
+        # Etapas internas recuadas sob a que as chamou
+        "Etapa": ["· " * n + e for n, e in zip(df["nivel"], df["etapa"])],
+        "ms": (df["segundos"] * 1000).round(1),
+        "Linhas": df["linhas"].astype("Int64"),
+        "Memória (MB)": df["memoria_mb"],
+    })
+
+
+# Acrescenta a execução atual ao JSONL (uma linha por execução)
+def gravar_jsonl(caminho=None):
+    execucao = getattr(_local, "execucao", None)
+    if not execucao or not execucao["etapas"]:
+        return None
+    caminho = caminho or CAMINHO_LOG or LOG_PADRAO
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    linha = {
+        "quando": datetime.fromtimestamp(execucao["inicio"]).isoformat(timespec="seconds"),
+        "pagina": execucao["pagina"],
+        "total_segundos": round(time.time() - execucao["inicio"], 6),
+        "etapas": execucao["etapas"],
+    }
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(json.dumps(linha, ensure_ascii=False) + "\n")
+    return caminho
+
+
+# Fecha a execução: grava no log se AVARIAS_INSTRUMENTACAO_LOG estiver definido
+# e, para o admin, mostra as etapas num expander da barra lateral
+def finalizar_execucao(mostrar_painel=False):
+    if not ativo():
+        return
+    if CAMINHO_LOG:
+        gravar_jsonl(CAMINHO_LOG)
+    if mostrar_painel:
+        # Importado só aqui: moeda, cubo e ingestao também rodam nos processos filhos, sem Streamlit
+        import streamlit as st
+        etapas = registros()
+        with st.sidebar.expander("Desempenho desta execução"):
+            raiz = sum(e["segundos"] for e in etapas if e["nivel"] == 0)
+            st.caption(f"{len(etapas)} etapas medidas · {raiz * 1000:.0f} ms nas etapas de primeiro nível")
+            st.dataframe(tabela_registros(etapas), hide_index=True)
+            if not CAMINHO_LOG and st.button("Salvar no log (JSONL)"):
+                st.caption(f"Salvo em {gravar_jsonl()}")
+    _local.execucao = None
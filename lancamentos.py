@@ -0,0 +1,286 @@
+# lancamentos.py
+# Lançamentos de avarias e de furtos/prevenção feitos pelo formulário dos
+# dashboards ou pela API, gravados direto no dashboard.db (tabelas
+# avarias_lancadas e furtos_recuperados, banco.LANCAMENTOS) em vez de na
+# planilha compartilhada, que travava enquanto alguém a editava.
+#
+# Gravação: cada processo tem uma só thread gravadora por banco. Os pedidos de
+# todas as sessões/requisições entram numa fila; os que chegam enquanto uma
+# transação está em andamento são gravados juntos na seguinte (um commit para
+# vários terminais). Com o banco em WAL os
+# dashboards continuam lendo durante a gravação, e outros processos esperam a
+# vez pelo timeout do SQLite.
+#
+# Versão: cada gravação sobe a versão da folha (tabela versoes_lancamentos) na
+# mesma transação. versao() é lida só quando o arquivo do banco mudou e entra nas
+# chaves dos caches, que assim só caem quando há lançamentos novos.
+import io
+import queue
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+
+import banco
+import periodo
+from esquema import otimizar_tipos
+from moeda import converter_moeda
+
+# Pedidos gravados juntos no máximo numa transação
+LOTE = 64
+
+# Colunas do formulário (nomes da planilha) por tabela; LOJA vem à parte
+CAMPOS = {
+    tabela: [coluna for coluna in colunas if coluna != 'LOJA']
+    for tabela, colunas in banco.TABELAS.items()
+}
+# Valor unitário -> total de cada tabela; o total vazio vira QTD x unitário
+TOTAIS = {
+    'planilha_avarias': {'VLR. UNIT. VENDA': 'VLR. TOT. VENDA', 'VLR. UNIT. CUSTO': 'VLR. TOT. CUSTO'},
+    'planilha_prevencao': {'VLR. UNI.': 'TOTAL'},
+}
+CODIGOS = {
+    'planilha_avarias': ['CÓD. INT.'],
+    'planilha_prevencao': ['CÓDIGO BARRAS', 'CÓDIGO INTERNO'],
+}
+# Folhas de prevenção sem a coluna PREV. na planilha (como em limpeza.ler_folha_prevencao)
+SEM_PREVENCAO = {"Quebra degustação"}
+
+
+class ErroLancamento(ValueError):
+    def __init__(self, problemas):
+        super().__init__("; ".join(problemas))
+        self.problemas = problemas
+
+
+# DATA como data, em dd/mm/aaaa (como na planilha) ou aaaa-mm-dd
+def _datas(valores):
+    valores = pd.Series(valores, dtype=object)
+    datas = pd.to_datetime(valores, format='%d/%m/%Y', errors='coerce')
+    faltam = datas.isna() & valores.notna()
+    if faltam.any():
+        datas[faltam] = pd.to_datetime(valores[faltam].astype(str).str[:10], format='%Y-%m-%d', errors='coerce')
+    return datas
+
+
+# Confere e completa os registros ({coluna da planilha: valor}) e devolve as
+# linhas com as colunas da tabela de lançamentos. Levanta ErroLancamento com
+# todos os problemas encontrados, linha a linha.
+def preparar(tabela, folha, loja, registros, terminal=None):
+    campos = CAMPOS[tabela]
+    df = pd.DataFrame.from_records(list(registros), columns=campos)
+    if df.empty:
+        raise ErroLancamento(["nenhum lançamento"])
+    desconhecidas = {c for registro in registros for c in registro} - set(campos)
+    if desconhecidas:
+        raise ErroLancamento([f"colunas desconhecidas: {', '.join(sorted(desconhecidas))}"])
+
+    df['DATA'] = _datas(df['DATA'])
+    df['QTD'] = pd.to_numeric(df['QTD'], errors='coerce')
+    for unitario, total in TOTAIS[tabela].items():
+        df[unitario] = converter_moeda(df[unitario])
+        df[total] = converter_moeda(df[total]).fillna(df['QTD'] * df[unitario])
+    texto = df['DESCRIÇÃO'].astype(object).where(df['DESCRIÇÃO'].notna(), '').astype(str).str.strip()
+    df['DESCRIÇÃO'] = texto.where(texto != '')
+
+    identificado = df['DESCRIÇÃO'].notna()
+    for codigo in CODIGOS[tabela]:
+        identificado |= df[codigo].notna() & (df[codigo].astype(str).str.strip() != '')
+    testes = [
+        ("DATA inválida", df['DATA'].isna().to_numpy()),
+        ("QTD precisa ser maior que zero", ~(df['QTD'] > 0).to_numpy()),
+        ("informe a descrição ou um código do produto", ~identificado.to_numpy()),
+    ]
+    problemas = [f"linha {i + 1}: {mensagem}" for i in range(len(df)) for mensagem, falha in testes if falha[i]]
+    if problemas:
+        raise ErroLancamento(problemas)
+
+    _, renomeadas = banco.LANCAMENTOS[tabela]
+    linhas = banco.para_tabela(df.assign(LOJA=loja), banco.TABELAS[tabela]).rename(columns=renomeadas)
+    if 'codigo_barras' in linhas.columns:
+        linhas['codigo_barras'] = linhas['codigo_barras'].fillna('')
+    linhas.insert(0, 'folha', folha)
+    linhas['terminal'] = terminal
+    linhas['lancado_em'] = datetime.now().isoformat(timespec='seconds')
+    return linhas[list(banco.colunas_lancadas(tabela))]
+
+
+class _Pedido:
+    def __init__(self, tabela, linhas):
+        self.tabela = tabela
+        self.linhas = linhas
+        self.feito = threading.Event()
+        self.erro = None
+
+
+def _inserir(conn, pedido):
+    lancada, _ = banco.LANCAMENTOS[pedido.tabela]
+    colunas = list(pedido.linhas.columns)
+    conn.executemany(
+        f"INSERT INTO {lancada} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+        ([None if pd.isna(v) else v for v in registro]
+         for registro in pedido.linhas.itertuples(index=False, name=None)),
+    )
+    for folha in pedido.linhas['folha'].unique():
+        conn.execute(
+            "INSERT INTO versoes_lancamentos VALUES (?, ?, 1) "
+            "ON CONFLICT (tabela, folha) DO UPDATE SET versao = versao + 1",
+            (pedido.tabela, folha),
+        )
+
+
+# Thread que grava os pedidos da fila em lote
+class Gravador:
+    def __init__(self, caminho=None, lote=LOTE):
+        self.caminho = caminho
+        self.lote = lote
+        self.transacoes = 0
+        self._fila = queue.Queue()
+        self._thread = threading.Thread(target=self._rodar, name="lancamentos", daemon=True)
+        self._thread.start()
+
+    # Grava as linhas já preparadas e espera a transação terminar
+    def gravar(self, tabela, linhas):
+        pedido = _Pedido(tabela, linhas)
+        self._fila.put(pedido)
+        pedido.feito.wait()
+        if pedido.erro is not None:
+            raise pedido.erro
+        return len(linhas)
+
+    # Espera o primeiro pedido e leva junto os que já estão na fila
+    def _proximo_lote(self):
+        pedidos = [self._fila.get()]
+        while len(pedidos) < self.lote:
+            try:
+                pedidos.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return pedidos
+
+    def _transacao(self, conn, pedidos):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for pedido in pedidos:
+                _inserir(conn, pedido)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        self.transacoes += 1
+
+    def _rodar(self):
+        conn = None
+        while True:
+            pedidos = self._proximo_lote()
+            try:
+                if conn is None:
+                    banco.migrar(self.caminho)
+                    conn = banco.conectar(self.caminho)
+                    # Transações controladas aqui (BEGIN IMMEDIATE / commit)
+                    conn.isolation_level = None
+                try:
+                    self._transacao(conn, pedidos)
+                except sqlite3.Error:
+                    if len(pedidos) == 1:
+                        raise
+                    # Um pedido com problema não derruba os outros do lote
+                    for pedido in pedidos:
+                        try:
+                            self._transacao(conn, [pedido])
+                        except sqlite3.Error as e:
+                            pedido.erro = e
+            except Exception as e:
+                for pedido in pedidos:
+                    pedido.erro = pedido.erro or e
+                if conn is not None:
+                    conn.close()
+                    conn = None
+            for pedido in pedidos:
+                pedido.feito.set()
+
+
+_gravadores = {}
+_lock = threading.Lock()
+
+
+def gravador(caminho=None):
+    caminho = caminho or banco.CAMINHO_BANCO
+    with _lock:
+        if caminho not in _gravadores:
+            _gravadores[caminho] = Gravador(caminho)
+        return _gravadores[caminho]
+
+
+# Confere, completa e grava os lançamentos de uma folha/loja. Devolve quantos foram gravados.
+def gravar(tabela, folha, loja, registros, terminal=None, caminho=None):
+    linhas = preparar(tabela, folha, loja, registros, terminal)
+    return gravador(caminho).gravar(tabela, linhas)
+
+
+# caminho -> (estado do arquivo, {(tabela, folha): versão})
+_versoes = {}
+
+
+def versoes(caminho=None):
+    caminho = caminho or banco.CAMINHO_BANCO
+    estado = banco.estado_arquivo(caminho)
+    guardado = _versoes.get(caminho)
+    if guardado is not None and guardado[0] == estado:
+        return guardado[1]
+    try:
+        with closing(sqlite3.connect(f"file:{caminho}?mode=ro", uri=True, timeout=30)) as conn:
+            atuais = banco.versoes_lancamentos(conn)
+    except sqlite3.Error:
+        # Banco ainda sem a tabela de versões: nenhum lançamento
+        atuais = {}
+    _versoes[caminho] = (estado, atuais)
+    return atuais
+
+
+# Versão dos lançamentos de uma folha, ou de todas as folhas da tabela
+def versao(tabela, folha=None, caminho=None):
+    atuais = versoes(caminho)
+    if folha is not None:
+        return atuais.get((tabela, folha), 0)
+    return sum(v for (t, _), v in atuais.items() if t == tabela)
+
+
+# Junta aos dados lidos das planilhas (lojas.carregar_lojas) os lançamentos da
+# folha nas mesmas lojas
+def juntar(df, tabela, folha, lojas, caminho=None):
+    if not versao(tabela, folha, caminho):
+        return df
+    with closing(banco.conectar(caminho)) as conn:
+        lancados = banco.consultar(conn, tabela, folha, lojas=list(lojas), lancados=True)
+    if lancados.empty:
+        return df
+    juntos = pd.concat([df.astype({c: object for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)}),
+                        lancados], ignore_index=True)
+    return periodo.ordenar_por_data(otimizar_tipos(juntos))
+
+
+# Planilha .xlsx no leiaute antigo (uma folha por setor, título na linha 1,
+# cabeçalho na linha 2), com as linhas das planilhas e os lançamentos da loja
+def exportar_planilha(tabela, loja, folhas, caminho=None):
+    from openpyxl import Workbook
+
+    livro = Workbook()
+    livro.remove(livro.active)
+    with closing(banco.conectar(caminho)) as conn:
+        for folha in folhas:
+            colunas = [c for c in CAMPOS[tabela] if not (c == 'PREV.' and folha in SEM_PREVENCAO)]
+            df = banco.consultar(conn, tabela, folha, lojas=[loja])
+            planilha = livro.create_sheet(folha[:31])
+            planilha.append([folha])
+            planilha.append(colunas)
+            for registro in df[colunas].itertuples(index=False, name=None):
+                planilha.append([None if pd.isna(v) else v.to_pydatetime() if isinstance(v, pd.Timestamp) else v
+                                 for v in registro])
+            for celula in planilha['A'][2:]:
+                celula.number_format = 'DD/MM/YYYY'
+    saida = io.BytesIO()
+    livro.save(saida)
+    return saida.getvalue()
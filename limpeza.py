@@ -0,0 +1,65 @@
+# limpeza.py
+# Leitura e limpeza das folhas das planilhas de avarias e de prevenção.
+# Ficam fora dos scripts do Streamlit para que os processos que leem as
+# planilhas das lojas em paralelo consigam importá-las.
+import warnings
+
+import pandas as pd
+
+from esquema import otimizar_tipos
+from moeda import converter_moeda
+
+# Aumentar sempre que a limpeza mudar, para descartar snapshots antigos
+VERSAO_AVARIAS = "4"
+VERSAO_PREVENCAO = "3"
+
+
+def ler_folha_avarias(xls, nome_folha):
+    df = pd.read_excel(xls, sheet_name=nome_folha, skiprows=1)
+
+    # Ensure numeric columns are properly formatted
+    df['QTD'] = pd.to_numeric(df['QTD'], errors='coerce')
+    df['DATA'] = pd.to_datetime(df['DATA'], format='%d/%m/%Y', errors='coerce')
+
+    # Clean monetary columns
+    for col in ['VLR. UNIT. VENDA', 'VLR. UNIT. CUSTO', 'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']:
+        if col in df.columns:
+            df[col] = converter_moeda(df[col])
+        else:
+            warnings.warn(f"Coluna {col} não encontrada nos dados ({nome_folha})")
+            df[col] = 0
+
+    # Totais ausentes na planilha viram QTD x valor unitário (como em lancamentos.preparar),
+    # para o cubo, o espelho no banco e a tabela detalhada somarem os mesmos valores
+    for total, unitario in [('VLR. TOT. VENDA', 'VLR. UNIT. VENDA'), ('VLR. TOT. CUSTO', 'VLR. UNIT. CUSTO')]:
+        df[total] = df[total].fillna(df['QTD'] * df[unitario])
+
+    # Filter out invalid QTD values
+    df = df[(df['QTD'] > 0)].dropna(subset=['QTD'])
+    return otimizar_tipos(df)
+
+
+def ler_folha_prevencao(xls, nome_folha):
+    # For "Quebra Deg", columns may differ
+    if nome_folha == "Quebra degustação":
+        df = pd.read_excel(xls, sheet_name=nome_folha, skiprows=1)
+        # Try to standardize columns if possible
+        expected_cols = ['DATA', 'CÓDIGO BARRAS', 'CÓDIGO INTERNO', 'DESCRIÇÃO', 'QTD', 'VLR. UNI.', 'TOTAL']
+        df = df.iloc[:, :len(expected_cols)]
+        df.columns = expected_cols
+    else:
+        df = pd.read_excel(xls, sheet_name=nome_folha, skiprows=1, usecols="A:H")
+        column_names = ['DATA', 'CÓDIGO BARRAS', 'CÓDIGO INTERNO', 'DESCRIÇÃO', 'QTD', 'VLR. UNI.', 'TOTAL', 'PREV.']
+        df.columns = column_names
+
+    # Limpar e pré-processar os dados
+    df['QTD'] = pd.to_numeric(df['QTD'], errors='coerce')
+    df['DATA'] = pd.to_datetime(df['DATA'], format='%d/%m/%Y', errors='coerce')
+
+    df['VLR. UNI.'] = converter_moeda(df['VLR. UNI.'])
+    df['TOTAL'] = converter_moeda(df['TOTAL'])
+
+    # Remover linhas com quantidades inválidas ou zero
+    df = df[(df['QTD'] > 0)].dropna(subset=['QTD', 'TOTAL'])
+
+    return otimizar_tipos(df)
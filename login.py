@@ -0,0 +1,36 @@
+# login.py
+# Formulário de login dos dashboards. Só depende do Streamlit: os scripts o
+# mostram antes de importar pandas, plotly e os módulos de dados, para que a
+# tela de login apareça sem esperar por eles.
+import streamlit as st
+
+
+def verificar(credenciais, username, password):
+    return username in credenciais and password == credenciais[username]
+
+
+# True se o usuário da página já entrou; senão mostra o formulário.
+# O usuário fica em st.session_state["username_<page>"].
+def login_popup(page, credenciais):
+    if f"logged_in_{page}" not in st.session_state:
+        st.session_state[f"logged_in_{page}"] = False
+    if f"username_{page}" not in st.session_state:
+        st.session_state[f"username_{page}"] = None
+
+    if not st.session_state[f"logged_in_{page}"]:
+        with st.form(key=f"login_form_{page}"):
+            st.write(f"Login para {page.capitalize()}")
+            username = st.text_input("Usuário")
+            password = st.text_input("Senha", type="password")
+            submit = st.form_submit_button("Login")
+
+            if submit:
+                if verificar(credenciais, username, password):
+                    st.session_state[f"logged_in_{page}"] = True
+                    st.session_state[f"username_{page}"] = username
+                    st.success("Login bem-sucedido!")
+                    st.rerun()
+                else:
+                    st.error("Usuário ou senha inválidos")
+        return False
+    return True
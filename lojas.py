@@ -0,0 +1,137 @@
+# lojas.py
+# Várias lojas: cada loja tem a sua planilha nas pastas ./avarias e ./sistemageral.
+# As planilhas são descobertas pelo nome do arquivo, lidas em paralelo (um
+# processo por planilha que ainda não tem snapshot) e juntadas com a coluna LOJA.
+import glob
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import ingestao
+from esquema import otimizar_tipos
+
+PADRAO_AVARIAS = "SISTEMA DE GESTÃO DE AVARIAS*.xlsm"
+PADRAO_PREVENCAO = "SISTEMA GERAL PREVENÇÃO*.xlsm"
+PROCESSOS = int(os.environ.get("AVARIAS_LOJAS_PROCESSOS", os.cpu_count() or 1))
+# Nomes de arquivo que não são o nome da loja. Números fazem parte do nome
+# ("LOJA 1", "LOJA 2"); só a numeração de versão cadastrada aqui é descartada.
+APELIDOS_LOJAS = {"FRAGA MAIA3": "FRAGA MAIA"}
+
+log = logging.getLogger(__name__)
+# Conjuntos de arquivos da mesma loja já avisados no log
+_duplicadas_avisadas = set()
+
+
+# "SISTEMA GERAL PREVENÇÃO - FRAGA MAIA3 (1).xlsm" -> "FRAGA MAIA": o nome da loja
+# vem depois do último " - ", sem a cópia "(1)", e passa por APELIDOS_LOJAS
+def nome_loja(caminho):
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    nome = nome.rsplit(" - ", 1)[-1]
+    nome = re.sub(r"\s*\(\d+\)\s*$", "", nome).strip().upper()
+    return APELIDOS_LOJAS.get(nome, nome)
+
+
+# {loja: caminho} das planilhas do diretório. Arquivos de trava do Excel ("~$...")
+# são ignorados; se houver mais de um arquivo da mesma loja vale o mais recente,
+# com um aviso no log com os arquivos em conflito.
+def descobrir_lojas(diretorio, padrao):
+    por_loja = {}
+    for caminho in glob.glob(os.path.join(glob.escape(diretorio), padrao)):
+        if os.path.basename(caminho).startswith("~$") or not os.path.isfile(caminho):
+            continue
+        por_loja.setdefault(nome_loja(caminho), []).append(caminho)
+    encontradas = {}
+    for loja, caminhos in por_loja.items():
+        encontradas[loja] = max(caminhos, key=os.path.getmtime)
+        conflito = tuple(sorted(caminhos))
+        if len(caminhos) > 1 and conflito not in _duplicadas_avisadas:
+            _duplicadas_avisadas.add(conflito)
+            log.warning("lojas: %d planilhas para a loja %s (%s); usando a mais recente, %s",
+                        len(caminhos), loja, ", ".join(os.path.basename(c) for c in conflito),
+                        os.path.basename(encontradas[loja]))
+    return dict(sorted(encontradas.items()))
+
+
+def _pool(processos):
+    # spawn: o servidor do Streamlit tem threads, e fork com threads não é seguro
+    return ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn"))
+
+
+# Roda no processo filho: grava o snapshot e só devolve o frame se o snapshot não
+# pôde ser gravado (senão o pai o lê mapeado em memória, sem copiar pelo pipe)
+def _preparar_folha(caminho, nome_folha, ler_folha, versao):
+    df = ingestao.carregar_folha(caminho, nome_folha, ler_folha, versao)
+    if os.path.exists(ingestao.caminho_snapshot(caminho, nome_folha, versao)):
+        return None
+    return df
+
+
+def juntar_lojas(frames):
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat([df.assign(LOJA=loja) for loja, df in frames.items()], ignore_index=True)
+    df = otimizar_tipos(df)
+    df['LOJA'] = pd.Categorical(df['LOJA'].astype(object), categories=list(frames))
+    return df
+
+
+# Folha `nome_folha` de todas as lojas ({loja: caminho}) em um só frame com a
+# coluna LOJA. `ler_folha` precisa ser importável (ex.: limpeza.ler_folha_avarias)
+# porque roda nos processos filhos. `assinaturas` ({loja: assinatura}) escolhe a
+# versão de cada planilha, como em ingestao.carregar_folha.
+def carregar_lojas(caminhos, nome_folha, ler_folha, versao="1", processos=None, assinaturas=None):
+    assinaturas = assinaturas or {}
+    frames = {}
+    faltando = {}
+    for loja, caminho in caminhos.items():
+        df = None
+        if assinaturas.get(loja):
+            df = ingestao.ler_snapshot_existente(caminho, nome_folha, versao, assinaturas[loja])
+        if df is None:
+            df = ingestao.ler_snapshot_existente(caminho, nome_folha, versao)
+        if df is None:
+            faltando[loja] = caminho
+        else:
+            frames[loja] = df
+
+    processos = min(len(faltando), processos or PROCESSOS)
+    if processos > 1:
+        with _pool(processos) as pool:
+            futuros = {
+                loja: pool.submit(_preparar_folha, caminho, nome_folha, ler_folha, versao)
+                for loja, caminho in faltando.items()
+            }
+            for loja, futuro in futuros.items():
+                df = futuro.result()
+                frames[loja] = df if df is not None else ingestao.carregar_folha(
+                    faltando[loja], nome_folha, ler_folha, versao
+                )
+    else:
+        for loja, caminho in faltando.items():
+            frames[loja] = ingestao.carregar_folha(caminho, nome_folha, ler_folha, versao)
+    return juntar_lojas({loja: frames[loja] for loja in caminhos})
+
+
+# Gera em paralelo os snapshots que faltam nas planilhas de todas as lojas;
+# cada planilha é aberta uma só vez para todas as folhas. Devolve {loja: folhas geradas}.
+def aquecer_lojas(caminhos, nomes_folhas, ler_folha, versao="1", processos=None):
+    faltando = {
+        loja: caminho for loja, caminho in caminhos.items()
+        if any(not os.path.exists(ingestao.caminho_snapshot(caminho, n, versao)) for n in nomes_folhas)
+    }
+    processos = min(len(faltando), processos or PROCESSOS)
+    if processos <= 1:
+        return {
+            loja: ingestao.aquecer(caminho, nomes_folhas, ler_folha, versao)
+            for loja, caminho in faltando.items()
+        }
+    with _pool(processos) as pool:
+        futuros = {
+            loja: pool.submit(ingestao.aquecer, caminho, nomes_folhas, ler_folha, versao)
+            for loja, caminho in faltando.items()
+        }
+        return {loja: futuro.result() for loja, futuro in futuros.items()}
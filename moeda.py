@@ -0,0 +1,38 @@
+# moeda.py
+# Conversão vetorizada de valores monetários no formato brasileiro.
+import pandas as pd
+
+import instrumentacao
+
+
+# Converte uma coluna de valores como "R$ 1.234,56", "1234,56", "1234.56" ou
+# números já numéricos para float. Valores inválidos viram NaN.
+#
+# Regras (as mesmas do antigo processar_valor do dashboard):
+# - com vírgula: a vírgula é o separador decimal e os pontos são de milhar;
+# - sem vírgula: o último ponto é o decimal e os anteriores são de milhar.
+@instrumentacao.medir("limpeza_moeda")
+def converter_moeda(coluna):
+    coluna = pd.Series(coluna, copy=False)
+    if pd.api.types.is_numeric_dtype(coluna):
+        return coluna.astype("float64")
+
+    # Números e textos simples ("1234.56") já saem daqui; só o resto passa pelo texto
+    valores = pd.to_numeric(coluna, errors="coerce").astype("float64")
+    pendentes = valores.isna() & coluna.notna()
+    if not pendentes.any():
+        return valores
+
+    texto = (
+        coluna[pendentes].astype(str)
+        .str.replace("R$", "", regex=False)
+        .str.replace(r"\s+", "", regex=True)
+    )
+    tem_virgula = texto.str.contains(",", regex=False)
+    texto = texto.where(
+        ~tem_virgula,
+        texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
+    )
+    texto = texto.where(tem_virgula, texto.str.replace(r"\.(?=.*\.)", "", regex=True))
+    valores.loc[pendentes] = pd.to_numeric(texto, errors="coerce").astype("float64")
+    return valores
@@ -0,0 +1,92 @@
+# periodo.py
+# Recortes de período por busca binária. Os frames ficam ordenados por DATA
+# (datas vazias no fim) e cada período (mês, semana ISO ou intervalo livre, de
+# um ano) vira um par de posições achadas com searchsorted e um fatiamento.
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+TIPOS_PERIODO = ['Mês', 'Semana', 'Intervalo']
+
+
+def _ordenado(datas):
+    validas = int(datas.notna().sum())
+    return bool(datas.iloc[:validas].notna().all() and datas.iloc[:validas].is_monotonic_increasing)
+
+
+# Ordena por DATA uma vez (ao carregar); frames que já vêm ordenados do banco passam direto
+def ordenar_por_data(df):
+    if df.empty or _ordenado(df['DATA']):
+        return df
+    return df.sort_values('DATA', kind='stable', na_position='last', ignore_index=True)
+
+
+def limites_mes(ano, mes):
+    inicio = pd.Timestamp(ano, mes, 1)
+    return inicio, inicio + pd.offsets.MonthBegin(1)
+
+
+# Semana ISO (segunda a domingo); a semana 1 pode começar no ano anterior
+def limites_semana(ano, semana):
+    inicio = pd.Timestamp(date.fromisocalendar(ano, semana, 1))
+    return inicio, inicio + pd.Timedelta(days=7)
+
+
+# Intervalo com as duas pontas incluídas, como escolhido no calendário
+def limites_intervalo(inicio, fim):
+    inicio, fim = sorted([pd.Timestamp(inicio), pd.Timestamp(fim)])
+    return inicio.normalize(), fim.normalize() + pd.Timedelta(days=1)
+
+
+def limites_ano(ano):
+    return pd.Timestamp(ano, 1, 1), pd.Timestamp(ano + 1, 1, 1)
+
+
+# [início, fim) do período escolhido nos dashboards. `valor_periodo` é o número do
+# mês ('Mês'), o número da semana ISO ('Semana') ou o par de datas ('Intervalo').
+def limites_periodo(tipo_periodo, valor_periodo, ano):
+    if tipo_periodo == 'Mês':
+        return limites_mes(ano, valor_periodo)
+    if tipo_periodo == 'Semana':
+        return limites_semana(ano, valor_periodo)
+    if tipo_periodo == 'Intervalo':
+        return limites_intervalo(*valor_periodo)
+    return limites_ano(ano)
+
+
+# Semanas ISO do ano: 52 ou 53 (28/12 sempre cai na última)
+def semanas_do_ano(ano):
+    return list(range(1, date(ano, 12, 28).isocalendar()[1] + 1))
+
+
+def rotulo_semana(ano, semana):
+    inicio = date.fromisocalendar(ano, semana, 1)
+    return f"Semana {semana} ({inicio:%d/%m} a {inicio + timedelta(days=6):%d/%m})"
+
+
+# Posições [a, b) das linhas com início <= DATA < fim, por busca binária em DATA
+def posicoes(df, inicio, fim):
+    datas = df['DATA'].to_numpy()
+    limites = np.array([pd.Timestamp(inicio).to_datetime64(), pd.Timestamp(fim).to_datetime64()]).astype(datas.dtype)
+    a, b = np.searchsorted(datas, limites, side='left')
+    return int(a), int(b)
+
+
+# Linhas do frame ordenado (ordenar_por_data) com início <= DATA < fim
+def fatiar(df, inicio, fim):
+    a, b = posicoes(df, inicio, fim)
+    return df.iloc[a:b]
+
+
+# Anos com dados, do frame ordenado, sem varrer as linhas: salta de ano em ano
+def anos_com_dados(df):
+    anos = []
+    datas = df['DATA']
+    validas = int(datas.notna().sum())
+    posicao = 0
+    while posicao < validas:
+        ano = datas.iloc[posicao].year
+        anos.append(ano)
+        posicao = posicoes(df.iloc[:validas], *limites_ano(ano))[1]
+    return anos
@@ -0,0 +1,225 @@
+# previsao.py
+# Previsão semanal de VLR. TOT. CUSTO e QTD das avarias, por setor e por
+# produto, para as próximas semanas, com intervalo.
+#
+# Modelo (leve, igual para todas as séries): índice sazonal por mês do ano
+# estimado no total de cada setor (os produtos usam o do seu setor) e
+# suavização exponencial simples da série dessazonalizada, com o alfa de cada
+# série escolhido numa grade pelo menor erro um passo à frente. Todas as séries
+# e todos os alfas da grade andam juntos, semana a semana, numa matriz NumPy.
+#
+# Os parâmetros ajustados ficam guardados por recorte e só são recalculados
+# quando as semanas fechadas mudam (dados novos ou editados).
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cache import CacheLRU
+
+MEDIDAS = ['VLR. TOT. CUSTO', 'QTD']
+HORIZONTE = 8
+ALFAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5, 0.8])
+# Intervalo de previsão de 80% (normal)
+NIVEL = 0.8
+_Z = 1.2816
+# Semanas de histórico do setor para estimar a sazonalidade, e peso (em
+# semanas) que puxa o índice de meses com pouca história para 1
+MINIMO_SAZONAL = 52
+ENCOLHIMENTO = 8
+# Erros um passo à frente necessários para confiar no desvio estimado
+MINIMO_PASSOS = 4
+TODOS = "(setor inteiro)"
+COLUNAS = ['CATEGORIA', 'DESCRIÇÃO', 'MEDIDA', 'SEMANA', 'PREVISÃO', 'INFERIOR', 'SUPERIOR']
+
+_EPOCA = np.datetime64('1970-01-01', 'D')
+
+
+# Semanas começando na segunda-feira, numeradas a partir de 05/01/1970
+def _semana(dias):
+    return (dias + 3) // 7
+
+
+def inicio_semana(semanas):
+    return pd.to_datetime(_EPOCA + (np.asarray(semanas) * 7 - 3).astype('timedelta64[D]'))
+
+
+def _como_categoria(coluna):
+    return coluna if isinstance(coluna.dtype, pd.CategoricalDtype) else coluna.astype('category')
+
+
+# Matriz séries x semanas de cada medida, só com semanas fechadas: a semana do
+# último dia com dados fica de fora se ele não for domingo.
+# Devolve (nomes das séries, setor de cada série, primeira semana, {medida: matriz}).
+def matriz_semanal(cubo, medidas=MEDIDAS):
+    cubo = cubo[cubo['DATA'].notna()]
+    if cubo.empty:
+        return [], np.zeros(0, dtype=np.int64), 0, {m: np.zeros((0, 0)) for m in medidas}
+    categoria = _como_categoria(cubo['CATEGORIA'])
+    descricao = _como_categoria(cubo['DESCRIÇÃO'])
+    cat = categoria.cat.codes.to_numpy().astype(np.int64)
+    desc = descricao.cat.codes.to_numpy().astype(np.int64)
+    dias = (cubo['DATA'].to_numpy().astype('datetime64[D]') - _EPOCA).astype(np.int64)
+    semana = _semana(dias)
+    ultima = semana.max() if (dias.max() + 3) % 7 == 6 else semana.max() - 1
+    primeira = semana.min()
+    n_semanas = max(ultima - primeira + 1, 0)
+
+    # Código da série: cat * n + 0 para o setor inteiro, cat * n + desc + 1 para o produto
+    n = len(descricao.cat.categories) + 1
+    fechada = (semana <= ultima) & (cat >= 0)
+    produto = fechada & (desc >= 0)
+    serie = np.concatenate([cat[fechada] * n, cat[produto] * n + desc[produto] + 1])
+    coluna = np.concatenate([semana[fechada], semana[produto]]) - primeira
+    series, linha = np.unique(serie, return_inverse=True)
+
+    matrizes = {}
+    for medida in medidas:
+        valores = cubo[medida].fillna(0).to_numpy(dtype=float)
+        pesos = np.concatenate([valores[fechada], valores[produto]])
+        plano = np.bincount(linha * n_semanas + coluna, weights=pesos, minlength=len(series) * n_semanas)
+        matrizes[medida] = plano.reshape(len(series), n_semanas)
+
+    categorias = categoria.cat.categories.astype(str).tolist()
+    descricoes = descricao.cat.categories.astype(str).tolist()
+    nomes = [(categorias[s // n], TODOS if s % n == 0 else descricoes[s % n - 1]) for s in series]
+    return nomes, series // n, primeira, matrizes
+
+
+def _mes_das_semanas(primeira, quantidade):
+    return inicio_semana(np.arange(primeira, primeira + quantidade)).month.to_numpy() - 1
+
+
+# Índice sazonal (setores x 12) a partir das linhas de total dos setores
+def indices_sazonais(totais, meses):
+    indices = np.ones((len(totais), 12))
+    if totais.shape[1] < MINIMO_SAZONAL:
+        return indices
+    um_quente = np.eye(12)[meses]
+    contagem = um_quente.sum(axis=0)
+    media_mes = (totais @ um_quente) / np.maximum(contagem, 1)
+    media = totais.mean(axis=1, keepdims=True)
+    razao = np.divide(media_mes, media, out=np.ones_like(media_mes), where=media > 0)
+    indices = (contagem * razao + ENCOLHIMENTO) / (contagem + ENCOLHIMENTO)
+    indices = np.maximum(indices, 0.2)
+    return indices / indices.mean(axis=1, keepdims=True)
+
+
+# Suavização exponencial de todas as séries com todos os alfas da grade.
+# Cada série começa na sua primeira semana com lançamento.
+# Devolve, por série, (alfa, nível final, desvio do erro um passo à frente).
+def ajustar(y):
+    n_series, n_semanas = y.shape
+    if not n_series or not n_semanas:
+        vazio = np.zeros(n_series)
+        return vazio, vazio, vazio
+    lancou = y > 0
+    inicio = np.where(lancou.any(axis=1), lancou.argmax(axis=1), n_semanas)
+    alfas = ALFAS[:, None]
+    nivel = np.zeros((len(ALFAS), n_series))
+    erro2 = np.zeros((len(ALFAS), n_series))
+    for t in range(n_semanas):
+        valor = y[:, t]
+        nivel = np.where(inicio == t, valor, nivel)
+        ativo = inicio < t
+        erro = np.where(ativo, valor - nivel, 0.0)
+        erro2 += erro * erro
+        nivel = nivel + alfas * erro
+    passos = n_semanas - 1 - inicio
+    melhor = erro2.argmin(axis=0)
+    colunas = np.arange(n_series)
+    nivel = nivel[melhor, colunas]
+    desvio = np.sqrt(erro2[melhor, colunas] / np.maximum(passos, 1))
+    # Séries com poucas semanas: o erro observado não diz nada, o intervalo fica do tamanho do nível
+    desvio = np.where(passos < MINIMO_PASSOS, np.maximum(desvio, nivel), desvio)
+    return ALFAS[melhor], nivel, desvio
+
+
+# Impressão das semanas fechadas: se não mudou, os parâmetros continuam valendo
+def _impressao(dados):
+    nomes, _, primeira, matrizes = dados
+    return hash((tuple(nomes), int(primeira)) + tuple(m.tobytes() for m in matrizes.values()))
+
+
+class Modelo:
+    def __init__(self, dados):
+        self.nomes, setor, self.primeira, matrizes = dados
+        self.impressao = _impressao(dados)
+        n_semanas = next(iter(matrizes.values())).shape[1]
+        self.ultima = self.primeira + n_semanas - 1
+        meses = _mes_das_semanas(self.primeira, n_semanas)
+        # Linhas de total de cada setor (DESCRIÇÃO = TODOS)
+        totais = np.array([i for i, (_, d) in enumerate(self.nomes) if d == TODOS], dtype=np.int64)
+        posicao_setor = np.searchsorted(setor[totais], setor)
+
+        self.matrizes = matrizes
+        self.parametros = {}
+        for medida, y in matrizes.items():
+            indices = indices_sazonais(y[totais], meses)[posicao_setor]
+            alfa, nivel, desvio = ajustar(y / indices[:, meses])
+            self.parametros[medida] = {'indices': indices, 'alfa': alfa, 'nivel': nivel, 'desvio': desvio}
+
+    # Previsões das próximas `horizonte` semanas de todas as séries, em formato longo
+    def prever(self, horizonte=HORIZONTE):
+        if not self.nomes:
+            return pd.DataFrame(columns=COLUNAS)
+        semanas = np.arange(self.ultima + 1, self.ultima + 1 + horizonte)
+        meses = _mes_das_semanas(semanas[0], horizonte)
+        h = np.arange(1, horizonte + 1)
+        partes = []
+        for medida, p in self.parametros.items():
+            sazonal = p['indices'][:, meses]
+            previsto = p['nivel'][:, None] * sazonal
+            # Variância do erro da suavização simples h passos à frente: s^2 (1 + (h-1) alfa^2)
+            margem = _Z * p['desvio'][:, None] * np.sqrt(1 + (h - 1) * p['alfa'][:, None] ** 2) * sazonal
+            partes.append(pd.DataFrame({
+                'SÉRIE': np.repeat(np.arange(len(self.nomes)), horizonte),
+                'MEDIDA': medida,
+                'SEMANA': np.tile(semanas, len(self.nomes)),
+                'PREVISÃO': previsto.ravel(),
+                'INFERIOR': np.maximum(previsto - margem, 0).ravel(),
+                'SUPERIOR': (previsto + margem).ravel(),
+            }))
+        previsao = pd.concat(partes, ignore_index=True)
+        nomes = pd.DataFrame(self.nomes, columns=['CATEGORIA', 'DESCRIÇÃO'])
+        previsao = previsao.join(nomes, on='SÉRIE')
+        previsao['SEMANA'] = inicio_semana(previsao['SEMANA'].to_numpy())
+        return previsao[COLUNAS]
+
+    # Histórico semanal dos totais dos setores, no mesmo formato da previsão
+    def historico(self):
+        totais = [i for i, (_, d) in enumerate(self.nomes) if d == TODOS]
+        if not totais:
+            return pd.DataFrame(columns=['CATEGORIA', 'MEDIDA', 'SEMANA', 'VALOR'])
+        semanas = inicio_semana(np.arange(self.primeira, self.ultima + 1))
+        partes = [
+            pd.DataFrame({
+                'CATEGORIA': self.nomes[i][0], 'MEDIDA': medida, 'SEMANA': semanas, 'VALOR': y[i],
+            })
+            for medida, y in self.matrizes.items() for i in totais
+        ]
+        return pd.concat(partes, ignore_index=True)
+
+
+# Modelos por recorte (setores, lojas), mantidos entre reruns e sessões
+_modelos = CacheLRU(max_itens=16)
+_lock = threading.Lock()
+
+
+# Modelo ajustado do recorte. Com a mesma `versao` devolve o guardado; com
+# versão nova só reajusta se as semanas fechadas mudaram.
+def modelo(chave, cubo, versao=None):
+    guardado = _modelos.obter(chave)
+    if guardado is not None and versao is not None and guardado[0] == versao:
+        return guardado[1]
+    with _lock:
+        guardado = _modelos.obter(chave)
+        if guardado is not None and versao is not None and guardado[0] == versao:
+            return guardado[1]
+        dados = matriz_semanal(cubo)
+        if guardado is not None and guardado[1].impressao == _impressao(dados):
+            ajustado = guardado[1]
+        else:
+            ajustado = Modelo(dados)
+        _modelos.guardar(chave, (versao, ajustado))
+    return ajustado
@@ -0,0 +1,197 @@
+# relatorio_pdf.py
+# Relatórios em PDF com vários gráficos e tabelas.
+# Os gráficos são convertidos em PNG em paralelo por um pool de processos que
+# mantém o kaleido aberto entre relatórios; as imagens ficam só em memória.
+import atexit
+import io
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+import pandas as pd
+from fpdf import FPDF
+
+LARGURA_PX, ALTURA_PX, ESCALA = 1000, 600, 2
+PROCESSOS = int(os.environ.get("AVARIAS_PDF_PROCESSOS", min(4, os.cpu_count() or 1)))
+
+# A4 paisagem, em mm
+LARGURA_PAGINA, ALTURA_PAGINA, MARGEM = 297, 210, 10
+ALTURA_LINHA = 6
+# Linhas usadas para estimar a largura das colunas das tabelas
+AMOSTRA_LARGURA = 200
+
+_pool = None
+_lock_pool = threading.Lock()
+
+
+# Roda em cada processo do pool: deixa o servidor do kaleido (Chrome) aberto
+# para que cada gráfico não pague a inicialização
+def _iniciar_trabalhador():
+    try:
+        import kaleido
+        kaleido.start_sync_server(silence_warnings=True)
+    except Exception:
+        # kaleido antigo ou sem servidor persistente: cada imagem abre o seu
+        pass
+
+
+def _renderizar(fig_json, largura, altura, escala):
+    import plotly.io as pio
+    return pio.to_image(pio.from_json(fig_json), format="png", width=largura, height=altura, scale=escala)
+
+
+def _obter_pool():
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            # spawn: o servidor do Streamlit tem threads, e fork com threads não é seguro
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESSOS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_iniciar_trabalhador,
+            )
+        return _pool
+
+
+def encerrar_pool():
+    global _pool
+    with _lock_pool:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+atexit.register(encerrar_pool)
+
+
+# Converte as figuras em PNG em paralelo. Devolve {nome: bytes}; figuras None
+# são ignoradas. Se o pool falhar, converte no próprio processo.
+def renderizar_figuras(figs, largura=LARGURA_PX, altura=ALTURA_PX, escala=ESCALA):
+    pendentes = {nome: fig.to_json() for nome, fig in figs.items() if fig is not None}
+    if not pendentes:
+        return {}
+    if PROCESSOS <= 1 or len(pendentes) == 1:
+        return {nome: _renderizar(js, largura, altura, escala) for nome, js in pendentes.items()}
+    try:
+        pool = _obter_pool()
+        futuros = {nome: pool.submit(_renderizar, js, largura, altura, escala) for nome, js in pendentes.items()}
+        return {nome: futuro.result() for nome, futuro in futuros.items()}
+    except BrokenProcessPool:
+        encerrar_pool()
+        return {nome: _renderizar(js, largura, altura, escala) for nome, js in pendentes.items()}
+
+
+# Largura x altura do PNG lidas do cabeçalho IHDR, sem decodificar a imagem
+def tamanho_png(png):
+    return struct.unpack(">II", png[16:24])
+
+
+# As fontes padrão do PDF só têm latin-1; o resto (ex.: emojis) vira "?"
+def _texto(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return ""
+    if isinstance(valor, pd.Timestamp):
+        return f"{valor:%d/%m/%Y}"
+    return str(valor).encode("latin-1", "replace").decode("latin-1")
+
+
+class RelatorioPDF(FPDF):
+    def __init__(self, titulo):
+        super().__init__(orientation="L", unit="mm", format="A4")
+        self.titulo = _texto(titulo)
+        self.set_auto_page_break(auto=True, margin=MARGEM)
+        self.set_margins(MARGEM, MARGEM)
+
+    def footer(self):
+        self.set_y(-8)
+        self.set_font("Helvetica", "I", 8)
+        self.cell(0, 5, f"{self.titulo} - página {self.page_no()}", align="C")
+
+    def secao(self, titulo):
+        self.set_font("Helvetica", "B", 13)
+        self.cell(0, 8, _texto(titulo), new_x="LMARGIN", new_y="NEXT")
+
+    def imagem(self, titulo, png):
+        self.add_page()
+        self.secao(titulo)
+        largura_px, altura_px = tamanho_png(png)
+        disponivel_l = LARGURA_PAGINA - 2 * MARGEM
+        disponivel_a = ALTURA_PAGINA - self.get_y() - MARGEM - 5
+        proporcao = min(disponivel_l / largura_px, disponivel_a / altura_px)
+        self.image(io.BytesIO(png), x=MARGEM, w=largura_px * proporcao, h=altura_px * proporcao)
+
+    def _cabecalho_tabela(self, colunas, larguras):
+        self.set_font("Helvetica", "B", 8)
+        self.set_fill_color(230, 230, 230)
+        for coluna, largura in zip(colunas, larguras):
+            self.cell(largura, ALTURA_LINHA, _texto(coluna), border=1, fill=True)
+        self.ln(ALTURA_LINHA)
+        self.set_font("Helvetica", "", 8)
+
+    def _larguras(self, df):
+        self.set_font("Helvetica", "", 8)
+        amostra = df.head(AMOSTRA_LARGURA)
+        larguras = []
+        for coluna in df.columns:
+            maior = max([self.get_string_width(_texto(coluna))] +
+                        [self.get_string_width(_texto(v)) for v in amostra[coluna]])
+            larguras.append(maior + 3)
+        disponivel = LARGURA_PAGINA - 2 * MARGEM
+        total = sum(larguras)
+        return [l * disponivel / total for l in larguras] if total > disponivel else larguras
+
+    # As linhas são escritas à medida que são lidas do frame, página a página,
+    # repetindo o cabeçalho; o frame não é convertido em texto de uma vez
+    def tabela(self, titulo, df):
+        self.add_page()
+        self.secao(titulo)
+        if df.empty:
+            self.set_font("Helvetica", "I", 9)
+            self.cell(0, ALTURA_LINHA, "Sem dados para o período.")
+            return
+        colunas = [str(c) for c in df.columns]
+        larguras = self._larguras(df)
+        limite = ALTURA_PAGINA - MARGEM - ALTURA_LINHA
+        self._cabecalho_tabela(colunas, larguras)
+        for linha in df.itertuples(index=False, name=None):
+            if self.get_y() + ALTURA_LINHA > limite:
+                self.add_page()
+                self._cabecalho_tabela(colunas, larguras)
+            for valor, largura in zip(linha, larguras):
+                self.cell(largura, ALTURA_LINHA, _texto(valor), border=1)
+            self.ln(ALTURA_LINHA)
+
+
+# Gera o PDF completo: capa, um gráfico por página e as tabelas paginadas.
+# `imagens` permite passar PNGs já renderizados (ex.: pelo gerador em lote).
+def gerar_relatorio(figs_dict, tabelas_dict, titulo="Relatório de Avarias", imagens=None):
+    if imagens is None:
+        imagens = renderizar_figuras(figs_dict)
+    pdf = RelatorioPDF(titulo)
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 20)
+    pdf.cell(0, 20, pdf.titulo, new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", "", 11)
+    pdf.cell(0, 8, f"Gerado em {pd.Timestamp.now():%d/%m/%Y %H:%M}", new_x="LMARGIN", new_y="NEXT")
+    for nome in figs_dict:
+        if nome in imagens:
+            pdf.imagem(nome, imagens[nome])
+    for nome, df in tabelas_dict.items():
+        if df is not None:
+            pdf.tabela(nome, df)
+    return bytes(pdf.output())
+
+
+# Um único gráfico em uma página A4 paisagem
+def figura_para_pdf(fig, titulo=""):
+    png = renderizar_figuras({titulo: fig})[titulo]
+    pdf = RelatorioPDF(titulo)
+    pdf.set_auto_page_break(auto=False)
+    pdf.add_page()
+    largura_px, altura_px = tamanho_png(png)
+    proporcao = min((LARGURA_PAGINA - 2 * MARGEM) / largura_px, (ALTURA_PAGINA - 2 * MARGEM) / altura_px)
+    pdf.image(io.BytesIO(png), x=MARGEM, y=MARGEM, w=largura_px * proporcao, h=altura_px * proporcao)
+    return bytes(pdf.output())
@@ -0,0 +1,183 @@
+# relatorios_lote.py
+# Geração em lote, sem interface, dos relatórios mensais de avarias: um PDF e
+# um XLSX por loja, setor e mês. Cada planilha é lida uma vez (snapshots do
+# ingestao), os pares loja/setor são processados em paralelo e meses cujos
+# dados não mudaram desde a última execução são pulados.
+#
+# Uso:
+#     python relatorios_lote.py --saida ./relatorios
+#     python relatorios_lote.py --setores "Avarias Padaria" --formatos pdf --forcar
+#     python relatorios_lote.py --lojas "FRAGA MAIA"
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import avarias
+import ingestao
+import lojas
+import periodo
+import relatorio_pdf
+from cubo import montar_cubo, por_produto
+
+# Aumentar quando o conteúdo dos relatórios mudar, para regenerar tudo
+VERSAO_RELATORIO = "1"
+FORMATOS = ("pdf", "xlsx")
+MESES = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+         'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
+
+
+def _carregar(caminho, nome_folha):
+    return ingestao.carregar_folha(caminho, nome_folha, avarias.ler_folha, avarias.VERSAO_LIMPEZA)
+
+
+# Impressão do conteúdo de um mês: muda se qualquer linha do mês mudar
+def _chave_mes(df_mes):
+    soma = int(pd.util.hash_pandas_object(df_mes, index=False).sum())
+    return f"{VERSAO_RELATORIO}-{len(df_mes)}-{soma:x}"
+
+
+def _figuras(produtos):
+    return {
+        titulo: avarias.figura_top_10(top, coluna, titulo)
+        for titulo, top, coluna in [
+            ("Top 10 Produtos por Quantidade Perdida", avarias.top_10_por_qtd(produtos), 'QTD'),
+            ("Top 10 Produtos por Valor Total de Venda Perdido", avarias.top_10_por_valor_venda(produtos), 'VLR. TOT. VENDA'),
+            ("Top 10 Produtos por Valor Total de Custo Perdido", avarias.top_10_por_valor_custo(produtos), 'VLR. TOT. CUSTO'),
+        ]
+    }
+
+
+def _tabelas(df_mes, produtos):
+    detalhe = df_mes[['DATA', 'DESCRIÇÃO', 'QTD', 'VLR. UNIT. VENDA', 'VLR. UNIT. CUSTO',
+                      'VLR. TOT. VENDA', 'VLR. TOT. CUSTO']]
+    resumo = avarias.resumo_avarias(produtos)
+    return {"Tabela de Avarias Detalhada": detalhe, "Tabela de Avarias - Resumo": resumo}
+
+
+def _gravar_xlsx(caminho, tabelas, produtos):
+    raiz, extensao = os.path.splitext(caminho)
+    temporario = f"{raiz}.tmp{extensao}"
+    with pd.ExcelWriter(temporario, engine="openpyxl") as writer:
+        tabelas["Tabela de Avarias - Resumo"].to_excel(writer, sheet_name="Resumo", index=False)
+        tabelas["Tabela de Avarias Detalhada"].to_excel(writer, sheet_name="Detalhe", index=False)
+        avarias.top_10_por_qtd(produtos).to_excel(writer, sheet_name="Top 10 Quantidade")
+        avarias.top_10_por_valor_custo(produtos).to_excel(writer, sheet_name="Top 10 Custo")
+    os.replace(temporario, caminho)
+
+
+def _gravar_pdf(caminho, titulo, figs, tabelas):
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(relatorio_pdf.gerar_relatorio(figs, tabelas, titulo=titulo))
+    os.replace(temporario, caminho)
+
+
+def _iniciar_trabalhador(com_pdf):
+    # Cada processo do lote converte seus gráficos sozinho, sem abrir outro pool
+    relatorio_pdf.PROCESSOS = 1
+    if com_pdf:
+        relatorio_pdf._iniciar_trabalhador()
+
+
+# Gera os relatórios de um setor de uma loja. `manifesto` traz as chaves da última
+# execução ({arquivo: chave}); devolve as chaves atualizadas e quantos foram gerados/pulados.
+def gerar_setor(loja, caminho, nome_folha, saida, formatos, manifesto, forcar=False):
+    df = avarias.processar_datas(_carregar(caminho, nome_folha))
+    df = periodo.ordenar_por_data(df.dropna(subset=['DATA']))
+    diretorio = os.path.join(saida, ingestao.slug(loja), ingestao.slug(nome_folha))
+    os.makedirs(diretorio, exist_ok=True)
+
+    chaves, gerados, pulados = {}, 0, 0
+    for (ano, mes), _ in df.groupby(['ano', 'mês'], observed=True):
+        ano, mes = int(ano), int(mes)
+        df_mes = avarias.filtrar_por_periodo(df, *periodo.limites_mes(ano, mes))
+        chave = _chave_mes(df_mes)
+        base = os.path.join(diretorio, f"{ano}-{mes:02d}")
+        arquivos = {formato: f"{base}.{formato}" for formato in formatos}
+        pendentes = [
+            formato for formato, arquivo in arquivos.items()
+            if forcar or manifesto.get(arquivo) != chave or not os.path.exists(arquivo)
+        ]
+        for arquivo in arquivos.values():
+            chaves[arquivo] = chave
+        if not pendentes:
+            pulados += 1
+            continue
+
+        produtos = por_produto(montar_cubo(df_mes, nome_folha))
+        tabelas = _tabelas(df_mes, produtos)
+        if "xlsx" in pendentes:
+            _gravar_xlsx(arquivos["xlsx"], tabelas, produtos)
+        if "pdf" in pendentes:
+            titulo = f"Relatório de Avarias - {loja} - {nome_folha} - {MESES[mes - 1]}/{ano}"
+            _gravar_pdf(arquivos["pdf"], titulo, _figuras(produtos), tabelas)
+        gerados += 1
+    return f"{loja} / {nome_folha}", chaves, gerados, pulados
+
+
+def _ler_manifesto(caminho):
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv=None):
+    todas_lojas = avarias.lojas_disponiveis()
+    parser = argparse.ArgumentParser(description="Gera os relatórios mensais de avarias de todas as lojas e setores.")
+    parser.add_argument("--saida", default="./relatorios", help="diretório dos relatórios")
+    parser.add_argument("--lojas", nargs="+", default=list(todas_lojas), choices=list(todas_lojas))
+    parser.add_argument("--setores", nargs="+", default=avarias.folhas, choices=avarias.folhas)
+    parser.add_argument("--formatos", nargs="+", default=list(FORMATOS), choices=FORMATOS)
+    parser.add_argument("--processos", type=int, help="padrão: um por loja/setor, até o número de CPUs")
+    parser.add_argument("--forcar", action="store_true", help="regera mesmo o que não mudou")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    # Uma leitura de cada planilha (em paralelo) para todas as folhas; os processos
+    # do lote só abrem os snapshots
+    caminhos = {loja: todas_lojas[loja] for loja in args.lojas}
+    processos = args.processos or min(len(caminhos) * len(args.setores), os.cpu_count() or 1)
+    lojas.aquecer_lojas(caminhos, args.setores, avarias.ler_folha, avarias.VERSAO_LIMPEZA, processos)
+
+    os.makedirs(args.saida, exist_ok=True)
+    caminho_manifesto = os.path.join(args.saida, "manifesto.json")
+    manifesto = _ler_manifesto(caminho_manifesto)
+    novo_manifesto = dict(manifesto)
+    falhas = 0
+
+    with ProcessPoolExecutor(
+        max_workers=max(1, processos),
+        initializer=_iniciar_trabalhador,
+        initargs=("pdf" in args.formatos,),
+    ) as pool:
+        futuros = {
+            pool.submit(gerar_setor, loja, caminho, setor, args.saida, args.formatos, manifesto, args.forcar):
+                f"{loja} / {setor}"
+            for loja, caminho in caminhos.items()
+            for setor in args.setores
+        }
+        for futuro in as_completed(futuros):
+            try:
+                setor, chaves, gerados, pulados = futuro.result()
+            except Exception as e:
+                falhas += 1
+                print(f"{futuros[futuro]}: erro: {e}", file=sys.stderr)
+                continue
+            novo_manifesto.update(chaves)
+            print(f"{setor}: {gerados} meses gerados, {pulados} sem mudanças")
+
+    with open(caminho_manifesto, "w", encoding="utf-8") as f:
+        json.dump(novo_manifesto, f, indent=1, ensure_ascii=False, sort_keys=True)
+    print(f"concluído em {time.perf_counter() - inicio:.1f}s")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# tabela.py
+# Tabelas detalhadas paginadas no servidor: busca e ordenação rodam sobre o frame
+# em cache e só a página visível é formatada (R$ vetorizado) e enviada ao navegador.
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import exportacao
+
+TAMANHOS_PAGINA = [25, 50, 100, 250]
+
+# Separadores do R$: o dashboard de prevenção usa o formato brasileiro; o de
+# avarias sempre mostrou "R$ 1,234.56"
+FORMATO_BR = {"milhar": ".", "decimal": ","}
+FORMATO_AVARIAS = {"milhar": ",", "decimal": "."}
+
+
+# "R$ 1.234,56" para uma coluna inteira de uma vez, sem laço por linha.
+# Vazios viram "R$ 0,00", como no formatar_moeda original.
+def formatar_moeda(valores, milhar=".", decimal=","):
+    valores = pd.Series(valores)
+    numeros = pd.to_numeric(valores, errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    centavos = np.rint(np.abs(numeros) * 100).astype(np.int64)
+    inteiros, resto = np.divmod(centavos, 100)
+
+    texto = pd.Series("", index=valores.index, dtype=str)
+    grupos = max(1, len(str(int(inteiros.max())))) if len(inteiros) else 1
+    for i in range((grupos - 1) // 3, -1, -1):
+        grupo = pd.Series((inteiros // 1000 ** i) % 1000, index=valores.index).astype(str)
+        # Só o grupo mais alto fica sem zeros à esquerda
+        grupo = grupo.where(inteiros < 1000 ** (i + 1), grupo.str.zfill(3))
+        separador = milhar if i else ""
+        texto = texto.where(~((inteiros >= 1000 ** i) | (i == 0)), texto + grupo + separador)
+
+    sinal = pd.Series(np.where(numeros < 0, "-", ""), index=valores.index)
+    centavos_texto = pd.Series(resto, index=valores.index).astype(str).str.zfill(2)
+    return "R$ " + sinal + texto + decimal + centavos_texto
+
+
+# Troca cada coluna de valor por "<coluna> (R$)" formatada, na mesma posição
+def formatar_colunas(df, colunas, formato=FORMATO_BR):
+    saida = df.copy(deep=False)
+    for col in colunas:
+        if col in saida.columns:
+            saida[col] = formatar_moeda(saida[col], **formato)
+    return saida.rename(columns={col: f"{col} (R$)" for col in colunas})
+
+
+# Linhas cujo texto em alguma coluna de texto contém `busca` (sem diferenciar maiúsculas)
+def buscar(df, busca):
+    busca = busca.strip()
+    if not busca:
+        return df
+    mascara = np.zeros(len(df), dtype=bool)
+    for col in df.columns:
+        coluna = df[col]
+        if isinstance(coluna.dtype, pd.CategoricalDtype):
+            # Testa cada categoria uma vez e marca as linhas pelos códigos
+            achou = coluna.cat.categories.astype(str).str.contains(busca, case=False, regex=False)
+            codigos = coluna.cat.codes.to_numpy()
+            mascara |= (codigos >= 0) & np.append(np.asarray(achou), False)[codigos]
+        elif pd.api.types.is_object_dtype(coluna) or pd.api.types.is_string_dtype(coluna):
+            mascara |= coluna.astype(str).str.contains(busca, case=False, regex=False).fillna(False).to_numpy()
+    return df[mascara]
+
+
+# Posições das linhas da página, na ordem pedida. A ordenação completa só é feita
+# quando se ordena por uma coluna; sem ordenação a página é um fatiamento.
+def _posicoes_pagina(df, coluna, decrescente, inicio, fim):
+    if not coluna:
+        return np.arange(inicio, min(fim, len(df)))
+    ordem = df[coluna].argsort(kind='stable').to_numpy()
+    if decrescente:
+        # argsort deixa vazios no fim; na ordem decrescente também ficam no fim
+        validos = int(df[coluna].notna().sum())
+        ordem = np.concatenate([ordem[:validos][::-1], ordem[validos:]])
+    return ordem[inicio:fim]
+
+
+# Tabela paginada. `chave` separa o estado de tabelas diferentes; `colunas_moeda`
+# são formatadas só na página exibida.
+def tabela_paginada(df, chave, colunas_moeda=(), formato=FORMATO_BR):
+    c1, c2, c3 = st.columns([3, 2, 1])
+    busca = c1.text_input("Buscar", key=f"{chave}_busca", placeholder="Produto, código, responsável...")
+    coluna = c2.selectbox("Ordenar por", [None] + list(df.columns), key=f"{chave}_ordem",
+                          format_func=lambda c: "Ordem original" if c is None else c)
+    decrescente = c3.toggle("Decrescente", key=f"{chave}_desc", value=True)
+
+    resultado = buscar(df, busca)
+    total = len(resultado)
+    tamanho = st.session_state.get(f"{chave}_tamanho", TAMANHOS_PAGINA[1])
+    paginas = max(1, math.ceil(total / tamanho))
+    # A busca ou o tamanho da página podem ter reduzido o número de páginas
+    if st.session_state.get(f"{chave}_pagina", 1) > paginas:
+        st.session_state[f"{chave}_pagina"] = paginas
+    pagina_atual = st.session_state.get(f"{chave}_pagina", 1)
+    inicio = (pagina_atual - 1) * tamanho
+
+    posicoes = _posicoes_pagina(resultado, coluna, decrescente, inicio, inicio + tamanho)
+    pagina = formatar_colunas(resultado.iloc[posicoes], colunas_moeda, formato)
+    st.dataframe(pagina, hide_index=True, width="stretch")
+
+    c1, c2, c3 = st.columns([2, 2, 3])
+    c1.number_input("Página", min_value=1, max_value=paginas, step=1, key=f"{chave}_pagina")
+    c2.selectbox("Linhas por página", TAMANHOS_PAGINA, index=1, key=f"{chave}_tamanho")
+    if len(posicoes):
+        c3.caption(f"Linhas {inicio + 1}–{inicio + len(posicoes)} de {total} · {paginas} página(s)")
+    else:
+        c3.caption("Nenhuma linha encontrada")
+    return resultado
+
+
+# Botões de XLSX e CSV com os valores numéricos da tabela inteira. Os arquivos só
+# são gerados quando o botão é clicado (data como função), não a cada rerun.
+def botoes_download(df, chave, arquivo, colunas_moeda=(), folha="Dados"):
+    c1, c2, _ = st.columns([1, 1, 4])
+    c1.download_button("Baixar XLSX", data=lambda: exportacao.xlsx({folha: df}, colunas_moeda),
+                       file_name=f"{arquivo}.xlsx", mime=exportacao.MIME_XLSX, key=f"{chave}_xlsx")
+    c2.download_button("Baixar CSV", data=lambda: exportacao.csv(df),
+                       file_name=f"{arquivo}.csv", mime=exportacao.MIME_CSV, key=f"{chave}_csv")
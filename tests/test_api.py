@@ -0,0 +1,122 @@
+# tests/test_api.py
+# API HTTP (api.py) servida de verdade numa porta livre, com um cliente HTTP
+# local. Só a camada de dados é trocada: um cubo sintético no lugar das
+# planilhas e versões fixas no lugar das assinaturas, para o teste não depender
+# das planilhas nem do dashboard.db.
+# Uso, a partir da raiz do repositório:
+#     python -m pytest tests
+#     python -m unittest discover tests
+import csv
+import io
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+import pandas as pd
+
+import api
+import avarias
+import dashboard
+from cubo import montar_cubo
+
+SETOR = "Avarias Padaria"
+
+
+def cubo_sintetico():
+    df = pd.DataFrame({
+        'DATA': pd.to_datetime(['2024-01-03', '2024-01-10', '2024-01-10', '2024-02-05']),
+        'DESCRIÇÃO': ['PÃO FRANCÊS', 'BOLO', 'PÃO FRANCÊS', 'BOLO'],
+        'CÓD. INT.': ['1', '2', '1', '2'],
+        'QTD': [10.0, 2.0, 5.0, 1.0],
+        'VLR. UNIT. VENDA': [1.0, 30.0, 1.0, 30.0],
+        'VLR. UNIT. CUSTO': [0.5, 18.0, 0.5, 18.0],
+        'VLR. TOT. VENDA': [10.0, 60.0, 5.0, 30.0],
+        'VLR. TOT. CUSTO': [5.0, 36.0, 2.5, 18.0],
+        'LOJA': 'FRAGA MAIA',
+        'RESPONSÁVEL': 'ANA',
+    })
+    return montar_cubo(df, SETOR)
+
+
+class TestApi(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cubo = cubo_sintetico()
+        versao = (("FRAGA MAIA", "avarias.xlsm", "assinatura"),)
+        cls.trocas = [
+            mock.patch.object(api, "dados", lambda painel, setor: cubo),
+            mock.patch.object(avarias, "versao_lojas", lambda lojas_filter=None: versao),
+            mock.patch.object(dashboard, "versao_lojas", lambda lojas_filter=None: versao),
+            mock.patch.object(api.lancamentos, "versao", lambda tabela, folha=None, caminho=None: 0),
+            mock.patch.object(api.catalogo, "versao", lambda caminho=None: "catalogo"),
+        ]
+        for troca in cls.trocas:
+            troca.start()
+        api._respostas.invalidar()
+        cls.servidor = api.criar_servidor(porta=0)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.servidor.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        for troca in cls.trocas:
+            troca.stop()
+
+    def get(self, caminho, **cabecalhos):
+        requisicao = urllib.request.Request(self.base + caminho, headers=cabecalhos)
+        try:
+            with urllib.request.urlopen(requisicao, timeout=30) as resposta:
+                return resposta.status, resposta.headers, resposta.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    def test_top_em_json(self):
+        status, cabecalhos, corpo = self.get("/api/avarias/top?setor=Avarias%20Padaria&metrica=venda&ano=2024&mes=1")
+        self.assertEqual(status, 200)
+        self.assertTrue(cabecalhos["Content-Type"].startswith("application/json"))
+        self.assertTrue(cabecalhos["ETag"])
+        resposta = json.loads(corpo)
+        self.assertEqual(resposta["linhas"], 2)
+        # Só janeiro: BOLO 60, PÃO FRANCÊS 10 + 5
+        self.assertEqual([(d["DESCRIÇÃO"], d["VLR. TOT. VENDA"]) for d in resposta["dados"]],
+                         [("BOLO", 60.0), ("PÃO FRANCÊS", 15.0)])
+
+    def test_resumo_em_csv(self):
+        status, cabecalhos, corpo = self.get("/api/avarias/resumo?setor=Avarias%20Padaria&formato=csv")
+        self.assertEqual(status, 200)
+        self.assertTrue(cabecalhos["Content-Type"].startswith("text/csv"))
+        linhas = list(csv.DictReader(io.StringIO(corpo.decode("utf-8"))))
+        self.assertEqual({linha["DESCRIÇÃO"]: float(linha["QTD"]) for linha in linhas},
+                         {"PÃO FRANCÊS": 15.0, "BOLO": 3.0})
+
+    def test_if_none_match_devolve_304(self):
+        caminho = "/api/avarias/top?setor=Avarias%20Padaria&metrica=qtd"
+        status, cabecalhos, _ = self.get(caminho)
+        self.assertEqual(status, 200)
+        etag = cabecalhos["ETag"]
+        status, cabecalhos, corpo = self.get(caminho, **{"If-None-Match": etag})
+        self.assertEqual((status, cabecalhos["ETag"], corpo), (304, etag, b""))
+        # Comparação fraca e outro filtro
+        self.assertEqual(self.get(caminho, **{"If-None-Match": "W/" + etag})[0], 304)
+        self.assertEqual(self.get(caminho + "&ano=2024", **{"If-None-Match": etag})[0], 200)
+
+    def test_periodo_invalido_devolve_400(self):
+        for filtro in ["ano=2024&mes=13", "ano=2024&semana=60", "inicio=2024-02-30",
+                       "inicio=31/01/2024", "mes=1", "ano=dois-mil"]:
+            with self.subTest(filtro=filtro):
+                status, cabecalhos, corpo = self.get(f"/api/avarias/top?setor=Avarias%20Padaria&{filtro}")
+                self.assertEqual(status, 400)
+                self.assertTrue(cabecalhos["Content-Type"].startswith("application/json"))
+                self.assertIn("erro", json.loads(corpo))
+
+    def test_setor_desconhecido_devolve_400(self):
+        self.assertEqual(self.get("/api/avarias/top?setor=Nada")[0], 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+# vigia.py
+# Vigia em segundo plano das pastas das planilhas (./avarias e ./sistemageral).
+# Quando uma planilha muda, espera o Excel terminar de gravar, confere que o
+# arquivo está íntegro, gera os snapshots e o espelho no banco fora das
+# requisições e só então publica a nova assinatura. Os dashboards usam a
+# assinatura publicada, então nunca leem um arquivo gravado pela metade e, na
+# troca de versão, já encontram os dados prontos. Sem versão publicada (vigia
+# desligado ou antes da primeira varredura), assinatura() faz a mesma conferência
+# na hora, e a leitura que pega a planilha mudando é recusada (ingestao).
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+
+import banco
+import ingestao
+import lojas
+
+ATIVO = os.environ.get("AVARIAS_VIGIA", "1") != "0"
+# Segundos entre varreduras e tempo que o arquivo precisa ficar parado
+INTERVALO = float(os.environ.get("AVARIAS_VIGIA_INTERVALO", "5"))
+ESPERA_ESTAVEL = float(os.environ.get("AVARIAS_VIGIA_ESPERA", "3"))
+# Temporários do Excel mais velhos que isso são restos de gravações interrompidas
+TRAVA_ABANDONADA = 10 * 60
+
+# Ao salvar, o Excel grava num temporário de 8 dígitos hexadecimais sem extensão
+# (ex.: "075CAB00") e depois o renomeia para o nome da planilha
+_TEMPORARIO_EXCEL = re.compile(r"^[0-9A-F]{8}(\.tmp)?$", re.IGNORECASE)
+
+log = logging.getLogger(__name__)
+
+# caminho absoluto -> {'assinatura', 'estado', 'publicado_em', 'erro'}
+_publicadas = {}
+_lock = threading.Lock()
+_vigias = {}
+# Sem versão publicada: caminho absoluto -> (estado, assinatura) da última versão
+# conferida na hora por assinatura()
+_conferidas = {}
+
+
+# Assinatura publicada da planilha. Enquanto o vigia não publicou nenhuma, vale a
+# versão atual se estiver parada e íntegra (como o vigia exigiria); enquanto muda,
+# a última conferida. Sem nenhuma conferida, a planilha ainda não pode ser lida.
+def assinatura(caminho):
+    chave = os.path.abspath(caminho)
+    info = _publicadas.get(chave)
+    if info and info.get('assinatura'):
+        return info['assinatura']
+    estado = _estado(caminho)
+    conferida = _conferidas.get(chave)
+    if conferida and conferida[0] == estado:
+        return conferida[1]
+    if time.time() - estado[0] / 1e9 >= ESPERA_ESTAVEL and arquivo_integro(caminho):
+        nova = ingestao.assinatura_arquivo(caminho)
+        if _estado(caminho) == estado:
+            _conferidas[chave] = (estado, nova)
+            return nova
+    if conferida:
+        return conferida[1]
+    raise ingestao.ErroPlanilhaInstavel(f"{os.path.basename(caminho)} está sendo gravada; tente de novo em instantes")
+
+
+def situacao():
+    with _lock:
+        return {caminho: dict(info) for caminho, info in _publicadas.items()}
+
+
+def _estado(caminho):
+    info = os.stat(caminho)
+    return info.st_mtime_ns, info.st_size
+
+
+# Temporários do Excel na pasta: nome -> mtime_ns
+def temporarios_excel(diretorio):
+    encontrados = {}
+    try:
+        nomes = os.listdir(diretorio)
+    except OSError:
+        return encontrados
+    for nome in nomes:
+        if _TEMPORARIO_EXCEL.match(nome):
+            try:
+                encontrados[nome] = os.stat(os.path.join(diretorio, nome)).st_mtime_ns
+            except OSError:
+                continue
+    return encontrados
+
+
+# Há um temporário recente do Excel na pasta: uma gravação está em andamento.
+# `ignorar` (nome -> mtime_ns) são os temporários que já estavam parados na pasta
+# quando o vigia começou (ex.: restos de um checkout); só contam se forem regravados.
+def gravacao_em_andamento(diretorio, ignorar=None):
+    ignorar = ignorar or {}
+    agora = time.time()
+    for nome, mtime_ns in temporarios_excel(diretorio).items():
+        if ignorar.get(nome) == mtime_ns:
+            continue
+        if agora - mtime_ns / 1e9 < TRAVA_ABANDONADA:
+            return True
+    return False
+
+
+# .xlsm é um zip: arquivo cortado no meio não passa no teste de CRC dos membros
+def arquivo_integro(caminho):
+    try:
+        with zipfile.ZipFile(caminho) as arquivo:
+            return "[Content_Types].xml" in arquivo.namelist() and arquivo.testzip() is None
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+class Vigia(threading.Thread):
+    def __init__(self, diretorio, padrao, folhas, ler_folha, versao, tabela_banco=None, intervalo=INTERVALO):
+        super().__init__(name=f"vigia-{ingestao.slug(diretorio)}", daemon=True)
+        self.diretorio = diretorio
+        self.padrao = padrao
+        self.folhas = list(folhas)
+        self.ler_folha = ler_folha
+        self.versao = versao
+        self.tabela_banco = tabela_banco
+        self.intervalo = intervalo
+        # caminho -> (estado visto, desde quando)
+        self._vistos = {}
+        # Temporários do Excel já parados na partida são restos, não gravações; um
+        # alterado há menos de ESPERA_ESTAVEL pode ser uma gravação em andamento
+        parados_ate = (time.time() - ESPERA_ESTAVEL) * 1e9
+        self._temporarios_iniciais = {
+            nome: mtime_ns for nome, mtime_ns in temporarios_excel(diretorio).items() if mtime_ns <= parados_ate
+        }
+        self._parar = threading.Event()
+        self._pool = None
+
+    def parar(self):
+        self._parar.set()
+
+    def run(self):
+        while True:
+            try:
+                self.verificar()
+            except Exception:
+                log.exception("vigia %s: falha na varredura", self.diretorio)
+            if self._parar.wait(self.intervalo):
+                break
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    def _estavel(self, caminho, estado):
+        agora = time.monotonic()
+        visto = self._vistos.get(caminho)
+        if visto is None or visto[0] != estado:
+            self._vistos[caminho] = (estado, agora)
+            # Na primeira varredura não há histórico: vale se o arquivo já está parado
+            return visto is None and time.time() - estado[0] / 1e9 >= ESPERA_ESTAVEL
+        return agora - visto[1] >= ESPERA_ESTAVEL
+
+    def verificar(self):
+        for loja, caminho in lojas.descobrir_lojas(self.diretorio, self.padrao).items():
+            chave = os.path.abspath(caminho)
+            try:
+                estado = _estado(caminho)
+            except OSError:
+                continue
+            publicada = _publicadas.get(chave)
+            if publicada and estado in (publicada['estado'], publicada.get('estado_invalido')):
+                continue
+            if not self._estavel(caminho, estado) or gravacao_em_andamento(self.diretorio, self._temporarios_iniciais):
+                continue
+            if not arquivo_integro(caminho):
+                self._registrar(chave, estado_invalido=estado,
+                                erro="arquivo incompleto ou corrompido; aguardando nova gravação")
+                continue
+            self.reingerir(loja, caminho, estado)
+
+    # Snapshots num processo à parte (a leitura do Excel é pesada e não solta o GIL)
+    def _aquecer(self, caminho):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            return self._pool.submit(ingestao.aquecer, caminho, self.folhas, self.ler_folha, self.versao).result()
+        except BrokenProcessPool:
+            self._pool = None
+            return ingestao.aquecer(caminho, self.folhas, self.ler_folha, self.versao)
+        except RuntimeError:
+            # O interpretador está encerrando e o pool não aceita mais tarefas
+            self._parar.set()
+            return []
+
+    def reingerir(self, loja, caminho, estado):
+        chave = os.path.abspath(caminho)
+        inicio = time.perf_counter()
+        nova = ingestao.assinatura_arquivo(caminho)
+        self._aquecer(caminho)
+        if self._parar.is_set():
+            return
+        if self.tabela_banco:
+            banco.migrar()
+            with closing(banco.conectar()) as conn:
+                for folha in self.folhas:
+                    try:
+                        banco.sincronizar(
+                            conn, self.tabela_banco, loja, folha, nova,
+                            lambda folha=folha: ingestao.carregar_folha(caminho, folha, self.ler_folha, self.versao, nova),
+                            self.versao,
+                        )
+                    except Exception as e:
+                        log.warning("vigia: %s / %s não sincronizada: %s", loja, folha, e)
+        # Se o arquivo mudou durante a ingestão, a próxima varredura recomeça
+        if _estado(caminho) != estado:
+            return
+        self._registrar(chave, assinatura=nova, estado=estado, erro=None,
+                        publicado_em=time.time(), duracao=time.perf_counter() - inicio)
+        log.info("vigia: %s publicada (%s) em %.1fs", caminho, nova[:8], time.perf_counter() - inicio)
+
+    @staticmethod
+    def _registrar(chave, **campos):
+        # Troca atômica: o dicionário da planilha é substituído inteiro
+        with _lock:
+            info = dict(_publicadas.get(chave, {'assinatura': None, 'estado': None, 'publicado_em': None}))
+            info.update(campos)
+            _publicadas[chave] = info
+
+
+# Inicia (uma vez por processo) o vigia da pasta. Devolve o vigia, ou None se desligado.
+# Com `tabela_banco`, o esquema do banco é criado/migrado aqui, na partida de quem
+# grava o espelho, mesmo com o vigia desligado.
+def iniciar(diretorio, padrao, folhas, ler_folha, versao, tabela_banco=None):
+    if tabela_banco:
+        banco.migrar()
+    if not ATIVO:
+        return None
+    with _lock:
+        vigia = _vigias.get(diretorio)
+        if vigia is None or not vigia.is_alive():
+            vigia = Vigia(diretorio, padrao, folhas, ler_folha, versao, tabela_banco)
+            _vigias[diretorio] = vigia
+            vigia.start()
+        return vigia